@@ -0,0 +1,74 @@
+import tempfile
+
+import numpy as np
+import cv2
+
+
+DEFAULT_MAX_WARP_MB = 512   # เพดานหน่วยความจำของภาพผลลัพธ์ต่อ warp (MB) เกินนี้ทำทีละแถบ
+BAND_COPIES = 4             # สำเนาของแถบที่อาจอยู่พร้อมกัน (แถบ warp, ส่วนย่อย, hconcat, buffer float ของ feather)
+MIN_BAND_ROWS = 16
+BAND_HALO = 8               # แถวเผื่อบน/ล่างของแถบ สำหรับ filter แนวตั้ง (bilateral d=5 + GaussianBlur (1, 11))
+
+
+def exceeds_budget(output_size, max_bytes, channels=3):
+    """ภาพผลลัพธ์ขนาด output_size (w, h) ใหญ่กว่าเพดานหรือไม่ (max_bytes <= 0 คือไม่จำกัด)"""
+    width, height = output_size
+    return max_bytes > 0 and width * height * channels > max_bytes
+
+
+def band_height(width, max_bytes, channels=3, halo=0):
+    """จำนวนแถวต่อแถบที่ทำให้ buffer ของแถบ (รวม halo) ไม่เกิน max_bytes"""
+    rows = max_bytes // (BAND_COPIES * max(1, width) * channels) - 2 * halo
+    return max(MIN_BAND_ROWS, int(rows))
+
+
+def shift_matrix(matrix, y0):
+    """homography ที่ให้ผลเป็นแถว y0 เป็นต้นไปของผลลัพธ์ (เลื่อนพิกัดปลายทางขึ้น y0 แถว)"""
+    shift = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, -y0], [0.0, 0.0, 1.0]])
+    return shift @ np.asarray(matrix, dtype=np.float64)
+
+
+def render_bands(shape, render_band, max_bytes, halo=0, spill_dir=None):
+    """
+    สร้างภาพขนาด shape (h, w, c) ทีละแถบ: render_band(y0, y1) คืนแถว y0..y1 ของผลลัพธ์
+    (ถ้า halo > 0 จะถูกเรียกด้วยช่วงที่เผื่อ halo แถว แล้วตัดเฉพาะแถวที่ต้องการ)
+    แต่ละแถบถูกเขียนต่อท้ายไฟล์ชั่วคราวทันที แล้วคืนเป็น np.memmap แบบอ่านอย่างเดียว
+    ให้ encoder อ่านจากไฟล์ หน่วยความจำของ process จึงไม่เกินขนาดแถบไม่ว่าภาพผลลัพธ์จะใหญ่แค่ไหน
+    """
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) > 2 else 1
+    rows = band_height(width, max_bytes, channels, halo)
+
+    spill = tempfile.TemporaryFile(dir=spill_dir)
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        h0 = max(0, y0 - halo)
+        h1 = min(height, y1 + halo)
+        band = render_band(h0, h1)[y0 - h0:y1 - h0]
+        spill.write(np.ascontiguousarray(band).data)
+    spill.flush()
+
+    result = np.memmap(spill, dtype=np.uint8, mode='r', shape=tuple(shape))
+    result.spill_file = spill  # ผูกอายุไฟล์ไว้กับ array
+    return result
+
+
+def warp_perspective_banded(img_original, matrix, output_size, max_bytes, spill_dir=None):
+    """
+    ผลเท่ากับ cv2.warpPerspective(img_original, matrix, output_size) แบบ INTER_LINEAR ขอบดำ
+    แต่ warp ทีละแถบความสูงคงที่ (matrix ของแต่ละแถบเลื่อนพิกัดปลายทาง) แล้วส่งต่อผ่าน render_bands
+    """
+    width, height = output_size
+    shape = (height, width) + img_original.shape[2:]
+    band_buf = np.empty((band_height(width, max_bytes, shape[2] if len(shape) > 2 else 1),)
+                        + shape[1:], dtype=img_original.dtype)
+
+    def render_band(y0, y1):
+        band = band_buf[:y1 - y0]
+        cv2.warpPerspective(img_original, shift_matrix(matrix, y0), (width, y1 - y0), dst=band,
+                            flags=cv2.INTER_LINEAR,
+                            borderMode=cv2.BORDER_CONSTANT,
+                            borderValue=(0, 0, 0))
+        return band
+
+    return render_bands(shape, render_band, max_bytes, spill_dir=spill_dir)
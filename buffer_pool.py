@@ -0,0 +1,56 @@
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    pool ของ array ปลายทาง แยกตาม (shape, dtype) ใช้กับ dst= ของ OpenCV และ slice view แทนการต่อภาพ
+    เฟรมในโฟลเดอร์เดียวกันมีขนาดเท่ากัน หลังเฟรมแรกๆ acquire() จึงได้ buffer เดิมกลับมาแทนการจองใหม่
+    buffer ที่ acquire แล้วต้อง release() คืนเมื่อใช้เสร็จ (เช่น หลัง encode) ไม่เช่นนั้นจะถูกจองใหม่
+    allocations นับจำนวนครั้งที่ต้องจองจริง ใช้ตรวจว่าช่วง steady state ไม่มีการจองใหม่
+    เรียกจากหลาย thread ได้
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = defaultdict(list)
+        self._owned = {}            # id -> array ของ buffer ทุกตัวที่ pool จองไว้
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.reuses = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free[key]
+            if free:
+                self.reuses += 1
+                return free.pop()
+            buf = np.empty(key[0], dtype=dtype)
+            self._owned[id(buf)] = buf
+            self.allocations += 1
+            self.allocated_bytes += buf.nbytes
+        return buf
+
+    def release(self, *arrays):
+        """คืน buffer เข้า pool (array ที่ไม่ได้มาจาก pool หรือเป็น view ถูกข้ามไป)"""
+        with self._lock:
+            for arr in arrays:
+                if arr is not None and self._owned.get(id(arr)) is arr:
+                    self._free[(arr.shape, arr.dtype.str)].append(arr)
+
+    def counters(self):
+        with self._lock:
+            return {'allocations': self.allocations, 'reuses': self.reuses,
+                    'allocated_bytes': self.allocated_bytes}
+
+    def report(self, indent="", since=None):
+        """พิมพ์จำนวนการจอง/ใช้ซ้ำ (since: ผลจาก counters() ก่อนหน้า เพื่อดูเฉพาะช่วงนั้น)"""
+        now = self.counters()
+        base = since or {'allocations': 0, 'reuses': 0, 'allocated_bytes': 0}
+        allocations = now['allocations'] - base['allocations']
+        reuses = now['reuses'] - base['reuses']
+        mb = (now['allocated_bytes'] - base['allocated_bytes']) / 1e6
+        print(f"{indent}buffer pool: จองใหม่ {allocations} ครั้ง ({mb:.1f} MB) | ใช้ซ้ำ {reuses} ครั้ง")
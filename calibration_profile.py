@@ -0,0 +1,95 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+
+CALIBRATION_VERSION = 1
+
+
+def transforms_to_dict(points, transforms):
+    """แปลงจุดที่คลิก + g_transforms ให้อยู่ในรูปที่บันทึกเป็น JSON ได้"""
+    return {
+        'points': [[int(x), int(y)] for x, y in points],
+        'transforms': [
+            {
+                'side': t['side'],
+                'points': np.asarray(t['points'], dtype=np.float64).tolist(),
+                'matrix': np.asarray(t['matrix'], dtype=np.float64).tolist(),
+                'output_size': [int(t['output_size'][0]), int(t['output_size'][1])],
+            }
+            for t in transforms
+        ],
+    }
+
+
+def dict_to_transforms(entry):
+    """แปลงข้อมูลจากไฟล์กลับเป็น (points_src, g_transforms)"""
+    points = [tuple(pt) for pt in entry['points']]
+    transforms = [
+        {
+            'side': t['side'],
+            'points': np.float32(t['points']),
+            'matrix': np.array(t['matrix'], dtype=np.float64),
+            'output_size': (int(t['output_size'][0]), int(t['output_size'][1])),
+        }
+        for t in entry['transforms']
+    ]
+    return points, transforms
+
+
+def load_calibration(path, script_name=None):
+    """
+    โหลดไฟล์ calibration (คืน None ถ้ายังไม่มีไฟล์)
+    ตรวจ version และชื่อสคริปต์ เพื่อไม่ให้ใช้ไฟล์ของ main_cam5 (12 จุด) กับ cam5_transform (4 จุด)
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+
+    version = profile.get('version')
+    if version != CALIBRATION_VERSION:
+        raise ValueError(f"calibration version {version} ไม่รองรับ (ต้องเป็น {CALIBRATION_VERSION}): {path}")
+    if script_name is not None and profile.get('script') != script_name:
+        raise ValueError(f"ไฟล์ calibration เป็นของ '{profile.get('script')}' ไม่ใช่ '{script_name}': {path}")
+
+    return profile
+
+
+def save_calibration(path, script_name, folder_name, points, transforms):
+    """บันทึก/อัปเดต calibration ของโฟลเดอร์หนึ่งลงไฟล์ (โฟลเดอร์ล่าสุดเป็นค่า default)"""
+    profile = load_calibration(path, script_name) or {
+        'version': CALIBRATION_VERSION,
+        'script': script_name,
+        'folders': {},
+    }
+
+    profile['folders'][folder_name] = transforms_to_dict(points, transforms)
+    profile['default'] = folder_name
+    profile['updated'] = datetime.now().isoformat(timespec='seconds')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_folder_calibration(profile, folder_name):
+    """
+    คืน (points_src, g_transforms) ของโฟลเดอร์
+    ถ้าโฟลเดอร์นี้ไม่เคยคลิก ใช้ค่า default (กล้องติดตั้งตายตัว)
+    """
+    if profile is None or not profile.get('folders'):
+        return None, []
+
+    entry = profile['folders'].get(folder_name)
+    if entry is None:
+        entry = profile['folders'].get(profile.get('default'))
+    if entry is None:
+        return None, []
+
+    return dict_to_transforms(entry)
@@ -7,7 +7,26 @@ if sys.stderr.encoding != 'utf-8':
 import numpy as np
 import cv2
 import os
-import glob
+import time
+from remap_engine import attach_remap_tables, apply_remap_tables, benchmark_transforms
+from parallel_batch import create_worker_pool, run_parallel_batch
+from frame_pipeline import run_frame_pipeline
+from gradient_blender import GradientBlender, blend_bend_pair
+from output_manifest import OutputManifest, params_digest
+from preview_warp import warp_for_preview
+from calibration_profile import load_calibration, save_calibration, get_folder_calibration
+from frame_catalog import FrameCatalog, DEFAULT_CATALOG
+from frame_cache import FrameCache
+from shard_writer import ShardWriter, encode_outputs
+from output_encoder import parse_encoder
+from buffer_pool import BufferPool
+from band_warp import DEFAULT_MAX_WARP_MB, exceeds_budget, warp_perspective_banded
+from drift_tracker import DriftTracker, DEFAULT_THRESHOLD, drift_distance, track_points
+from tray_detector import detect_tray_quad
+from folder_watcher import FolderWatcher
+from letterbox import letterbox_transforms, fill_padding, save_letterbox_metadata
+from label_transform import transform_label_folder
+from cli_args import get_arg_value
 
 
 WINDOW_NAME = "Image - Click 4 points (Top-Left, Top-Right, Bottom-Right, Bottom-Left)"
@@ -15,6 +34,42 @@ PREVIEW_WINDOW = "Preview Transform Result"
 points_src = []
 g_transforms = [] 
 
+# --- ตั้งค่าการประมวลผล ---
+NUM_WORKERS = get_arg_value('--workers', 1)                    # 1 = ใช้ pipeline แบบ thread ใน process เดียว
+PIPELINE_READERS = 2                                           # thread สำหรับ decode
+PIPELINE_WRITERS = get_arg_value('--encode-workers', 2)        # thread สำหรับ encode/เขียนไฟล์
+MAX_IN_FLIGHT = get_arg_value('--max-in-flight', 8)            # จำนวนเฟรมสูงสุดที่ค้างในหน่วยความจำ
+BEND_FACTOR = 0.25                                             # ระยะบิดแนวนอน (สัดส่วนของความกว้าง)
+V_SHIFT_RATIO = 0.08                                           # ระยะยกมุมแนวตั้งของภาพบิด (สัดส่วนของความสูง)
+JPEG_QUALITY = 95
+ENCODER_SPEC = get_arg_value('--encoder', f'jpeg:quality={JPEG_QUALITY}')  # ดู output_encoder.parse_encoder
+FORCE = '--force' in sys.argv                                  # ประมวลผลใหม่ทุกไฟล์ ไม่สน manifest
+RESCAN = '--rescan' in sys.argv                                # list ทุกโฟลเดอร์ใหม่ ไม่เชื่อ mtime ของโฟลเดอร์ใน catalog
+MAKE_PANORAMA = '--panorama' in sys.argv                       # ต่อ panorama จากภาพที่ warp แล้วในหน่วยความจำ
+SAVE_BEND_IMAGES = '--no-bend-images' not in sys.argv          # บันทึก _left_bend/_right_bend ด้วยหรือไม่
+BLEND_WIDTH = 50                                               # ความกว้างโซนเบลนด์ของ panorama (เท่ากับ image_panorama.py)
+HEADLESS = '--headless' in sys.argv                            # ไม่เปิดหน้าต่าง ใช้ไฟล์ calibration ที่บันทึกไว้
+TRACK_DRIFT = '--track-drift' in sys.argv                      # ปรับ calibration อ้างอิงตามการเลื่อนของกล้อง (ORB) แทนการคลิกใหม่
+DRIFT_THRESHOLD = get_arg_value('--drift-threshold', DEFAULT_THRESHOLD)  # เลื่อนเกินกี่ pixel ถึงต้องคลิกใหม่
+DRIFT_REFERENCE = get_arg_value('--drift-reference', '')       # โฟลเดอร์อ้างอิง (default: โฟลเดอร์ล่าสุดในไฟล์ calibration)
+AUTO_CORNERS = '--auto-corners' in sys.argv                    # หามุมถาดอัตโนมัติ หน้าต่างใช้แค่ยืนยัน/แก้ไข
+WATCH = '--watch' in sys.argv                                  # ทำงานต่อเนื่อง: ประมวลผลภาพใหม่ที่กล้องส่งเข้ามา (ใช้คู่กับ --headless)
+WATCH_INTERVAL = get_arg_value('--watch-interval', 2.0)        # วินาทีระหว่างการ poll โฟลเดอร์ในโหมด watch
+RUN_BENCHMARK = '--bench' in sys.argv                          # เปรียบเทียบ warpPerspective กับ remap table ก่อนประมวลผล
+BENCHMARK_FRAMES = 5
+SHARD_DIR = get_arg_value('--shards', '')                      # เขียนผลลัพธ์เป็น tar shard ในโฟลเดอร์นี้แทนไฟล์ JPEG แยก
+SHARD_SIZE_MB = get_arg_value('--shard-size', 1024)            # ขนาดสูงสุดต่อ shard (MB)
+FRAME_CACHE_DIR = get_arg_value('--frame-cache', '')           # cache ภาพที่ decode แล้ว (memmap) ไว้ใช้ซ้ำในรอบถัดไป
+FRAME_CACHE_GB = get_arg_value('--frame-cache-gb', 8.0)        # ขนาดสูงสุดของ frame cache (GB)
+MAX_WARP_MB = get_arg_value('--max-warp-mb', DEFAULT_MAX_WARP_MB)  # ภาพผลลัพธ์ใหญ่กว่านี้ warp ทีละแถบ (0 = ไม่จำกัด)
+MAX_WARP_BYTES = MAX_WARP_MB << 20
+LETTERBOX_SIZE = get_arg_value('--letterbox', 0)               # warp ตรงเป็น frame สี่เหลี่ยมจัตุรัสสำหรับ YOLO เช่น 640 (0 = ปิด)
+LABELS_ONLY = '--labels-only' in sys.argv                      # แปลงเฉพาะ label ไม่สร้างภาพ (หลังแก้ calibration)
+LABELS = '--labels' in sys.argv or LABELS_ONLY                 # แปลง label YOLO ของภาพดิบไปไว้ข้างภาพผลลัพธ์
+RAW_LABEL_DIR = get_arg_value('--raw-labels', '')              # โฟลเดอร์ label ของภาพดิบ (<วันที่>/<ชื่อภาพ>.txt) default: ข้างภาพดิบ
+AUGMENT_FACTORS = get_arg_value('--augment', '')               # bend factor หลายค่าต่อเฟรม เช่น 0.15,0.25,0.35 (แทน left/right_bend)
+AUGMENT_DIRECTIONS = get_arg_value('--augment-directions', 'left,right')  # ทิศของ variant
+
 
 def calculate_output_size(pts):
     pt_TL = pts[0]
@@ -32,14 +87,29 @@ def calculate_output_size(pts):
     
     return maxWidth, maxHeight
 
-def create_cropped_transform(img_original, matrix, output_size):
+def create_cropped_transform(img_original, matrix, output_size, maps=None, max_bytes=0, pool=None,
+                             letterbox=None):
     """
     ทำ Perspective Transform โดยไม่เพิ่มขอบดำรอบภาพ
+    ถ้ามี maps (ตาราง remap ที่คำนวณไว้แล้ว) จะใช้ cv2.remap แทนการคำนวณ homography ใหม่ทุกเฟรม
+    ถ้าผลลัพธ์ใหญ่กว่า max_bytes จะ warp ทีละแถบ คืน np.memmap บนไฟล์ชั่วคราว (ดู band_warp.py)
+    pool: BufferPool สำหรับ array ผลลัพธ์ (ผู้เรียก release คืนเมื่อใช้เสร็จ)
+    letterbox: ผลจาก letterbox_geometry ถ้า matrix รวมการ letterbox ไว้แล้ว (เติมสีขอบหลัง warp)
     """
-    transformed = cv2.warpPerspective(img_original, matrix, output_size, 
-                                        flags=cv2.INTER_LINEAR,
-                                        borderMode=cv2.BORDER_CONSTANT,
-                                        borderValue=(0, 0, 0))
+    if exceeds_budget(output_size, max_bytes) and maps is None:
+        return warp_perspective_banded(img_original, matrix, output_size, max_bytes)
+
+    width, height = output_size
+    dst = pool.acquire((height, width) + img_original.shape[2:]) if pool is not None else None
+    if maps is not None:
+        transformed = apply_remap_tables(img_original, maps, dst=dst)
+    else:
+        transformed = cv2.warpPerspective(img_original, matrix, output_size, dst=dst,
+                                            flags=cv2.INTER_LINEAR,
+                                            borderMode=cv2.BORDER_CONSTANT,
+                                            borderValue=(0, 0, 0))
+    if letterbox is not None:
+        fill_padding(transformed, letterbox)
     return transformed
 
 
@@ -97,12 +167,13 @@ def mouse_callback(event, x, y, flags, param):
         print(f"   จุดที่ {point_num} ({position_name}): x={x_orig}, y={y_orig}")
 
 
-def create_bent_destination_points(width, height, bend_direction='left', bend_factor=0.25):
+def create_bent_destination_points(width, height, bend_direction='left', bend_factor=BEND_FACTOR,
+                                   v_shift_ratio=V_SHIFT_RATIO):
     """
     ปรับให้ output อยู่ใน positive space 
     """
     h_shift = int(width * bend_factor)
-    v_shift = int(height * 0.08)
+    v_shift = int(height * v_shift_ratio)
     
     if bend_direction == 'right':
         
@@ -133,7 +204,7 @@ def show_preview(img_original, resize_ratio_display):
     base_width, base_height = calculate_output_size(pts_src)
     
     
-    pts_dst_left = create_bent_destination_points(base_width, base_height, 'left', bend_factor=0.25)
+    pts_dst_left = create_bent_destination_points(base_width, base_height, 'left', bend_factor=BEND_FACTOR)
     
     
     min_x = np.min(pts_dst_left[:, 0])
@@ -150,15 +221,14 @@ def show_preview(img_original, resize_ratio_display):
     pts_dst_left_adjusted = pts_dst_left - [min_x, min_y]
     
     matrix_left = cv2.getPerspectiveTransform(pts_src, pts_dst_left_adjusted)
-    composite_left = create_cropped_transform(img_original, matrix_left, output_size_left)
-    
-    preview_left = resize_image(composite_left, 900)
+    # warp ตรงไปที่ขนาด preview จากภาพต้นฉบับย่อ (ไม่ต้อง warp เต็มขนาดแล้วย่อทีหลัง)
+    preview_left = warp_for_preview(img_original, matrix_left, output_size_left, 900)
     cv2.putText(preview_left, "Preview - Left Bend (Cropped)", 
                 (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
     cv2.imshow(f"{PREVIEW_WINDOW} - Left", preview_left)
 
     
-    pts_dst_right = create_bent_destination_points(base_width, base_height, 'right', bend_factor=0.25)
+    pts_dst_right = create_bent_destination_points(base_width, base_height, 'right', bend_factor=BEND_FACTOR)
     
     min_x = np.min(pts_dst_right[:, 0])
     min_y = np.min(pts_dst_right[:, 1])
@@ -172,15 +242,50 @@ def show_preview(img_original, resize_ratio_display):
     pts_dst_right_adjusted = pts_dst_right - [min_x, min_y]
     
     matrix_right = cv2.getPerspectiveTransform(pts_src, pts_dst_right_adjusted)
-    composite_right = create_cropped_transform(img_original, matrix_right, output_size_right)
-    
-    preview_right = resize_image(composite_right, 900)
+    # warp ตรงไปที่ขนาด preview จากภาพต้นฉบับย่อ (ไม่ต้อง warp เต็มขนาดแล้วย่อทีหลัง)
+    preview_right = warp_for_preview(img_original, matrix_right, output_size_right, 900)
     cv2.putText(preview_right, "Preview - Right Bend (Cropped)", 
                 (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
     cv2.imshow(f"{PREVIEW_WINDOW} - Right", preview_right)
     
     print("\nแสดงตัวอย่างผลลัพธ์ 'y' ยืนยัน หรือ 'c' แก้ไข")
 
+# --- ฟังก์ชันคำนวณ matrix ของภาพบิดหนึ่งแบบ ---
+def build_bent_transform(pts_src, bend_direction, bend_factor=BEND_FACTOR, side=None):
+    """
+    คืน transform (side, points, matrix, output_size) ของภาพบิดทิศ bend_direction ('left' / 'right')
+    side: ชื่อโฟลเดอร์ผลลัพธ์ (default '<ทิศ>_bend')
+    """
+    base_width, base_height = calculate_output_size(pts_src)
+    pts_dst = create_bent_destination_points(base_width, base_height, bend_direction, bend_factor=bend_factor)
+    
+    min_x = np.min(pts_dst[:, 0])
+    min_y = np.min(pts_dst[:, 1])
+    max_x = np.max(pts_dst[:, 0])
+    max_y = np.max(pts_dst[:, 1])
+    
+    output_width = int(np.ceil(max_x - min_x))
+    output_height = int(np.ceil(max_y - min_y))
+    
+    pts_dst_adjusted = pts_dst - [min_x, min_y]
+    matrix = cv2.getPerspectiveTransform(pts_src, pts_dst_adjusted)
+    
+    return {
+        'side': side or f"{bend_direction}_bend",
+        'points': pts_src,
+        'matrix': matrix,
+        'output_size': (output_width, output_height)
+    }
+
+def build_bend_variants(points, bend_factors, directions):
+    """
+    transform ของทุก variant สำหรับ augmentation: ทุกทิศ x ทุก bend factor
+    side ของแต่ละ variant เช่น 'left_bend_0.15' (ใช้เป็นชื่อโฟลเดอร์ผลลัพธ์)
+    """
+    pts_src = np.float32(points)
+    return [build_bent_transform(pts_src, direction, factor, side=f"{direction}_bend_{factor:g}")
+            for direction in directions for factor in bend_factors]
+
 # --- ฟังก์ชันคำนวณ Matrix  ---
 def process_and_calculate_matrices():
     global points_src, g_transforms
@@ -192,104 +297,53 @@ def process_and_calculate_matrices():
 
     print(f"\nกำลังคำนวณ Perspective Matrix จาก 4 จุด...")
     
-    g_transforms = []
     pts_src = np.float32(points_src)
-    base_width, base_height = calculate_output_size(pts_src)
-    
-    # --- สำหรับภาพบิดซ้าย ---
-    pts_dst_left = create_bent_destination_points(base_width, base_height, 'left', bend_factor=0.25)
-    
-    min_x = np.min(pts_dst_left[:, 0])
-    min_y = np.min(pts_dst_left[:, 1])
-    max_x = np.max(pts_dst_left[:, 0])
-    max_y = np.max(pts_dst_left[:, 1])
-    
-    output_width_left = int(np.ceil(max_x - min_x))
-    output_height_left = int(np.ceil(max_y - min_y))
-    output_size_left = (output_width_left, output_height_left)
-    
-    pts_dst_left_adjusted = pts_dst_left - [min_x, min_y]
-    matrix_left = cv2.getPerspectiveTransform(pts_src, pts_dst_left_adjusted)
-    
-    g_transforms.append({
-        'side': 'left_bend',
-        'points': pts_src,
-        'matrix': matrix_left,
-        'output_size': output_size_left
-    })
-    print(f"   ✓ Matrix (left_bend): {output_size_left[0]}x{output_size_left[1]}")
-
-    # --- สำหรับภาพบิดขวา ---
-    pts_dst_right = create_bent_destination_points(base_width, base_height, 'right', bend_factor=0.25)
-    
-    min_x = np.min(pts_dst_right[:, 0])
-    min_y = np.min(pts_dst_right[:, 1])
-    max_x = np.max(pts_dst_right[:, 0])
-    max_y = np.max(pts_dst_right[:, 1])
-    
-    output_width_right = int(np.ceil(max_x - min_x))
-    output_height_right = int(np.ceil(max_y - min_y))
-    output_size_right = (output_width_right, output_height_right)
-    
-    pts_dst_right_adjusted = pts_dst_right - [min_x, min_y]
-    matrix_right = cv2.getPerspectiveTransform(pts_src, pts_dst_right_adjusted)
+    g_transforms = [build_bent_transform(pts_src, 'left'),    # --- สำหรับภาพบิดซ้าย ---
+                    build_bent_transform(pts_src, 'right')]   # --- สำหรับภาพบิดขวา ---
+    for transform_data in g_transforms:
+        output_size = transform_data['output_size']
+        print(f"   ✓ Matrix ({transform_data['side']}): {output_size[0]}x{output_size[1]}")
     
-    g_transforms.append({
-        'side': 'right_bend',
-        'points': pts_src,
-        'matrix': matrix_right,
-        'output_size': output_size_right
-    })
-    print(f"   ✓ Matrix (right_bend): {output_size_right[0]}x{output_size_right[1]}")
+    attach_remap_tables(g_transforms, MAX_WARP_BYTES)
+    print(f"   ✓ สร้างตาราง remap สำหรับ {len(g_transforms)} transform")
     
     return True
 
-# --- 1. กำหนด Path ---
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-BASE_PATH = os.path.join(SCRIPT_DIR, 'data', 'cam5_24H',)
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_bent_dual_24H')
-
-print(f"ค้นหาโฟลเดอร์ใน: {BASE_PATH}")
+def draw_detected_points(img_display, points, resize_ratio):
+    """วาดสี่เหลี่ยมที่หาได้อัตโนมัติลงบนภาพแสดงผล (แบบเดียวกับการคลิก)"""
+    scaled = [(int(x * resize_ratio), int(y * resize_ratio)) for x, y in points]
+    for i, (x, y) in enumerate(scaled):
+        cv2.circle(img_display, (x, y), 5, (0, 255, 0), -1)
+        cv2.putText(img_display, str(i + 1), (x+10, y-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        cv2.line(img_display, scaled[i - 1], (x, y), (0, 255, 255), 2)
 
-# --- 2. ค้นหาโฟลเดอร์ย่อย ---
-try:
-    all_items = os.listdir(BASE_PATH)
-    subfolders = [os.path.join(BASE_PATH, item) for item in all_items 
-                  if os.path.isdir(os.path.join(BASE_PATH, item))]
-    subfolders.sort()
-except FileNotFoundError:
-    print(f"ERROR: ไม่พบpath '{BASE_PATH}'")
-    sys.exit()
 
-if not subfolders:
-    print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
-    sys.exit()
+def detect_corners(sample_path):
+    """
+    หามุมถาดอัตโนมัติจากภาพตัวอย่าง
+    คืน list ของ 4 จุด (x, y) ในพิกัดภาพเต็ม หรือ None ถ้าหาไม่เจอ
+    """
+    result = detect_tray_quad(sample_path)
+    if result['points'] is None:
+        print(f"auto corners: หาถาดไม่เจอ ({result['ms']:.0f} ms)")
+        return None
+    print(f"auto corners: พบถาด {result['area_ratio'] * 100:.0f}% ของภาพ "
+          f"(fit {result['fill_ratio']:.2f}, {result['ms']:.0f} ms)")
+    return [(int(round(x)), int(round(y))) for x, y in result['points']]
 
-print(f"พบ {len(subfolders)} โฟลเดอร์")
 
-# --- 3. Loop หลัก ---
-for folder_path in subfolders:
-    folder_name = os.path.basename(os.path.normpath(folder_path))
-    print(f"\n{'='*70}")
-    print(f"โฟลเดอร์: {folder_name}")
-    print(f"{'='*70}")
-    
-    image_files = glob.glob(os.path.join(folder_path, '*.jpg'))
-    if not image_files:
-        print(f"ไม่พบไฟล์ .jpg ข้าม")
-        continue
-    
-    print(f"พบ {len(image_files)} ไฟล์")
+def run_interactive_setup(img_setup, sample_path, initial_points=None):
+    """
+    เปิดหน้าต่างให้คลิก 4 จุดบนภาพตัวอย่าง
+    ถ้ามี initial_points (จาก detect_corners) จะวาดไว้และแสดงตัวอย่างทันที กด 'y' ยืนยัน หรือ 'c' คลิกใหม่
+    คืนค่า True ถ้ากด 'y' ยืนยัน (ผลอยู่ใน points_src / g_transforms)
+    """
+    global points_src, g_transforms
 
-    points_src = []
+    points_src = list(initial_points) if initial_points else []
     g_transforms = []
-    
-    SAMPLE_IMAGE = image_files[0]
-    img_setup = cv2.imread(SAMPLE_IMAGE)
-    if img_setup is None:
-        print(f"ERROR: ไม่สามารถโหลดภาพ '{SAMPLE_IMAGE}' ได้")
-        continue
-    
+
     max_display = 1000
     img_display = resize_image(img_setup.copy(), max_display)
     h_orig, w_orig = img_setup.shape[:2]
@@ -300,7 +354,7 @@ for folder_path in subfolders:
     cv2.setMouseCallback(WINDOW_NAME, mouse_callback, 
                          {'image': img_display, 'resize_ratio': resize_ratio})
 
-    print(f"\nภาพตัวอย่าง: {os.path.basename(SAMPLE_IMAGE)}")
+    print(f"\nภาพตัวอย่าง: {os.path.basename(sample_path)}")
     print(f"ขนาดต้นฉบับ: {w_orig}x{h_orig}")
     print("\n" + "="*70)
     print("   - คลิก 4 จุดบนพื้นที่ที่ต้องการแปลง ตามลำดับ:")
@@ -311,9 +365,14 @@ for folder_path in subfolders:
     print("   [c] = ล้างและเริ่มใหม่")
     print("   [q] = ข้ามโฟลเดอร์นี้")
     print("="*70 + "\n")
-    
+
+    if points_src:
+        draw_detected_points(img_display, points_src, resize_ratio)
     cv2.imshow(WINDOW_NAME, img_display)
-    
+    if points_src:
+        print("ตรวจพบมุมถาดอัตโนมัติแล้ว")
+        show_preview(img_setup, resize_ratio)
+
     while True:
         key = cv2.waitKey(1) & 0xFF
 
@@ -324,13 +383,13 @@ for folder_path in subfolders:
 
         if key == ord('p'):
             show_preview(img_setup, resize_ratio)
-        
+    
         elif key == ord('y'):
             if process_and_calculate_matrices():
                 print("ยืนยัน ")
                 cv2.waitKey(1000)
                 break
-        
+    
         elif key == ord('c'):
             print("\nล้างทั้งหมด เริ่มใหม่")
             points_src = []
@@ -351,50 +410,445 @@ for folder_path in subfolders:
 
     cv2.destroyAllWindows()
 
-    if not g_transforms:
-        print(f"ข้ามโฟลเดอร์ {folder_name}")
-        continue
+    return bool(g_transforms)
 
-    output_base = os.path.join(OUTPUT_DIR, folder_name)
-    output_folders = {}
-    
-    for transform_data in g_transforms:
-        side = transform_data['side']
-        folder_path = os.path.join(output_base, side)
-        os.makedirs(folder_path, exist_ok=True)
-        output_folders[side] = folder_path
+def calibrate_by_drift(tracker, ref_points, sample_path):
+    """
+    ประมาณการเลื่อนของกล้องจากภาพอ้างอิงไปยัง sample_path แล้วย้ายจุด calibration อ้างอิงตาม
+    คืนค่า True ถ้าเลื่อนไม่เกิน DRIFT_THRESHOLD (ผลอยู่ใน points_src / g_transforms)
+    """
+    global points_src, g_transforms
 
-    print(f"\nโฟลเดอร์ผลลัพธ์:")
-    for side, path in output_folders.items():
-        print(f"   - {side}: {path}")
+    result = tracker.estimate(sample_path)
+    homography = result['homography']
+    if homography is None:
+        print(f"drift: match ไม่ได้ (match {result['matches']}, inlier {result['inliers']}, "
+              f"{result['ms']:.0f} ms)")
+        return False
+
+    shift = drift_distance(homography, ref_points)
+    print(f"drift: เลื่อนสูงสุด {shift:.1f} px (inlier {result['inliers']}/{result['matches']}, "
+          f"{result['ms']:.0f} ms)")
+    if shift > DRIFT_THRESHOLD:
+        print(f"drift เกิน {DRIFT_THRESHOLD:g} px ต้องกำหนดจุดใหม่")
+        return False
 
-    print(f"\nเริ่มแปลงภาพ {len(image_files)} ไฟล์\n")
+    points_src = [(int(round(x)), int(round(y))) for x, y in track_points(homography, ref_points)]
+    return process_and_calculate_matrices()
+
+# --- 1. กำหนด Path ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.join(SCRIPT_DIR, 'data', 'cam5_24H',)
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_bent_dual_24H')
+PANORAMA_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_panorama_24H')
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, '.manifest.json')
+CALIBRATION_FILE = get_arg_value('--calibration',
+                                 os.path.join(SCRIPT_DIR, 'calibration', 'cam5_transform.json'))
+CATALOG_FILE = get_arg_value('--catalog', DEFAULT_CATALOG)
+
+
+
+def iter_folders(subfolders, catalog, watcher):
+    """
+    โฟลเดอร์ที่ต้องประมวลผล: (folder_path, incremental)
+    รอบแรกคือทุกโฟลเดอร์ ถ้ามี watcher จะรอไฟล์ใหม่ต่อ แล้วคืนเฉพาะโฟลเดอร์ที่มีไฟล์เพิ่ม จนกว่าจะกด Ctrl+C
+    """
+    for folder_path in subfolders:
+        yield folder_path, False
+    if watcher is None:
+        return
+
+    print(f"\nโหมด watch: เฝ้า {BASE_PATH} ทุก {WATCH_INTERVAL:g} s (Ctrl+C เพื่อหยุด)")
+    while True:
+        try:
+            ready = watcher.wait(WATCH_INTERVAL)
+        except KeyboardInterrupt:
+            print("\nหยุดโหมด watch")
+            return
+        catalog.scan(BASE_PATH, camera='cam5')
+        for folder_path in ready:
+            yield folder_path, True
+
+
+def main():
+    global points_src, g_transforms
+
+    print(f"ค้นหาโฟลเดอร์ใน: {BASE_PATH}")
+
+    # --- 2. ค้นหาโฟลเดอร์ย่อย (อัปเดต catalog เฉพาะโฟลเดอร์ที่เปลี่ยน แล้ว query แทนการ listdir/glob) ---
+    catalog = FrameCatalog(CATALOG_FILE)
+    try:
+        changes = catalog.scan(BASE_PATH, camera='cam5', full=RESCAN)
+    except FileNotFoundError:
+        print(f"ERROR: ไม่พบpath '{BASE_PATH}'")
+        sys.exit()
+    print(f"catalog: อัปเดต {changes} ไฟล์")
+    subfolders = catalog.subfolders(BASE_PATH)
+
+    if not subfolders:
+        print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
+        sys.exit()
+
+    print(f"พบ {len(subfolders)} โฟลเดอร์")
+
+    calibration = None
+    if HEADLESS or TRACK_DRIFT:
+        calibration = load_calibration(CALIBRATION_FILE, 'cam5_transform')
+        if calibration is None:
+            print(f"ERROR: ไม่พบไฟล์ calibration '{CALIBRATION_FILE}' (รันแบบคลิกก่อน 1 ครั้ง)")
+            sys.exit()
+        if HEADLESS:
+            print(f"โหมด headless: ใช้ calibration '{CALIBRATION_FILE}'")
+
+    # โหมด track drift: calibration ของโฟลเดอร์อ้างอิงใช้กับทุกวัน ปรับตามการเลื่อนของกล้อง
+    tracker = None
+    if TRACK_DRIFT:
+        ref_folder = DRIFT_REFERENCE or calibration.get('default')
+        ref_points, _ = get_folder_calibration(calibration, ref_folder)
+        ref_frames = catalog.frames(BASE_PATH, ref_folder) if ref_folder else []
+        if not ref_points or not ref_frames:
+            print(f"ERROR: ไม่พบ calibration หรือภาพของโฟลเดอร์อ้างอิง '{ref_folder}'")
+            sys.exit()
+        tracker = DriftTracker(ref_frames[0])
+        print(f"โหมด track drift: อ้างอิง '{ref_folder}' (threshold {DRIFT_THRESHOLD:g} px)")
+
+    if not SAVE_BEND_IMAGES and not MAKE_PANORAMA:
+        print("ERROR: --no-bend-images ต้องใช้คู่กับ --panorama")
+        sys.exit()
+
+    if LABELS and (SHARD_DIR or not SAVE_BEND_IMAGES):
+        print("ERROR: --labels เขียน label ไว้ข้างภาพ _left_bend/_right_bend (ใช้กับ --shards หรือ --no-bend-images ไม่ได้)")
+        sys.exit()
+
+    # โหมด augmentation: ทุกทิศ x ทุก bend factor จากการ decode ครั้งเดียวต่อเฟรม
+    augment_factors = []
+    augment_directions = []
+    if AUGMENT_FACTORS:
+        try:
+            augment_factors = [float(v) for v in AUGMENT_FACTORS.split(',') if v.strip()]
+        except ValueError:
+            augment_factors = []
+        augment_directions = [d.strip() for d in AUGMENT_DIRECTIONS.split(',') if d.strip()]
+        if not augment_factors or not all(0 <= f < 1 for f in augment_factors):
+            print(f"ERROR: --augment '{AUGMENT_FACTORS}' ต้องเป็น bend factor 0-1 คั่นด้วย ',' เช่น 0.15,0.25,0.35")
+            sys.exit()
+        if not augment_directions or not set(augment_directions) <= {'left', 'right'}:
+            print(f"ERROR: --augment-directions '{AUGMENT_DIRECTIONS}' เลือกได้: left, right")
+            sys.exit()
+        if MAKE_PANORAMA:
+            print("ERROR: --augment ใช้คู่กับ --panorama ไม่ได้ (ไม่มีคู่ left_bend/right_bend)")
+            sys.exit()
+        print(f"โหมด augmentation: {len(augment_factors) * len(augment_directions)} variant "
+              f"(bend factor {', '.join(f'{f:g}' for f in augment_factors)} | {', '.join(augment_directions)})")
+
+    if LETTERBOX_SIZE and MAKE_PANORAMA:
+        print("ERROR: --letterbox ใช้คู่กับ --panorama ไม่ได้ (panorama ไม่ใช่ frame ของ YOLO)")
+        sys.exit()
+
+    if LETTERBOX_SIZE and exceeds_budget((LETTERBOX_SIZE, LETTERBOX_SIZE), MAX_WARP_BYTES):
+        print(f"ERROR: --letterbox {LETTERBOX_SIZE} ใหญ่กว่า --max-warp-mb {MAX_WARP_MB}")
+        sys.exit()
+
+    if WATCH and not HEADLESS:
+        print("ERROR: --watch ต้องใช้คู่กับ --headless (โฟลเดอร์วันใหม่ต้องไม่รอการคลิก)")
+        sys.exit()
+
+    # สร้างก่อนรอบแรก ไฟล์ที่มาระหว่างประมวลผลจะถูกเก็บในรอบ watch (manifest กันการทำซ้ำ)
+    watcher = FolderWatcher(BASE_PATH) if WATCH else None
+
+    try:
+        encoder = parse_encoder(ENCODER_SPEC)
+    except ValueError as e:
+        print(f"ERROR: --encoder '{ENCODER_SPEC}': {e}")
+        sys.exit()
+
+    manifest = OutputManifest(MANIFEST_FILE)
+
+    frame_cache = None
+    if FRAME_CACHE_DIR:
+        frame_cache = FrameCache(FRAME_CACHE_DIR, max_bytes=int(FRAME_CACHE_GB * (1 << 30)))
+        print(f"ใช้ frame cache: {FRAME_CACHE_DIR} (สูงสุด {FRAME_CACHE_GB:g} GB)")
+
+    shard_writer = None
+    if SHARD_DIR:
+        shard_writer = ShardWriter(SHARD_DIR, prefix='cam5_bent', max_bytes=SHARD_SIZE_MB << 20)
+        print(f"เขียนผลลัพธ์เป็น tar shard ที่: {SHARD_DIR}")
+
+    # writer thread ของ pipeline ยังถือภาพอยู่ จึงให้ blender คืน array ใหม่ทุกครั้ง
+    # ภาพผลลัพธ์ (warp, panorama) จองจาก pool ตามขนาด writer คืน buffer หลังเขียนเสร็จ
+    buffer_pool = BufferPool()
+    blender = GradientBlender(BLEND_WIDTH, reuse_output=False, pool=buffer_pool)
+
+    pool = None
+    if NUM_WORKERS > 1:
+        pool = create_worker_pool(NUM_WORKERS)
+        print(f"ประมวลผลแบบขนาน {NUM_WORKERS} worker")
+
+    # calibration + ตาราง remap ของแต่ละโฟลเดอร์ที่เตรียมแล้ว (โหมด watch ใช้ซ้ำโดยไม่ต้องสร้างใหม่)
+    warm_transforms = {}
+
+    # --- 3. Loop หลัก ---
+    for folder_path, incremental in iter_folders(subfolders, catalog, watcher):
+        folder_name = os.path.basename(os.path.normpath(folder_path))
+        pass_start = time.perf_counter()
+        print(f"\n{'='*70}")
+        print(f"โฟลเดอร์: {folder_name}")
+        print(f"{'='*70}")
+    
+        image_files = catalog.frames(BASE_PATH, folder_name)
+        if not image_files:
+            print(f"ไม่พบไฟล์ .jpg ข้าม")
+            continue
     
-    for i, img_path in enumerate(image_files):
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"   ✗ ไม่สามารถอ่าน: {os.path.basename(img_path)}")
+        print(f"พบ {len(image_files)} ไฟล์")
+
+        points_src = []
+        g_transforms = []
+        warm = folder_name in warm_transforms
+        if warm:
+            points_src, g_transforms = warm_transforms[folder_name]
+
+        # โฟลเดอร์ที่ยังไม่มี calibration ของตัวเอง: ลองปรับจาก drift ก่อน เปิดหน้าต่างเฉพาะเมื่อปรับไม่ได้
+        drift_ok = False
+        if not warm and tracker is not None and folder_name not in calibration['folders']:
+            drift_ok = calibrate_by_drift(tracker, ref_points, image_files[0])
+            if drift_ok:
+                save_calibration(CALIBRATION_FILE, 'cam5_transform', folder_name,
+                                 points_src, g_transforms)
+                print(f"บันทึก calibration ที่ปรับแล้ว: {CALIBRATION_FILE}")
+            elif HEADLESS and not AUTO_CORNERS:
+                print(f"ปรับ calibration อัตโนมัติไม่ได้ ข้าม")
+                continue
+
+        # headless + auto corners: โฟลเดอร์ที่ไม่มี calibration ใช้สี่เหลี่ยมที่หาได้โดยไม่ต้องยืนยัน
+        # หาไม่เจอ: ข้ามถ้า drift ก็ปรับไม่ได้ ไม่เช่นนั้นใช้ calibration ล่าสุดตามเดิม
+        detected_ok = False
+        if (not warm and not drift_ok and HEADLESS and AUTO_CORNERS
+                and folder_name not in calibration['folders']):
+            points_src = detect_corners(image_files[0]) or []
+            detected_ok = bool(points_src) and process_and_calculate_matrices()
+            if detected_ok:
+                save_calibration(CALIBRATION_FILE, 'cam5_transform', folder_name,
+                                 points_src, g_transforms)
+                print(f"บันทึก calibration ที่หาอัตโนมัติ: {CALIBRATION_FILE}")
+            elif tracker is not None:
+                print(f"ปรับ calibration อัตโนมัติไม่ได้ ข้าม")
+                continue
+
+        if warm:
+            print(f"ใช้ calibration ที่เตรียมไว้แล้ว ({len(g_transforms)} transform)")
+        elif drift_ok:
+            print(f"ใช้ calibration ที่ปรับตาม drift ({len(g_transforms)} transform)")
+        elif detected_ok:
+            print(f"ใช้ calibration ที่หามุมถาดอัตโนมัติ ({len(g_transforms)} transform)")
+        elif HEADLESS or (tracker is not None and folder_name in calibration['folders']):
+            points_src, g_transforms = get_folder_calibration(calibration, folder_name)
+            if not g_transforms:
+                print(f"ไม่พบ calibration สำหรับโฟลเดอร์นี้ ข้าม")
+                continue
+            attach_remap_tables(g_transforms, MAX_WARP_BYTES)
+            print(f"ใช้ calibration จากไฟล์ ({len(g_transforms)} transform)")
+        else:
+            SAMPLE_IMAGE = image_files[0]
+            img_setup = cv2.imread(SAMPLE_IMAGE)
+            if img_setup is None:
+                print(f"ERROR: ไม่สามารถโหลดภาพ '{SAMPLE_IMAGE}' ได้")
+                continue
+
+            initial_points = detect_corners(SAMPLE_IMAGE) if AUTO_CORNERS else None
+            if run_interactive_setup(img_setup, SAMPLE_IMAGE, initial_points):
+                save_calibration(CALIBRATION_FILE, 'cam5_transform', folder_name,
+                                 points_src, g_transforms)
+                print(f"บันทึก calibration: {CALIBRATION_FILE}")
+
+        if not g_transforms:
+            print(f"ข้ามโฟลเดอร์ {folder_name}")
             continue
-        
-        base_filename = os.path.splitext(os.path.basename(img_path))[0]
-        
+
+        # โหมด augmentation / letterbox: สร้าง matrix + ตาราง remap ของทุก variant ครั้งเดียวต่อโฟลเดอร์
+        # (calibration ที่บันทึกไว้ยังเป็น left_bend/right_bend แบบเดิม)
+        if augment_factors and not warm:
+            g_transforms = build_bend_variants(points_src, augment_factors, augment_directions)
+            for transform_data in g_transforms:
+                output_size = transform_data['output_size']
+                print(f"   ✓ Matrix ({transform_data['side']}): {output_size[0]}x{output_size[1]}")
+        if LETTERBOX_SIZE and not warm:
+            g_transforms = letterbox_transforms(g_transforms, (LETTERBOX_SIZE, LETTERBOX_SIZE))
+            for transform_data in g_transforms:
+                letterbox = transform_data['letterbox']
+                print(f"   ✓ letterbox ({transform_data['side']}): {letterbox['source_size'][0]}x"
+                      f"{letterbox['source_size'][1]} -> {LETTERBOX_SIZE}x{LETTERBOX_SIZE} "
+                      f"(scale {letterbox['scale']:.4f}, pad {letterbox['pad'][0]},{letterbox['pad'][1]})")
+        if (augment_factors or LETTERBOX_SIZE) and not warm:
+            attach_remap_tables(g_transforms, MAX_WARP_BYTES)
+        warm_transforms[folder_name] = (points_src, g_transforms)
+
+        output_base = os.path.join(OUTPUT_DIR, folder_name)
+        output_folders = {}
+    
         for transform_data in g_transforms:
             side = transform_data['side']
-            matrix = transform_data['matrix']
-            output_size = transform_data['output_size']
-            
-            composite = create_cropped_transform(img, matrix, output_size)
-            
-            save_path = os.path.join(output_folders[side], f"{base_filename}_{side}.jpg")
-            cv2.imwrite(save_path, composite, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        
-        if (i + 1) % 10 == 0 or (i + 1) == len(image_files):
-            print(f"   ✓ ประมวลผล {i+1}/{len(image_files)} ไฟล์")
+            folder_path = os.path.join(output_base, side)
+            if SAVE_BEND_IMAGES and shard_writer is None:
+                os.makedirs(folder_path, exist_ok=True)
+            output_folders[side] = folder_path
+
+        # label ของทุกภาพในโฟลเดอร์ (ไม่ผ่าน manifest) เร็วพอจะทำใหม่ทุกครั้งที่ calibration เปลี่ยน
+        if LABELS:
+            label_dir = os.path.join(RAW_LABEL_DIR or BASE_PATH, folder_name)
+            transform_label_folder(image_files, label_dir, g_transforms, output_folders)
+            if LABELS_ONLY:
+                continue
+
+        # scale/pad ของ letterbox ต่อ side (คงที่ทั้งโฟลเดอร์) ให้ฝั่ง training ใช้แปลงพิกัด
+        if LETTERBOX_SIZE:
+            os.makedirs(output_base, exist_ok=True)
+            save_letterbox_metadata(os.path.join(output_base, 'letterbox.json'), g_transforms)
+
+        panorama_folder = None
+        if MAKE_PANORAMA:
+            panorama_folder = os.path.join(PANORAMA_DIR, folder_name)
+            if shard_writer is None:
+                os.makedirs(panorama_folder, exist_ok=True)
+
+        if shard_writer is None:
+            print(f"\nโฟลเดอร์ผลลัพธ์:")
+            if SAVE_BEND_IMAGES:
+                for side, path in output_folders.items():
+                    print(f"   - {side}: {path}")
+            if panorama_folder is not None:
+                print(f"   - panorama: {panorama_folder}")
+
+        # ข้ามไฟล์ที่ผลลัพธ์เป็นปัจจุบันแล้ว (อินพุตและพารามิเตอร์ไม่เปลี่ยน)
+        params = {
+            'stage': 'cam5_transform',
+            'transforms': [{'side': t['side'], 'matrix': t['matrix'], 'output_size': t['output_size']}
+                           for t in g_transforms],
+            'bend_factor': BEND_FACTOR,
+            'jpeg_quality': JPEG_QUALITY,
+            'save_bends': SAVE_BEND_IMAGES,
+            'blend_width': BLEND_WIDTH if MAKE_PANORAMA else None,
+        }
+        if not encoder.is_default_jpeg(JPEG_QUALITY):
+            params['encoder'] = encoder.describe()
+        if shard_writer is not None:
+            params['shards'] = os.path.abspath(SHARD_DIR)
+        if LETTERBOX_SIZE:
+            params['letterbox'] = LETTERBOX_SIZE
+        if augment_factors:
+            params['augment'] = [augment_factors, augment_directions]
+        digest = params_digest(params)
+        all_files = image_files
+        all_count = len(image_files)
+        if not FORCE:
+            image_files = manifest.filter_pending(image_files, digest)
+            if len(image_files) < all_count:
+                print(f"\nข้าม {all_count - len(image_files)} ไฟล์ที่เป็นปัจจุบันแล้ว")
+        if not image_files:
+            print(f"ทุกไฟล์เป็นปัจจุบันแล้ว ข้ามโฟลเดอร์ {folder_name}")
+            continue
+
+        def on_written(img_path, saved):
+            manifest.record(img_path, digest, saved)
+            catalog.record_outputs(img_path, 'cam5_transform', saved)
+
+        # โหมด shard: ผลลัพธ์ของหนึ่งเฟรมเป็น sample เดียว key '<วันที่>/<ชื่อไฟล์>'
+        # (left_bend.jpg, right_bend.jpg, panorama.jpg) และ manifest บันทึก path ของ shard แทนไฟล์ภาพ
+        write_encoded = None
+        write_outputs = None
+        if shard_writer is not None:
+            def write_encoded(img_path, files):
+                base_filename = os.path.splitext(os.path.basename(img_path))[0]
+                return [shard_writer.write_sample(f"{folder_name}/{base_filename}", files)]
+
+            def write_outputs(img_path, outputs):
+                files = encode_outputs(os.path.splitext(os.path.basename(img_path))[0], outputs)
+                return None if files is None else write_encoded(img_path, files)
+
+        # ภาพของทั้งวันจาก frame cache (decode ครั้งเดียว รอบถัดไปอ่านจาก memmap)
+        # รอบ watch มีแค่ไม่กี่ไฟล์ใหม่ ไม่สร้าง cache ของทั้งวันใหม่
+        cached_day = None
+        if frame_cache is not None and not incremental:
+            cached_day = frame_cache.load_day(os.path.join(BASE_PATH, folder_name), all_files,
+                                              pending=len(image_files))
+        read_image = cached_day.read if cached_day is not None else None
+
+        if RUN_BENCHMARK:
+            bench_images = [cv2.imread(p) for p in image_files[:BENCHMARK_FRAMES]]
+            benchmark_transforms([im for im in bench_images if im is not None], g_transforms)
+
+        print(f"\nเริ่มแปลงภาพ {len(image_files)} ไฟล์\n")
+    
+        if pool is not None:
+            run_parallel_batch(pool, image_files, g_transforms, output_folders,
+                               encoder, panorama_folder=panorama_folder, blend_width=BLEND_WIDTH,
+                               save_bends=SAVE_BEND_IMAGES, max_warp_bytes=MAX_WARP_BYTES,
+                               on_written=on_written,
+                               write_encoded=write_encoded, cached_day=cached_day)
+        else:
+            def process_frame(img, img_path):
+                base_filename = os.path.splitext(os.path.basename(img_path))[0]
+                outputs = []
+                warped = {}
+                for transform_data in g_transforms:
+                    side = transform_data['side']
+                    matrix = transform_data['matrix']
+                    output_size = transform_data['output_size']
+
+                    composite = create_cropped_transform(img, matrix, output_size,
+                                                         maps=transform_data.get('maps'),
+                                                         max_bytes=MAX_WARP_BYTES,
+                                                         pool=buffer_pool,
+                                                         letterbox=transform_data.get('letterbox'))
+                    warped[side] = composite
+
+                    if SAVE_BEND_IMAGES:
+                        save_path = os.path.join(output_folders[side], f"{base_filename}_{side}{encoder.ext}")
+                        outputs.append((save_path, composite, encoder))
+
+                if panorama_folder is not None:
+                    panorama = blend_bend_pair(blender, warped, MAX_WARP_BYTES)
+                    save_path = os.path.join(panorama_folder, f"{base_filename}_panorama{encoder.ext}")
+                    outputs.append((save_path, panorama, encoder))
+                    if not SAVE_BEND_IMAGES:
+                        buffer_pool.release(*warped.values())
+                return outputs
+
+            pool_before = buffer_pool.counters()
+
+            run_frame_pipeline(image_files, process_frame,
+                               num_readers=PIPELINE_READERS,
+                               num_writers=PIPELINE_WRITERS,
+                               max_in_flight=MAX_IN_FLIGHT,
+                               on_written=on_written,
+                               write_outputs=write_outputs,
+                               read_image=read_image,
+                               buffer_pool=buffer_pool)
+            buffer_pool.report("   ", since=pool_before)
+
+        manifest.save()
+        catalog.commit()
+        if incremental and shard_writer is not None:
+            # ปิด shard ทันทีให้ระบบปลายทางเห็นภาพใหม่ (เฟรมถัดไปขึ้น shard ใหม่)
+            shard_writer.close()
+
+        print(f"\n{'='*70}")
+        print(f"เสร็จสิ้นโฟลเดอร์ {folder_name} ({len(image_files)} ไฟล์, {time.perf_counter() - pass_start:.1f} s)")
+        print(f"{'='*70}")
+
+    if pool is not None:
+        pool.shutdown()
+    if shard_writer is not None:
+        shard_writer.close()
+        print(f"\nเขียน {shard_writer.samples} sample ({shard_writer.bytes_written / 1e6:.1f} MB) ลง shard ที่ {SHARD_DIR}")
+    catalog.close()
 
     print(f"\n{'='*70}")
-    print(f"เสร็จสิ้นโฟลเดอร์ {folder_name}")
+    print("เสร็จสิ้นทุกโฟลเดอร์")
+    print("สรุปการ encode:")
+    encoder.stats.report("   ")
     print(f"{'='*70}")
 
-print(f"\n{'='*70}")
-print("เสร็จสิ้นทุกโฟลเดอร์")
-print(f"{'='*70}")
\ No newline at end of file
+
+if __name__ == '__main__':
+    main()
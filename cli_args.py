@@ -0,0 +1,19 @@
+import sys
+
+
+def get_arg_value(name, default):
+    """
+    อ่านค่าจาก command line เช่น --workers 8 (แปลงเป็นชนิดเดียวกับ default)
+    ไม่มี flag หรือไม่มีค่าตามหลัง: คืน default
+    ค่าแปลงไม่ได้ (เช่น --workers abc): แจ้ง flag ที่ผิดแล้วออกจากโปรแกรม แทน traceback ของ ValueError
+    """
+    if name in sys.argv:
+        idx = sys.argv.index(name)
+        if idx + 1 < len(sys.argv):
+            value = sys.argv[idx + 1]
+            try:
+                return type(default)(value)
+            except ValueError:
+                print(f"ERROR: {name} '{value}' ต้องเป็น {type(default).__name__}")
+                sys.exit()
+    return default
@@ -1,59 +1,151 @@
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import sys
 
+from frame_catalog import FrameCatalog, DEFAULT_CATALOG
+from shard_writer import ShardWriter, DEFAULT_SHARD_BYTES
+from cli_args import get_arg_value
+
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
 
-def merge_images_to_cam5(source_folder, destination_folder="cam5"):
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
+
+
+def plan_copies(source_folder, destination_folder, catalog):
+    """
+    วางแผนชื่อปลายทางทั้งหมดก่อนเริ่มคัดลอก
+    รายชื่อไฟล์ต้นทางมาจาก catalog (scan แบบ incremental แทน os.walk)
+    ชื่อซ้ำตรวจจาก set ในหน่วยความจำ (สร้างจากโฟลเดอร์ปลายทางครั้งเดียว) ไม่ต้องถามดิสก์ทีละไฟล์
+    คืน list ของ (source_path, destination_path, ขนาดไฟล์)
+    """
+    taken = {os.path.normcase(name) for name in os.listdir(destination_folder)}
+    plan = []
+
+    catalog.scan(source_folder)
+
+    # วนลูปผ่านทุกไฟล์ใน catalog (folder เป็น path สัมพัทธ์คั่นด้วย '/')
+    for source_path, relative_path, file, size in catalog.files(source_folder):
+        file_ext = os.path.splitext(file)[1].lower()
+        if file_ext not in IMAGE_EXTENSIONS:
+            continue
+
+        if relative_path == ".":
+            new_filename = file
+        else:
+            prefix = relative_path.replace("/", "_")
+            name, ext = os.path.splitext(file)
+            new_filename = f"{prefix}_{name}{ext}"
+
+        candidate = new_filename
+        counter = 1
+        while os.path.normcase(candidate) in taken:
+            name, ext = os.path.splitext(new_filename)
+            candidate = f"{name}_{counter}{ext}"
+            counter += 1
+        taken.add(os.path.normcase(candidate))
+
+        plan.append((source_path, os.path.join(destination_folder, candidate), size))
+
+    return plan
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def merge_images_to_cam5(source_folder, destination_folder="cam5", num_workers=8,
+                         report_interval=2.0, catalog_path=DEFAULT_CATALOG, shard_dir=None,
+                         shard_bytes=DEFAULT_SHARD_BYTES):
+    """
+    shard_dir: ถ้ากำหนด จะเขียนภาพลง tar shard ในโฟลเดอร์นี้แทนการคัดลอกทีละไฟล์
+    (key ของ sample คือชื่อไฟล์ปลายทางที่ไม่รวมนามสกุล)
+    """
+
+    if not os.path.isdir(source_folder):
+        print(f"ERROR: ไม่พบโฟลเดอร์ต้นทาง: {source_folder}")
+        sys.exit()
+
+    shard_writer = None
+    if shard_dir:
+        destination_folder = shard_dir
+        shard_writer = ShardWriter(shard_dir, prefix='all_images', max_bytes=shard_bytes)
 
     os.makedirs(destination_folder, exist_ok=True)
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
     total_copied = 0
-    
+
     print(f"เริ่มรวมภาพจาก: {source_folder}")
-    print(f"ไปยังโฟลเดอร์: {destination_folder}")
+    print(f"ไปยัง{'ชุด shard' if shard_writer is not None else 'โฟลเดอร์'}: {destination_folder}")
     print("-" * 50)
-    
-    # วนลูปผ่านทุกโฟลเดอร์และไฟล์
-    for root, dirs, files in os.walk(source_folder):
-        for file in files:
-            file_ext = os.path.splitext(file)[1].lower()
-            if file_ext in image_extensions:
-                source_path = os.path.join(root, file)
-                
-                relative_path = os.path.relpath(root, source_folder)
-                if relative_path == ".":
-                    new_filename = file
-                else:
-                    prefix = relative_path.replace(os.sep, "_")
-                    name, ext = os.path.splitext(file)
-                    new_filename = f"{prefix}_{name}{ext}"
-                
-                destination_path = os.path.join(destination_folder, new_filename)
-                
-                counter = 1
-                while os.path.exists(destination_path):
-                    name, ext = os.path.splitext(new_filename)
-                    destination_path = os.path.join(destination_folder, f"{name}_{counter}{ext}")
-                    counter += 1
-                
-                try:
-                    shutil.copy2(source_path, destination_path)
-                    total_copied += 1
-                    print(f"✓ คัดลอก: {source_path} -> {destination_path}")
-                except Exception as e:
-                    print(f"✗ ข้อผิดพลาด: {source_path} - {str(e)}")
-    
+
+    catalog = FrameCatalog(catalog_path)
+    try:
+        plan = plan_copies(source_folder, destination_folder, catalog)
+    finally:
+        catalog.close()
+    total_files = len(plan)
+    total_bytes = sum(size for _, _, size in plan)
+    print(f"พบภาพ {total_files} ไฟล์ ({total_bytes / 1e6:.1f} MB) คัดลอกด้วย {num_workers} thread")
+
+    def copy_one(item):
+        source_path, destination_path, size = item
+        if shard_writer is None:
+            shutil.copy2(source_path, destination_path)
+        else:
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            key, ext = os.path.splitext(os.path.basename(destination_path))
+            shard_writer.write_sample(key, {ext[1:]: data})
+        return size
+
+    errors = 0
+    copied_bytes = 0
+    start = time.perf_counter()
+    last_report = start
+
+    # แสดงสรุปเป็นระยะแทนการพิมพ์ทุกไฟล์ (การพิมพ์ทีละบรรทัดช้ากว่าการคัดลอกเอง)
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        futures = {pool.submit(copy_one, item): item for item in plan}
+        for future in as_completed(futures):
+            try:
+                copied_bytes += future.result()
+                total_copied += 1
+            except Exception as e:
+                errors += 1
+                print(f"✗ ข้อผิดพลาด: {futures[future][0]} - {str(e)}")
+
+            now = time.perf_counter()
+            if now - last_report >= report_interval:
+                last_report = now
+                elapsed = now - start
+                done = total_copied + errors
+                files_per_s = done / elapsed
+                mb_per_s = copied_bytes / 1e6 / elapsed
+                remaining = (total_bytes - copied_bytes) / (copied_bytes / elapsed) if copied_bytes else 0
+                print(f"  {done}/{total_files} ไฟล์ | {files_per_s:.0f} ไฟล์/s | "
+                      f"{mb_per_s:.1f} MB/s | ETA {_format_eta(remaining)}")
+
+    if shard_writer is not None:
+        shard_writer.close()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
     print("-" * 50)
-    print(f"เสร็จสิ้น คัดลอกภาพทั้งหมด {total_copied} ไฟล์")
+    print(f"เสร็จสิ้น คัดลอกภาพทั้งหมด {total_copied} ไฟล์ ใน {elapsed:.1f} s "
+          f"({total_copied / elapsed:.0f} ไฟล์/s, {copied_bytes / 1e6 / elapsed:.1f} MB/s)")
+    if errors:
+        print(f"ผิดพลาด {errors} ไฟล์")
     print(f"ภาพทั้งหมดอยู่ที่: {os.path.abspath(destination_folder)}")
 
 
 
 if __name__ == "__main__":
-    
-    source = r"D:\cuu_hidro\result\cam5_panorama_24H"  
-    merge_images_to_cam5(source)
-    
+
+    source = r"D:\cuu_hidro\result\cam5_panorama_24H"
+    num_workers = get_arg_value('--workers', 8)
+    shard_dir = get_arg_value('--shards', '') or None
+    merge_images_to_cam5(source, num_workers=num_workers, shard_dir=shard_dir)
+
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import cv2
+
+
+DEFAULT_MAX_DIM = 640      # ขนาดด้านยาวของภาพที่ใช้ match (pixel)
+DEFAULT_FEATURES = 1000
+DEFAULT_MIN_INLIERS = 25
+DEFAULT_THRESHOLD = 15.0   # ระยะเลื่อนสูงสุดของจุด calibration (pixel ของภาพเต็ม) ที่ยอมให้ปรับอัตโนมัติ
+REDUCED_FACTOR = 4         # decode JPEG ที่ 1/4 ด้วย IMREAD_REDUCED_GRAYSCALE_4 (เร็วกว่า decode เต็มมาก)
+
+
+def load_small_gray(img_path, max_dim=DEFAULT_MAX_DIM):
+    """
+    อ่านภาพเป็น grayscale ขนาดเล็ก (ด้านยาวไม่เกิน max_dim)
+    คืน (gray, scale) โดย scale = ขนาดภาพเล็ก / ขนาดภาพเต็ม หรือ (None, None) ถ้าอ่านไม่ได้
+    """
+    gray = cv2.imread(img_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None, None
+    scale = 1.0 / REDUCED_FACTOR
+
+    longest = max(gray.shape[:2])
+    if longest > max_dim:
+        factor = max_dim / longest
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        scale *= factor
+    return gray, scale
+
+
+class DriftTracker:
+    """
+    ประมาณการเลื่อนของกล้องเทียบกับภาพอ้างอิง (ภาพที่ใช้คลิก calibration)
+    match ORB feature บนภาพย่อ แล้วหา homography ด้วย RANSAC (feature ของภาพอ้างอิงคำนวณครั้งเดียว)
+    homography ที่ได้แปลงพิกัดภาพอ้างอิง (ภาพเต็ม) -> พิกัดภาพใหม่ (ภาพเต็ม)
+    """
+
+    def __init__(self, reference_path, max_dim=DEFAULT_MAX_DIM, num_features=DEFAULT_FEATURES,
+                 min_inliers=DEFAULT_MIN_INLIERS):
+        self.max_dim = max_dim
+        self.min_inliers = min_inliers
+        self._orb = cv2.ORB_create(nfeatures=num_features)
+        self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+        gray, self._ref_scale = load_small_gray(reference_path, max_dim)
+        if gray is None:
+            raise FileNotFoundError(f"ไม่สามารถโหลดภาพอ้างอิง: {reference_path}")
+        self._ref_kp, self._ref_desc = self._orb.detectAndCompute(gray, None)
+        if self._ref_desc is None or len(self._ref_kp) < min_inliers:
+            raise ValueError(f"ภาพอ้างอิงมี feature น้อยเกินไป ({len(self._ref_kp)} จุด): {reference_path}")
+
+    def estimate(self, img_path):
+        """
+        คืน dict: 'homography' (3x3 บนภาพเต็ม หรือ None ถ้า match ไม่ได้), 'inliers', 'matches', 'ms'
+        """
+        start = time.perf_counter()
+        result = {'homography': None, 'inliers': 0, 'matches': 0, 'ms': 0.0}
+
+        gray, scale = load_small_gray(img_path, self.max_dim)
+        if gray is not None:
+            kp, desc = self._orb.detectAndCompute(gray, None)
+            if desc is not None and len(kp) >= self.min_inliers:
+                # ratio test ของ Lowe ตัด match ที่กำกวม
+                pairs = self._matcher.knnMatch(self._ref_desc, desc, k=2)
+                good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < 0.75 * p[1].distance]
+                result['matches'] = len(good)
+
+                if len(good) >= self.min_inliers:
+                    src = np.float32([self._ref_kp[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+                    dst = np.float32([kp[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+                    h_small, mask = cv2.findHomography(src, dst, cv2.RANSAC, 3.0)
+                    inliers = int(mask.sum()) if mask is not None else 0
+                    result['inliers'] = inliers
+                    if h_small is not None and inliers >= self.min_inliers:
+                        # ภาพย่อ -> ภาพเต็ม: H = S_new^-1 @ H_small @ S_ref
+                        s_ref = np.diag([self._ref_scale, self._ref_scale, 1.0])
+                        s_new_inv = np.diag([1.0 / scale, 1.0 / scale, 1.0])
+                        result['homography'] = s_new_inv @ h_small @ s_ref
+
+        result['ms'] = (time.perf_counter() - start) * 1000
+        return result
+
+
+def track_points(homography, points):
+    """แปลงจุด calibration ของภาพอ้างอิงไปยังตำแหน่งในภาพใหม่"""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(pts, homography).reshape(-1, 2)
+
+
+def drift_distance(homography, points):
+    """ระยะเลื่อนสูงสุดของจุด calibration (pixel ของภาพเต็ม)"""
+    moved = track_points(homography, points)
+    return float(np.max(np.linalg.norm(moved - np.asarray(points, dtype=np.float64), axis=1)))
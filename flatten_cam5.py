@@ -1,27 +1,118 @@
+import errno
 import os
 import shutil
 import sys
 from pathlib import Path
 
+from frame_catalog import FrameCatalog, DEFAULT_CATALOG
+
 IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.gif', '.webp'}
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+# Linux FICLONE ioctl (btrfs, XFS, ...): share data blocks copy-on-write
+FICLONE = 0x40049409
+
+
+class NameIndex:
+    """In-memory index of names in the destination, built once with a single scandir.
+
+    Collision resolution only consults this index, never the filesystem.
+    """
+
+    def __init__(self, dest_dir: Path):
+        self.names = set()
+        self.next_suffix = {}
+        with os.scandir(dest_dir) as it:
+            for entry in it:
+                self.names.add(os.path.normcase(entry.name))
 
+    def __contains__(self, name: str) -> bool:
+        return os.path.normcase(name) in self.names
 
-def unique_name(dest_dir: Path, name: str) -> str:
+    def add(self, name: str) -> None:
+        self.names.add(os.path.normcase(name))
+
+
+def unique_name(index: NameIndex, name: str) -> str:
     base, ext = os.path.splitext(name)
     candidate = name
-    i = 1
-    while (dest_dir / candidate).exists():
+    key = os.path.normcase(name)
+    i = index.next_suffix.get(key, 1)
+    while candidate in index:
         candidate = f"{base}_{i}{ext}"
         i += 1
+    index.next_suffix[key] = i
+    index.add(candidate)
     return candidate
 
 
+def reflink(src: Path, dst: Path) -> None:
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def place_file(src: Path, dst: Path, mode: str) -> bool:
+    """Create dst from src using mode. Returns False if it fell back to a full copy."""
+    if mode == 'copy':
+        shutil.copy2(src, dst)
+        return True
+
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+        elif mode == 'symlink':
+            os.symlink(src.resolve(), dst)
+        elif mode == 'reflink':
+            if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+                raise OSError(errno.EOPNOTSUPP, 'reflink not supported on this platform')
+            reflink(src, dst)
+        return True
+    except (OSError, NotImplementedError) as e:
+        if isinstance(e, FileExistsError):
+            raise
+        shutil.copy2(src, dst)
+        return False
+
+
+def parse_args(argv):
+    """Positional: [src] [dest]. Options: --mode copy|hardlink|reflink|symlink, --catalog PATH"""
+    mode = 'copy'
+    catalog_path = DEFAULT_CATALOG
+    positional = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--mode' and i + 1 < len(argv):
+            mode = argv[i + 1]
+            i += 2
+            continue
+        if argv[i] == '--catalog' and i + 1 < len(argv):
+            catalog_path = argv[i + 1]
+            i += 2
+            continue
+        positional.append(argv[i])
+        i += 1
+    return positional, mode, catalog_path
+
+
 def main():
     default_src = Path(r"D:\cuu_hidro\data\cam5_24H")
     default_dest = default_src / "all_images"
 
-    src = Path(sys.argv[1]) if len(sys.argv) > 1 else default_src
-    dest = Path(sys.argv[2]) if len(sys.argv) > 2 else default_dest
+    args, mode, catalog_path = parse_args(sys.argv[1:])
+    src = Path(args[0]) if len(args) > 0 else default_src
+    dest = Path(args[1]) if len(args) > 1 else default_dest
+
+    if mode not in LINK_MODES:
+        print(f"Unknown --mode '{mode}'. Choose one of: {', '.join(LINK_MODES)}")
+        sys.exit(1)
 
     if not src.exists() or not src.is_dir():
         print(f"Source folder does not exist or is not a directory: {src}")
@@ -41,50 +132,59 @@ def main():
 
     # Create dest
     dest.mkdir(parents=True, exist_ok=True)
+    index = NameIndex(dest)
 
     copied = 0
     skipped = 0
     collisions = 0
+    fallbacks = 0
     errors = 0
 
-    for root, dirs, files in os.walk(src):
-        root_path = Path(root)
+    # Incremental scandir of the source; unchanged folders are answered from the catalog
+    catalog = FrameCatalog(catalog_path)
+    catalog.scan(src, exclude=[dest])   # dest may live inside src; its files are not source frames
+    src_files = catalog.files(src)
+    catalog.close()
+
+    dest_prefix = os.path.join(os.path.abspath(dest), '')
+    for path, _folder, f, _size in src_files:
         # skip the destination folder if it's inside source
+        # (this avoids copying files from the destination itself)
+        if path.startswith(dest_prefix):
+            continue
+
+        fp = Path(path)
+        if fp.suffix.lower() not in IMAGE_EXTS:
+            skipped += 1
+            continue
+
+        parent_name = fp.parent.name
+        # Compose new name: parent_originalname
+        new_name = f"{parent_name}_{f}" if parent_name else f
+
+        # If taken, use numeric suffix
+        if new_name in index:
+            collisions += 1
+            new_name = unique_name(index, os.path.splitext(new_name)[0] + fp.suffix)
+        else:
+            index.add(new_name)
+        dest_path = dest / new_name
+
         try:
-            if dest_resolved in root_path.resolve().parents or root_path.resolve() == dest_resolved:
-                # This avoids copying files from the destination itself
-                continue
-        except Exception:
-            pass
-
-        for f in files:
-            fp = root_path / f
-            if fp.suffix.lower() not in IMAGE_EXTS:
-                skipped += 1
-                continue
-
-            parent_name = root_path.name
-            # Compose new name: parent_originalname
-            new_name = f"{parent_name}_{f}" if parent_name else f
-            dest_path = dest / new_name
-
-            # If exists, use numeric suffix
-            if dest_path.exists():
-                collisions += 1
-                new_name = unique_name(dest, os.path.splitext(new_name)[0] + fp.suffix)
-                dest_path = dest / new_name
-
-            try:
-                shutil.copy2(fp, dest_path)
-                copied += 1
-            except Exception as e:
-                print(f"Error copying {fp} -> {dest_path}: {e}")
-                errors += 1
+            if not place_file(fp, dest_path, mode):
+                fallbacks += 1
+            copied += 1
+        except Exception as e:
+            print(f"Error placing {fp} -> {dest_path}: {e}")
+            errors += 1
 
     print("\nDone.")
     print(f"Source: {src}")
     print(f"Destination: {dest}")
-    print(f"Copied: {copied}")
+    print(f"Mode: {mode}")
+    print(f"Placed: {copied}")
+    if mode != 'copy':
+        print(f"Fell back to copy: {fallbacks}")
     print(f"Skipped (non-images): {skipped}")
     print(f"Collisions handled: {collisions}")
     print(f"Errors: {errors}")
@@ -0,0 +1,90 @@
+import os
+import time
+
+
+DEFAULT_INTERVAL = 2.0     # วินาทีระหว่างการ poll
+DEFAULT_SETTLE = 2.0       # ไฟล์ต้องไม่เปลี่ยนอย่างน้อยเท่านี้ (วินาที) ถึงถือว่ากล้องเขียนเสร็จแล้ว
+
+
+class FolderWatcher:
+    """
+    เฝ้าโฟลเดอร์วันใต้ root (root/<วันที่>/*.jpg) ด้วย scandir แบบ poll
+    mtime ของโฟลเดอร์เป็น watermark: โฟลเดอร์ที่ mtime ไม่เปลี่ยน (ไม่มีไฟล์เพิ่ม/ลบ) ไม่ต้อง list ใหม่
+    ไฟล์ที่ยังเขียนไม่เสร็จ (mtime ใหม่กว่า settle หรือขนาดยังเปลี่ยนระหว่างสองรอบ) รอรอบถัดไป
+    โฟลเดอร์จะถูกรายงานเมื่อไฟล์ใหม่ทั้งหมดในโฟลเดอร์นั้นนิ่งแล้วเท่านั้น
+    ไฟล์ที่มีอยู่ตอนสร้าง watcher ถือว่ารู้จักแล้ว (ให้รอบประมวลผลปกติจัดการ)
+    """
+
+    def __init__(self, root, suffix='.jpg', settle_seconds=DEFAULT_SETTLE):
+        self.root = os.path.abspath(root)
+        self.suffix = suffix
+        self.settle_ns = int(settle_seconds * 1e9)
+        self._root_mtime = None
+        self._dir_mtime = {}      # โฟลเดอร์ -> mtime ที่ list ครบแล้ว (watermark)
+        self._known = {}          # โฟลเดอร์ -> {ชื่อไฟล์: (size, mtime_ns)}
+        self._unsettled = {}      # โฟลเดอร์ -> {ชื่อไฟล์: (size, mtime_ns)} ที่เห็นในรอบก่อน
+        self.poll(prime=True)
+
+    def _list(self, directory):
+        files = {}
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix) and entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def _folders(self):
+        """โฟลเดอร์วันทั้งหมด (list root ใหม่เฉพาะเมื่อ mtime ของ root เปลี่ยน)"""
+        root_mtime = os.stat(self.root).st_mtime_ns
+        if root_mtime != self._root_mtime:
+            with os.scandir(self.root) as it:
+                current = {entry.path for entry in it if entry.is_dir()}
+            for path in list(self._dir_mtime):
+                if path not in current:
+                    del self._dir_mtime[path]
+                    self._known.pop(path, None)
+                    self._unsettled.pop(path, None)
+            for path in current:
+                self._dir_mtime.setdefault(path, None)
+            self._root_mtime = root_mtime
+        return sorted(self._dir_mtime)
+
+    def poll(self, prime=False):
+        """คืน list ของโฟลเดอร์ (เรียงตามชื่อ) ที่มีไฟล์ใหม่ซึ่งเขียนเสร็จแล้ว"""
+        now = time.time_ns()
+        ready = []
+        for directory in self._folders():
+            try:
+                dir_mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if dir_mtime == self._dir_mtime[directory] and directory not in self._unsettled:
+                continue
+
+            files = self._list(directory)
+            known = self._known.get(directory, {})
+            new = {name: sig for name, sig in files.items() if known.get(name) != sig}
+
+            if not prime:
+                previous = self._unsettled.get(directory, {})
+                unsettled = {name: sig for name, sig in new.items()
+                             if now - sig[1] < self.settle_ns or previous.get(name) != sig}
+                if unsettled:
+                    self._unsettled[directory] = new
+                    continue
+
+            self._unsettled.pop(directory, None)
+            self._known[directory] = files
+            self._dir_mtime[directory] = dir_mtime
+            if new and not prime:
+                ready.append(directory)
+        return ready
+
+    def wait(self, interval=DEFAULT_INTERVAL):
+        """poll ทุก interval วินาทีจนกว่าจะมีโฟลเดอร์ที่มีไฟล์ใหม่"""
+        while True:
+            ready = self.poll()
+            if ready:
+                return ready
+            time.sleep(interval)
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+from output_manifest import file_signature
+
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_BYTES = 8 << 30
+BUILD_MIN_PENDING = 0.5     # สร้าง cache ของวันใหม่เมื่อเฟรมที่ต้องทำมีอย่างน้อยสัดส่วนนี้ของทั้งวัน
+
+
+def load_cached_frame(entry):
+    """
+    เปิดภาพจาก entry (data_path, offset, shape) แบบ memory-mapped (ไม่ copy, อ่านอย่างเดียว)
+    ใช้ใน worker process ที่ไม่มี FrameCache ของตัวเอง
+    """
+    data_path, offset, shape = entry
+    return np.memmap(data_path, dtype=np.uint8, mode='r', offset=offset, shape=tuple(shape))
+
+
+class CachedDay:
+    """ภาพที่ decode แล้วของหนึ่งโฟลเดอร์วัน: read(path) คืน view ของ memmap (zero-copy)"""
+
+    def __init__(self, data_path, frames):
+        self.data_path = data_path
+        self.frames = frames
+        self._data = np.memmap(data_path, dtype=np.uint8, mode='r') if frames else None
+
+    def entry(self, img_path):
+        frame = self.frames.get(os.path.abspath(img_path))
+        if frame is None:
+            return None
+        return self.data_path, frame['offset'], frame['shape']
+
+    def read(self, img_path):
+        """ภาพจาก cache ถ้ามี ไม่มีก็ decode จากไฟล์ตามปกติ"""
+        frame = self.frames.get(os.path.abspath(img_path))
+        if frame is None:
+            return cv2.imread(img_path)
+        offset = frame['offset']
+        size = int(np.prod(frame['shape']))
+        return self._data[offset:offset + size].reshape(frame['shape'])
+
+    def close(self):
+        """ปล่อย memmap (บน Windows ไฟล์ที่ยัง map อยู่ลบไม่ได้) หลังจากนี้ read() decode จากไฟล์แทน"""
+        self._data = None
+        self.frames = {}
+
+
+class FrameCache:
+    """
+    cache ภาพที่ decode แล้ว แยกไฟล์ตามโฟลเดอร์วัน: <key>.u8 (pixel uint8 ต่อกัน) + <key>.json (offset/shape ต่อไฟล์)
+    รอบแรก decode ครั้งเดียวแล้วเขียนลงดิสก์ รอบถัดไปอ่านด้วย np.memmap ไม่ต้อง decode JPEG ใหม่
+    ถ้าไฟล์ต้นฉบับในโฟลเดอร์เปลี่ยน (size/mtime หรือเพิ่ม/ลบไฟล์) จะสร้างของวันนั้นใหม่
+    ขนาดรวมไม่เกิน max_bytes: ลบวันที่ใช้ล่าสุดนานที่สุดก่อน (LRU ตาม mtime ของไฟล์ index)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_BYTES, num_threads=4):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.num_threads = num_threads
+        self._open_day = None   # CachedDay ล่าสุดที่คืนไป (ปิดก่อนโหลดวันถัดไป)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, folder_path):
+        folder_path = os.path.abspath(folder_path)
+        digest = hashlib.sha1(folder_path.encode('utf-8')).hexdigest()[:10]
+        base = os.path.join(self.cache_dir, f"{os.path.basename(folder_path)}-{digest}")
+        return base + '.u8', base + '.json'
+
+    def _days(self):
+        """[(เวลาใช้ล่าสุด, index_path, data_path, ขนาด)] ของทุกวันใน cache"""
+        days = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.json'):
+                    continue
+                data_path = entry.path[:-len('.json')] + '.u8'
+                try:
+                    size = os.path.getsize(data_path)
+                except OSError:
+                    size = 0
+                days.append((entry.stat().st_mtime_ns, entry.path, data_path, size))
+        return days
+
+    def _evict(self, needed):
+        days = sorted(self._days())
+        used = sum(size for _, _, _, size in days)
+        for _, index_path, data_path, size in days:
+            if used + needed <= self.max_bytes:
+                break
+            # ลบไฟล์ข้อมูลก่อน ถ้ายังถูก map อยู่ (Windows) ข้ามวันนั้นไป index ยังอยู่ครบคู่
+            try:
+                os.remove(data_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"frame cache: ลบ {os.path.basename(data_path)} ไม่ได้ ข้าม ({e})")
+                continue
+            try:
+                os.remove(index_path)
+            except OSError:
+                pass
+            used -= size
+            print(f"frame cache: ลบ {os.path.basename(data_path)} ({size / 1e6:.0f} MB)")
+
+    def load_day(self, folder_path, image_files, pending=None):
+        """
+        คืน CachedDay ของโฟลเดอร์ (สร้างใหม่ถ้ายังไม่มีหรือไม่ตรงกับไฟล์ปัจจุบัน)
+        pending: จำนวนเฟรมที่ต้องประมวลผลรอบนี้ ถ้าน้อยกว่า BUILD_MIN_PENDING ของทั้งวันจะไม่สร้าง cache ใหม่
+                 (decode ทั้งวันเพื่อใช้ไม่กี่เฟรมช้ากว่าไม่มี cache)
+        คืน None ถ้าไม่มี cache ที่ใช้ได้ หรือทั้งวันใหญ่กว่าขนาด cache (ผู้เรียก decode เองตามปกติ)
+        """
+        if self._open_day is not None:
+            self._open_day.close()
+            self._open_day = None
+
+        data_path, index_path = self._paths(folder_path)
+        signatures = {os.path.abspath(p): file_signature(p) for p in image_files}
+
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            frames = index['frames']
+            failed = index['failed']
+            if (index.get('version') == CACHE_VERSION
+                    and frames.keys() | failed.keys() == signatures.keys()
+                    and all(frames[p]['signature'] == signatures[p] for p in frames)
+                    and all(failed[p] == signatures[p] for p in failed)
+                    and os.path.getsize(data_path) == index['bytes']):
+                os.utime(index_path)
+                self._open_day = CachedDay(data_path, frames)
+                return self._open_day
+        except (OSError, ValueError, KeyError):
+            pass
+
+        if pending is not None and pending < BUILD_MIN_PENDING * len(signatures):
+            return None
+        self._open_day = self._build_day(folder_path, sorted(signatures), signatures,
+                                         data_path, index_path)
+        return self._open_day
+
+    def _build_day(self, folder_path, image_files, signatures, data_path, index_path):
+        for path in (index_path, data_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"frame cache: ลบ {os.path.basename(path)} ไม่ได้ ไม่ใช้ cache ({e})")
+                return None
+
+        frames = {}
+        failed = {}
+        offset = 0
+        chunk = max(1, self.num_threads * 2)
+        tmp_path = data_path + '.tmp'
+        with ThreadPoolExecutor(max_workers=self.num_threads) as pool, open(tmp_path, 'wb') as out:
+            # decode ทีละกลุ่ม เพื่อไม่ให้ภาพทั้งวันค้างในหน่วยความจำ
+            for start in range(0, len(image_files), chunk):
+                batch = image_files[start:start + chunk]
+                for img_path, img in zip(batch, pool.map(cv2.imread, batch)):
+                    if img is None:
+                        failed[img_path] = signatures[img_path]
+                        continue
+                    if offset + img.nbytes > self.max_bytes:
+                        out.close()
+                        os.remove(tmp_path)
+                        print(f"frame cache: {os.path.basename(folder_path)} ใหญ่กว่าขนาด cache ไม่ใช้ cache")
+                        return None
+                    out.write(np.ascontiguousarray(img).data)
+                    frames[img_path] = {'offset': offset, 'shape': list(img.shape),
+                                        'signature': signatures[img_path]}
+                    offset += img.nbytes
+
+        self._evict(offset)
+        os.replace(tmp_path, data_path)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'bytes': offset, 'frames': frames,
+                       'failed': failed}, f)
+        os.replace(index_path + '.tmp', index_path)
+        print(f"frame cache: บันทึก {len(frames)} ภาพ ({offset / 1e6:.0f} MB) ของ {os.path.basename(folder_path)}")
+        return CachedDay(data_path, frames)
@@ -0,0 +1,272 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frame_catalog.sqlite')
+
+# ชื่อไฟล์ YYYYMMDD_hhmmss[...].jpg
+FRAME_NAME_RE = re.compile(r'^(\d{8})_(\d{2})\d{4}')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    camera TEXT,
+    date TEXT,
+    hour INTEGER,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS idx_frames_folder ON frames (root, folder, name);
+CREATE INDEX IF NOT EXISTS idx_frames_time ON frames (camera, date, hour);
+
+CREATE TABLE IF NOT EXISTS dirs (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs (root, parent);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    frame_path TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    PRIMARY KEY (frame_path, stage, output_path)
+);
+CREATE INDEX IF NOT EXISTS idx_outputs_stage ON outputs (stage, frame_path);
+"""
+
+
+def parse_frame_name(name):
+    """คืน (date 'YYYYMMDD', hour) จากชื่อไฟล์ หรือ (None, None) ถ้าไม่ตรงรูปแบบ"""
+    match = FRAME_NAME_RE.match(name)
+    if match is None:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+class FrameCatalog:
+    """
+    catalog ของไฟล์ภาพใน SQLite: camera, date, hour, path, size, mtime และไฟล์ผลลัพธ์ของแต่ละ stage
+    scan() อัปเดตแบบ incremental ด้วย scandir: โฟลเดอร์ที่ mtime ไม่เปลี่ยน (ไม่มีไฟล์เพิ่ม/ลบ)
+    ไม่ต้อง list ใหม่ แต่ละ stage เลือกงานด้วย query ที่มี index แทนการ listdir/glob/os.walk
+    """
+
+    def __init__(self, db_path=DEFAULT_CATALOG):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._pending = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    # --- อัปเดต catalog ---
+    def scan(self, root, camera=None, full=False, exclude=()):
+        """
+        อัปเดตข้อมูลไฟล์ใต้ root (ทุกระดับ)
+        full=True: list ทุกโฟลเดอร์ใหม่ (ใช้เมื่อมีการเขียนทับไฟล์เดิมโดยไม่เพิ่ม/ลบไฟล์)
+        exclude: โฟลเดอร์ใต้ root ที่ไม่นับ (เช่น โฟลเดอร์ผลลัพธ์ที่อยู่ใน root) ของเดิมใน catalog ถูกลบออก
+        camera เป็นค่าของทั้ง root: scan ที่ระบุ camera ตั้งให้ทุกไฟล์ใต้ root ส่วน scan ที่ไม่ระบุใช้ค่าเดิม
+        (หลายสคริปต์ใช้ catalog เดียวกัน ค่าจึงไม่ขึ้นกับว่าสคริปต์ไหน scan ก่อน)
+        คืนจำนวนไฟล์ที่เพิ่ม/เปลี่ยน/ลบ
+        """
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            raise FileNotFoundError(root)
+        excluded = {os.path.abspath(path) for path in exclude}
+
+        with self._lock:
+            conn = self._conn
+            known = {path: mtime for path, mtime in
+                     conn.execute('SELECT path, mtime_ns FROM dirs WHERE root = ?', (root,))}
+            children = defaultdict(list)
+            for path in known:
+                children[os.path.dirname(path)].append(path)
+            if camera is None:
+                row = conn.execute('SELECT camera FROM frames WHERE root = ? AND camera IS NOT NULL '
+                                   'LIMIT 1', (root,)).fetchone()
+                camera = row[0] if row else None
+
+            changes = 0
+            seen = set()
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    dir_mtime = os.stat(directory).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                seen.add(directory)
+
+                if not full and known.get(directory) == dir_mtime:
+                    stack.extend(path for path in children.get(directory, []) if path not in excluded)
+                    continue
+
+                folder = self._folder_key(root, directory)
+                files = {}
+                subdirs = []
+                partial = False
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            if entry.path in excluded:
+                                partial = True
+                            else:
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            files[entry.path] = (entry.name, st.st_size, st.st_mtime_ns)
+                stack.extend(subdirs)
+
+                existing = {path: (size, mtime) for path, size, mtime in conn.execute(
+                    'SELECT path, size, mtime_ns FROM frames WHERE root = ? AND folder = ?',
+                    (root, folder))}
+
+                for path, (name, size, mtime) in files.items():
+                    if existing.get(path) == (size, mtime):
+                        continue
+                    date, hour = parse_frame_name(name)
+                    conn.execute(
+                        'INSERT OR REPLACE INTO frames '
+                        '(root, path, folder, name, camera, date, hour, size, mtime_ns) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (root, path, folder, name, camera, date, hour, size, mtime))
+                    changes += 1
+
+                removed = [(root, path) for path in existing if path not in files]
+                if removed:
+                    conn.executemany('DELETE FROM frames WHERE root = ? AND path = ?', removed)
+                    changes += len(removed)
+
+                # โฟลเดอร์ที่มีโฟลเดอร์ย่อยถูก exclude ไม่บันทึก mtime จริง (scan ครั้งหน้าที่ไม่ exclude ต้อง list ใหม่)
+                parent = None if directory == root else os.path.dirname(directory)
+                conn.execute('INSERT OR REPLACE INTO dirs (root, path, parent, mtime_ns) '
+                             'VALUES (?, ?, ?, ?)', (root, directory, parent, -1 if partial else dir_mtime))
+
+            for path in known:
+                if path not in seen:
+                    conn.execute('DELETE FROM dirs WHERE root = ? AND path = ?', (root, path))
+                    cur = conn.execute('DELETE FROM frames WHERE root = ? AND folder = ?',
+                                       (root, self._folder_key(root, path)))
+                    changes += cur.rowcount
+
+            if camera is not None:
+                conn.execute('UPDATE frames SET camera = ? WHERE root = ? AND camera IS NOT ?',
+                             (camera, root, camera))
+            conn.commit()
+        return changes
+
+    @staticmethod
+    def _folder_key(root, directory):
+        return os.path.relpath(directory, root).replace(os.sep, '/')
+
+    def record_outputs(self, frame_path, stage, output_paths, commit_every=50):
+        """บันทึกไฟล์ผลลัพธ์ของ stage สำหรับภาพต้นฉบับหนึ่งไฟล์ (เรียกจากหลาย thread ได้)"""
+        frame_path = os.path.abspath(frame_path)
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO outputs (frame_path, stage, output_path) VALUES (?, ?, ?)',
+                [(frame_path, stage, os.path.abspath(p)) for p in output_paths])
+            self._pending += 1
+            if self._pending >= commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    # --- query ---
+    def subfolders(self, root):
+        """โฟลเดอร์ย่อยระดับแรกของ root (เรียงตามชื่อ)"""
+        root = os.path.abspath(root)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path FROM dirs WHERE root = ? AND parent = ? ORDER BY path',
+                (root, root)).fetchall()
+        return [path for (path,) in rows]
+
+    def has_folder(self, root, folder):
+        root = os.path.abspath(root)
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM dirs WHERE root = ? AND path = ?',
+                                     (root, os.path.join(root, *folder.split('/')))).fetchone()
+        return row is not None
+
+    def frames(self, root, folder, suffix='.jpg'):
+        """ไฟล์ในโฟลเดอร์ (path สัมพัทธ์กับ root คั่นด้วย '/') ที่ลงท้ายด้วย suffix เรียงตามชื่อ"""
+        root = os.path.abspath(root)
+        with self._lock:
+            rows = self._conn.execute(
+                # เทียบท้ายชื่อตรงตัว (LIKE มอง '_' เป็น wildcard และไม่สนตัวพิมพ์เล็ก/ใหญ่)
+                'SELECT path FROM frames WHERE root = ? AND folder = ? '
+                'AND substr(name, -?) = ? ORDER BY name',
+                (root, folder, len(suffix), suffix)).fetchall()
+        return [path for (path,) in rows]
+
+    def files(self, root):
+        """ทุกไฟล์ใต้ root: list ของ (path, folder, name, size) เรียงตาม path"""
+        root = os.path.abspath(root)
+        with self._lock:
+            return self._conn.execute(
+                'SELECT path, folder, name, size FROM frames WHERE root = ? ORDER BY path',
+                (root,)).fetchall()
+
+    def frames_by_time(self, camera, date=None, hour=None):
+        """เลือกภาพตามกล้อง/วัน/ชั่วโมง (ใช้ index camera, date, hour)"""
+        sql = 'SELECT path FROM frames WHERE camera = ?'
+        args = [camera]
+        if date is not None:
+            sql += ' AND date = ?'
+            args.append(date)
+        if hour is not None:
+            sql += ' AND hour = ?'
+            args.append(hour)
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY date, hour, name', args).fetchall()
+        return [path for (path,) in rows]
+
+    def bend_pairs(self, root, date_folder, left_suffix='_left_bend.jpg',
+                   right_suffix='_right_bend.jpg'):
+        """
+        จับคู่ <base>_left_bend.jpg กับ <base>_right_bend.jpg ใน <date>/left_bend และ <date>/right_bend
+        คืน list ของ (base_name, left_path, right_path หรือ None ถ้าไม่มีคู่)
+        """
+        root = os.path.abspath(root)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT substr(l.name, 1, length(l.name) - ?), l.path, r.path '
+                'FROM frames l LEFT JOIN frames r '
+                '  ON r.root = l.root AND r.folder = ? '
+                '  AND r.name = substr(l.name, 1, length(l.name) - ?) || ? '
+                'WHERE l.root = ? AND l.folder = ? AND substr(l.name, -?) = ? '
+                'ORDER BY l.name',
+                (len(left_suffix), f"{date_folder}/right_bend", len(left_suffix), right_suffix,
+                 root, f"{date_folder}/left_bend", len(left_suffix), left_suffix)).fetchall()
+        return rows
+
+    def outputs(self, stage, frame_path=None):
+        sql = 'SELECT frame_path, output_path FROM outputs WHERE stage = ?'
+        args = [stage]
+        if frame_path is not None:
+            sql += ' AND frame_path = ?'
+            args.append(os.path.abspath(frame_path))
+        with self._lock:
+            return self._conn.execute(sql + ' ORDER BY frame_path, output_path', args).fetchall()
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+
+import cv2
+
+
+_SENTINEL = None
+
+
+def run_frame_pipeline(image_files, process_frame, num_readers=2, num_writers=2,
+                       max_in_flight=8, indent="   ", on_written=None, write_outputs=None,
+                       read_image=None, buffer_pool=None):
+    """
+    ประมวลผลภาพแบบ pipeline 3 ขั้น ต่อกันด้วย queue ที่จำกัดขนาด
+      1. reader threads  : cv2.imread
+      2. compute (thread นี้): process_frame(img, img_path) -> [(save_path, image, encoder), ...]
+      3. writer threads  : encoder.write (encode + เขียนไฟล์, ดู output_encoder.py)
+    max_in_flight คือจำนวนเฟรมสูงสุดที่อยู่ในหน่วยความจำพร้อมกัน (ตั้งแต่เริ่ม decode จนเขียนเสร็จ)
+    on_written(img_path, save_paths) ถูกเรียกจาก writer thread เมื่อเขียนทุกไฟล์ของเฟรมสำเร็จ
+    write_outputs(img_path, outputs) -> list ของ path ที่บันทึก หรือ None ถ้าไม่สำเร็จ
+      ใช้แทน encoder.write ทีละไฟล์ (เช่น เขียนลง tar shard) ถูกเรียกจาก writer thread
+    read_image(img_path) -> ภาพ หรือ None: ใช้แทน cv2.imread (เช่น อ่านจาก frame cache)
+    buffer_pool: BufferPool ที่ process_frame ใช้จองภาพผลลัพธ์ writer คืน buffer เข้า pool หลังเขียนเสร็จ
+    cv2 ปล่อย GIL ระหว่าง decode/warp/encode ทำให้ทั้ง 3 ขั้นทำงานซ้อนกันได้จริง
+    คืนค่าจำนวนเฟรมที่บันทึกสำเร็จ
+    """
+    total = len(image_files)
+    if total == 0:
+        return 0
+
+    if read_image is None:
+        read_image = cv2.imread
+
+    max_in_flight = max(1, max_in_flight)
+    num_readers = max(1, min(num_readers, total))
+    num_writers = max(1, num_writers)
+
+    path_queue = queue.Queue()
+    for img_path in image_files:
+        path_queue.put(img_path)
+
+    decoded_queue = queue.Queue(maxsize=max_in_flight)
+    write_queue = queue.Queue(maxsize=max_in_flight)
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    progress_lock = threading.Lock()
+    progress = {'done': 0, 'saved': 0}
+
+    def report(ok):
+        with progress_lock:
+            progress['done'] += 1
+            if ok:
+                progress['saved'] += 1
+            done = progress['done']
+        if done % 10 == 0 or done == total:
+            print(f"{indent}✓ ประมวลผล {done}/{total} ไฟล์")
+
+    def reader():
+        while True:
+            try:
+                img_path = path_queue.get_nowait()
+            except queue.Empty:
+                break
+            in_flight.acquire()
+            decoded_queue.put((img_path, read_image(img_path)))
+        decoded_queue.put(_SENTINEL)
+
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _SENTINEL:
+                break
+            img_path, outputs = item
+            ok = True
+            error = ''
+            # exception ต้องไม่หลุดออกจาก thread: ถ้า writer ตายหมด compute จะค้างที่ write_queue.put
+            try:
+                try:
+                    if write_outputs is not None:
+                        saved = write_outputs(img_path, outputs)
+                        ok = saved is not None
+                    else:
+                        for save_path, image, encoder in outputs:
+                            ok = encoder.write(save_path, image) and ok
+                        saved = [save_path for save_path, _, _ in outputs]
+                finally:
+                    if buffer_pool is not None:
+                        buffer_pool.release(*(image for _, image, _ in outputs))
+                    in_flight.release()
+                if ok and on_written is not None:
+                    on_written(img_path, saved)
+            except Exception as e:
+                ok = False
+                error = f" ({e})"
+            if not ok:
+                print(f"{indent}✗ บันทึกไม่สำเร็จ: {os.path.basename(img_path)}{error}")
+            report(ok)
+
+    # writer ที่หยุดด้วย BaseException (เช่น SystemExit) ไม่ดึงงานต่อ: compute ต้องไม่รอ queue ตลอดไป
+    def put_write(item):
+        """put ลง write_queue คืน False แทนการค้างถ้า writer thread หยุดไปหมดแล้ว"""
+        while True:
+            try:
+                write_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not any(t.is_alive() for t in writers):
+                    return False
+
+    def get_decoded():
+        while True:
+            try:
+                return decoded_queue.get(timeout=0.1)
+            except queue.Empty:
+                if not any(t.is_alive() for t in writers):
+                    raise RuntimeError("writer thread หยุดทำงานทั้งหมด")
+
+    readers = [threading.Thread(target=reader, daemon=True) for _ in range(num_readers)]
+    writers = [threading.Thread(target=writer, daemon=True) for _ in range(num_writers)]
+    for t in readers + writers:
+        t.start()
+
+    try:
+        finished_readers = 0
+        while finished_readers < num_readers:
+            item = get_decoded()
+            if item is _SENTINEL:
+                finished_readers += 1
+                continue
+
+            img_path, img = item
+            if img is None:
+                in_flight.release()
+                print(f"{indent}✗ ไม่สามารถอ่าน: {os.path.basename(img_path)}")
+                report(False)
+                continue
+
+            if not put_write((img_path, process_frame(img, img_path))):
+                raise RuntimeError("writer thread หยุดทำงานทั้งหมด")
+    finally:
+        for _ in writers:
+            if not put_write(_SENTINEL):
+                break
+        for t in writers:
+            t.join()
+
+    return progress['saved']
@@ -0,0 +1,385 @@
+import sys
+import io
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+import cv2
+
+import cam5_transform as bend
+import main_cam5 as focus
+from remap_engine import attach_remap_tables
+from band_warp import DEFAULT_MAX_WARP_MB, exceeds_budget
+from gradient_blender import GradientBlender, blend_bend_pair
+from calibration_profile import load_calibration, get_folder_calibration
+from output_encoder import parse_encoder
+from cli_args import get_arg_value
+
+
+# --- ตั้งค่า ---
+# ค่าทั้งหมดส่งเข้า FrameService ตรงๆ ไม่ใช้ค่าระดับ module ของ cam5_transform / main_cam5
+# (ค่าเหล่านั้นอ่านจาก sys.argv ของ process นี้ ซึ่งเป็น flag ของ server ไม่ใช่ของสคริปต์นั้น)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = get_arg_value('--socket', os.path.join(SCRIPT_DIR, 'frame_server.sock'))
+BEND_CALIBRATION_FILE = get_arg_value('--bend-calibration',
+                                      os.path.join(SCRIPT_DIR, 'calibration', 'cam5_transform.json'))
+FOCUS_CALIBRATION_FILE = get_arg_value('--focus-calibration',
+                                       os.path.join(SCRIPT_DIR, 'calibration', 'main_cam5.json'))
+ENCODER_SPEC = get_arg_value('--encoder', 'jpeg:quality=95')  # ค่าเริ่มต้น (request กำหนดเองได้)
+MAX_WARP_MB = get_arg_value('--max-warp-mb', DEFAULT_MAX_WARP_MB)  # เพดานหน่วยความจำต่อภาพผลลัพธ์ (0 = ไม่จำกัด)
+EDGE_FILTER = get_arg_value('--edge-filter', 'bilateral')     # filter ของแถบขอบใน op 'focus'
+MARGIN_RATIO = 0.35                                           # เท่ากับ main_cam5.py
+BLEND_WIDTH = 50                                              # เท่ากับ cam5_transform.py
+BENCH_IMAGE = get_arg_value('--bench', '')                      # รันเป็น client วัด latency ด้วยภาพนี้
+BENCH_REQUESTS = get_arg_value('--requests', 200)               # จำนวน request ต่อประเภทใน benchmark
+
+# --- protocol ---
+# ทุกข้อความ: struct '!II' (ความยาว header JSON, ความยาว payload) + header (UTF-8 JSON) + payload
+# request header: {'op': 'transform' | 'panorama' | 'focus' | 'ping' | 'reload',
+#                  'path': ภาพบนดิสก์ (ถ้าไม่ส่ง ใช้ payload เป็นไฟล์ภาพที่ encode แล้ว),
+#                  'folder': ชื่อโฟลเดอร์ของ calibration (ไม่ส่ง = default), 'encoder': spec (ไม่บังคับ)}
+# response header: {'ok': True, 'outputs': [{'name': 'left_bend', 'ext': '.jpg', 'size': n}, ...], 'ms': ...}
+#                  หรือ {'ok': False, 'error': ...}; payload คือไฟล์ของ outputs ต่อกันตามลำดับ
+FRAME_HEADER = struct.Struct('!II')
+MAX_HEADER_BYTES = 1 << 20
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("socket ถูกปิดระหว่างรับข้อมูล")
+        received += n
+    return bytes(buf)
+
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(FRAME_HEADER.pack(len(data), len(payload)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """คืน (header, payload) หรือ (None, None) ถ้าอีกฝั่งปิดการเชื่อมต่อ"""
+    first = sock.recv(FRAME_HEADER.size, socket.MSG_WAITALL)
+    if not first:
+        return None, None
+    if len(first) < FRAME_HEADER.size:
+        first += _recv_exact(sock, FRAME_HEADER.size - len(first))
+    header_len, payload_len = FRAME_HEADER.unpack(first)
+    if header_len > MAX_HEADER_BYTES:
+        raise ValueError(f"header ใหญ่เกินไป ({header_len} byte)")
+    header = json.loads(_recv_exact(sock, header_len).decode('utf-8'))
+    payload = _recv_exact(sock, payload_len) if payload_len else b''
+    return header, payload
+
+
+# --- server ---
+class FrameService:
+    """
+    สถานะที่โหลดครั้งเดียวแล้วค้างไว้: calibration ของ cam5_transform (bend) และ main_cam5 (focus),
+    ตาราง remap / focus geometry ต่อโฟลเดอร์, encoder ต่อ spec และ blender ต่อ thread
+    """
+
+    def __init__(self, bend_file, focus_file, encoder_spec, max_warp_bytes=0,
+                 blend_width=BLEND_WIDTH, margin_ratio=MARGIN_RATIO, edge_filter='bilateral'):
+        if edge_filter not in focus.EDGE_FILTERS:
+            raise ValueError(f"ไม่รู้จัก edge_filter '{edge_filter}' (เลือกได้: {', '.join(focus.EDGE_FILTERS)})")
+        self.bend_file = bend_file
+        self.focus_file = focus_file
+        self.max_warp_bytes = max_warp_bytes
+        self.blend_width = blend_width
+        self.margin_ratio = margin_ratio
+        self.edge_filter = edge_filter
+        self.default_encoder = parse_encoder(encoder_spec)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._encoders = {encoder_spec: self.default_encoder}
+        self.reload()
+
+    def reload(self):
+        """โหลดไฟล์ calibration ใหม่ (หลังคลิก calibration ใหม่ ไม่ต้องรีสตาร์ต server)"""
+        with self._lock:
+            self._profiles = {
+                'bend': load_calibration(self.bend_file, 'cam5_transform'),
+                'focus': load_calibration(self.focus_file, 'main_cam5'),
+            }
+            self._transforms = {}
+            self._geometries = {}
+        for kind, profile in self._profiles.items():
+            if profile is None:
+                print(f"   - {kind}: ไม่พบ calibration")
+            else:
+                print(f"   - {kind}: {len(profile['folders'])} โฟลเดอร์ (default '{profile.get('default')}')")
+
+    def transforms(self, kind, folder):
+        """g_transforms ของโฟลเดอร์ (พร้อมตาราง remap) สร้างครั้งแรกที่ถูกขอแล้ว cache ไว้"""
+        key = (kind, folder)
+        with self._lock:
+            transforms = self._transforms.get(key)
+            if transforms is None:
+                _, transforms = get_folder_calibration(self._profiles[kind], folder)
+                if not transforms:
+                    raise ValueError(f"ไม่พบ calibration ของ {kind} สำหรับโฟลเดอร์ '{folder}'")
+                if kind == 'bend':
+                    attach_remap_tables(transforms, self.max_warp_bytes)
+                self._transforms[key] = transforms
+        return transforms
+
+    def focus_geometry(self, folder, transform_data, image_shape):
+        """
+        focus geometry ต่อ (โฟลเดอร์, side, ขนาดภาพ) สร้างครั้งเดียวภายใต้ lock
+        (ไม่เก็บใน transform_data แบบ get_focus_geometry เพราะ request ขนาดภาพต่างกันจะสร้างทับกันไปมา)
+        """
+        key = (folder, transform_data['side'], tuple(image_shape[:2]))
+        with self._lock:
+            geometry = self._geometries.get(key)
+            if geometry is None:
+                output_size = transform_data['output_size']
+                build_maps = not exceeds_budget(focus.focus_output_size(output_size, self.margin_ratio),
+                                                self.max_warp_bytes)
+                geometry = focus.build_focus_geometry(transform_data['points'], transform_data['matrix'],
+                                                      output_size, image_shape, self.margin_ratio,
+                                                      build_maps)
+                self._geometries[key] = geometry
+        return geometry
+
+    def encoder(self, spec):
+        if not spec:
+            return self.default_encoder
+        with self._lock:
+            encoder = self._encoders.get(spec)
+            if encoder is None:
+                encoder = parse_encoder(spec)
+                self._encoders[spec] = encoder
+        return encoder
+
+    def _blender(self):
+        blender = getattr(self._local, 'blender', None)
+        if blender is None:
+            blender = GradientBlender(self.blend_width)
+            self._local.blender = blender
+        return blender
+
+    def handle(self, header, payload):
+        """คืน (response header, payload)"""
+        start = time.perf_counter()
+        op = header.get('op')
+        if op == 'ping':
+            return {'ok': True, 'outputs': [], 'ms': 0.0}, b''
+        if op == 'reload':
+            self.reload()
+            return {'ok': True, 'outputs': [], 'ms': (time.perf_counter() - start) * 1000}, b''
+        if op not in ('transform', 'panorama', 'focus'):
+            raise ValueError(f"ไม่รู้จัก op '{op}'")
+
+        path = header.get('path')
+        if path:
+            img = cv2.imread(path)
+        else:
+            img = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"อ่านภาพไม่ได้: {path or f'payload {len(payload)} byte'}")
+
+        folder = header.get('folder')
+        images = []
+        if op == 'focus':
+            for t in self.transforms('focus', folder):
+                geometry = self.focus_geometry(folder, t, img.shape)
+                images.append((t['side'], focus.create_enhanced_focus_image(
+                    img, t['points'], t['matrix'], t['output_size'], self.margin_ratio,
+                    edge_filter=self.edge_filter, geometry=geometry,
+                    max_bytes=self.max_warp_bytes)))
+        else:
+            warped = {t['side']: bend.create_cropped_transform(img, t['matrix'], t['output_size'],
+                                                               maps=t.get('maps'),
+                                                               max_bytes=self.max_warp_bytes)
+                      for t in self.transforms('bend', folder)}
+            if op == 'transform':
+                images = list(warped.items())
+            else:
+                images = [('panorama', blend_bend_pair(self._blender(), warped, self.max_warp_bytes))]
+
+        encoder = self.encoder(header.get('encoder'))
+        outputs = []
+        chunks = []
+        for name, image in images:
+            data = encoder.encode(image)
+            if data is None:
+                raise ValueError(f"encode {name} ไม่สำเร็จ")
+            outputs.append({'name': name, 'ext': encoder.ext, 'size': len(data)})
+            chunks.append(data)
+        return {'ok': True, 'outputs': outputs, 'ms': (time.perf_counter() - start) * 1000}, b''.join(chunks)
+
+
+class FrameRequestHandler(socketserver.BaseRequestHandler):
+    """หนึ่งการเชื่อมต่อรับได้หลาย request (client ไม่ต้องเชื่อมต่อใหม่ทุกครั้ง)"""
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, ValueError) as e:
+                print(f"ปิดการเชื่อมต่อ: {e}")
+                return
+            if header is None:
+                return
+            try:
+                response, data = service.handle(header, payload)
+            except Exception as e:
+                response, data = {'ok': False, 'error': str(e)}, b''
+            send_message(self.request, response, data)
+
+
+class FrameServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        self.service = service
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, FrameRequestHandler)
+
+
+def remove_stale_socket(socket_path):
+    """
+    ลบไฟล์ socket ที่ค้างจาก server ที่ปิดไปแล้ว (เชื่อมต่อไม่ได้ = ไม่มีใครฟังอยู่)
+    ถ้ายังมี server ตัวอื่นฟังอยู่ raise RuntimeError แทนการแย่ง socket มา
+    """
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"มี frame server ทำงานอยู่ที่ {socket_path} แล้ว")
+
+
+# --- client ---
+class FrameClient:
+    """
+    client ของ FrameServer (เชื่อมต่อค้างไว้ใช้ซ้ำ)
+      client = FrameClient()
+      files = client.request('panorama', path='data/cam5_24H/20250517/20250517_010000.jpg')
+      panorama = cv2.imdecode(np.frombuffer(files['panorama'], np.uint8), cv2.IMREAD_COLOR)
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self.last_header = None
+
+    def request(self, op, path=None, image_bytes=b'', folder=None, encoder=None):
+        """คืน {ชื่อผลลัพธ์: bytes ของไฟล์} (raise RuntimeError ถ้า server แจ้ง error)"""
+        header = {'op': op}
+        if path:
+            header['path'] = os.path.abspath(path)
+        if folder:
+            header['folder'] = folder
+        if encoder:
+            header['encoder'] = encoder
+        send_message(self._sock, header, image_bytes)
+        response, payload = recv_message(self._sock)
+        if response is None:
+            raise ConnectionError("server ปิดการเชื่อมต่อ")
+        self.last_header = response
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+
+        files = {}
+        offset = 0
+        for output in response['outputs']:
+            files[output['name']] = payload[offset:offset + output['size']]
+            offset += output['size']
+        return files
+
+    def close(self):
+        self._sock.close()
+
+
+def run_latency_benchmark(socket_path, image_path, num_requests):
+    """ส่ง request แต่ละประเภท num_requests ครั้ง แล้วรายงาน p50/p99 ของเวลา round-trip"""
+    client = FrameClient(socket_path)
+    with open(image_path, 'rb') as f:
+        image_bytes = f.read()
+
+    print(f"benchmark: {os.path.basename(image_path)} | {num_requests} request ต่อแบบ")
+    for op in ('transform', 'panorama', 'focus'):
+        for label, kwargs in (('path', {'path': image_path}), ('bytes', {'image_bytes': image_bytes})):
+            try:
+                for _ in range(3):
+                    client.request(op, **kwargs)
+            except RuntimeError as e:
+                print(f"   {op:<9} ({label:<5}): ข้าม ({e})")
+                break
+            latencies = []
+            server_ms = []
+            for _ in range(num_requests):
+                start = time.perf_counter()
+                client.request(op, **kwargs)
+                latencies.append((time.perf_counter() - start) * 1000)
+                server_ms.append(client.last_header['ms'])
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"   {op:<9} ({label:<5}): p50 {p50:.1f} ms | p99 {p99:.1f} ms | "
+                  f"server {np.median(server_ms):.1f} ms")
+    client.close()
+
+
+def main():
+    if not hasattr(socket, 'AF_UNIX'):
+        print("ERROR: ระบบนี้ไม่รองรับ Unix socket")
+        sys.exit()
+
+    if BENCH_IMAGE:
+        if not os.path.exists(BENCH_IMAGE):
+            print(f"ERROR: ไม่พบภาพ '{BENCH_IMAGE}'")
+            sys.exit()
+        run_latency_benchmark(SOCKET_PATH, BENCH_IMAGE, BENCH_REQUESTS)
+        return
+
+    print("โหลด calibration:")
+    try:
+        service = FrameService(BEND_CALIBRATION_FILE, FOCUS_CALIBRATION_FILE, ENCODER_SPEC,
+                               max_warp_bytes=MAX_WARP_MB << 20, blend_width=BLEND_WIDTH,
+                               margin_ratio=MARGIN_RATIO, edge_filter=EDGE_FILTER)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit()
+
+    try:
+        server = FrameServer(SOCKET_PATH, service)
+    except (RuntimeError, OSError) as e:
+        print(f"ERROR: {e}")
+        sys.exit()
+    print(f"รอ request ที่ {SOCKET_PATH} (Ctrl+C เพื่อหยุด)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nหยุด server")
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(SOCKET_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+import cv2
+
+from band_warp import exceeds_budget, render_bands
+
+
+# --- fixed-point 16 bit: weight ซ้าย + weight ขวา = 65536 ---
+_FIXED_SHIFT = 16
+_FIXED_ONE = 1 << _FIXED_SHIFT
+
+
+class GradientBlender:
+    """
+    ต่อภาพซ้าย/ขวาพร้อมเบลนด์แบบ gradient (ผลเท่ากับ blend_images_gradient เดิม ต่างไม่เกิน 1 ระดับสี)
+    - คำนวณ alpha ramp ครั้งเดียว เก็บเป็น weight fixed-point รูป (1, blend_width, 1)
+      ใช้ broadcast แทนการสร้าง array H x W x 3 แบบ float64 ทุกครั้ง
+    - buffer ผลลัพธ์และ buffer ชั่วคราว cache ตามขนาด ใช้ซ้ำทุกคู่ภาพในโฟลเดอร์
+
+    reuse_output=True: blend() คืน buffer เดิมทุกครั้ง ต้องบันทึก/ใช้งานให้เสร็จก่อนเรียกครั้งถัดไป
+    (ถ้าส่งภาพต่อให้ thread อื่น เช่น writer ใน frame_pipeline ให้ใช้ reuse_output=False)
+    pool: BufferPool (ใช้กับ reuse_output=False) ผลลัพธ์จองจาก pool ผู้ใช้ release() คืนเมื่อเขียนเสร็จ
+    """
+
+    def __init__(self, blend_width=50, reuse_output=True, pool=None):
+        self.blend_width = blend_width
+        self.reuse_output = reuse_output
+        self.pool = pool
+
+        alpha = np.linspace(1, 0, blend_width)
+        weight_left = np.rint(alpha * _FIXED_ONE).astype(np.uint32)
+        self._weight_left = weight_left.reshape(1, -1, 1)
+        self._weight_right = (_FIXED_ONE - weight_left).reshape(1, -1, 1)
+
+        self._outputs = {}
+        self._scratch = {}
+
+    def _get_output(self, shape):
+        if not self.reuse_output:
+            if self.pool is not None:
+                return self.pool.acquire(shape)
+            return np.empty(shape, dtype=np.uint8)
+        buf = self._outputs.get(shape)
+        if buf is None:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._outputs[shape] = buf
+        return buf
+
+    def _get_scratch(self, shape):
+        bufs = self._scratch.get(shape)
+        if bufs is None:
+            bufs = (np.empty(shape, dtype=np.uint32), np.empty(shape, dtype=np.uint32))
+            self._scratch[shape] = bufs
+        return bufs
+
+    def blend(self, img_left, img_right):
+        """
+        Parameters:
+        - img_left: ภาพซ้าย (วางทางซ้าย)
+        - img_right: ภาพขวา (วางทางขวา)
+        """
+        blend_width = self.blend_width
+        h_left, w_left = img_left.shape[:2]
+        h_right, w_right = img_right.shape[:2]
+
+        if h_left != h_right:
+            target_height = min(h_left, h_right)
+            if h_left > target_height:
+                img_left = cv2.resize(img_left, (w_left, target_height), interpolation=cv2.INTER_AREA)
+            if h_right > target_height:
+                img_right = cv2.resize(img_right, (w_right, target_height), interpolation=cv2.INTER_AREA)
+            h_left, w_left = img_left.shape[:2]
+            h_right, w_right = img_right.shape[:2]
+
+        result_width = w_left + w_right - blend_width
+        result = self._get_output((h_left, result_width, 3))
+
+        right_start = w_left - blend_width
+
+        result[:, :right_start] = img_left[:, :right_start]
+        result[:, w_left:] = img_right[:, blend_width:]
+
+        # blend = (ซ้าย * w + ขวา * (1 - w)) >> 16 คำนวณใน buffer uint32 ที่ใช้ซ้ำ
+        acc, tmp = self._get_scratch((h_left, blend_width, 3))
+        np.multiply(img_left[:, right_start:w_left], self._weight_left, out=acc)
+        np.multiply(img_right[:, :blend_width], self._weight_right, out=tmp)
+        acc += tmp
+        acc >>= _FIXED_SHIFT
+        result[:, right_start:w_left] = acc
+
+        return result
+
+
+def blend_bend_pair(blender, warped, max_bytes=0):
+    """
+    ต่อ panorama จากภาพที่ warp แล้ว {'left_bend': ..., 'right_bend': ...}
+    วาง right_bend ทางซ้าย เหมือน image_panorama.py
+    ถ้า panorama ใหญ่กว่า max_bytes จะเบลนด์ทีละแถบ (เบลนด์ทำตามแถวอยู่แล้ว ผลเท่ากัน)
+    """
+    img_left, img_right = warped['right_bend'], warped['left_bend']
+    height = img_left.shape[0]
+    width = img_left.shape[1] + img_right.shape[1] - blender.blend_width
+    if img_right.shape[0] != height or not exceeds_budget((width, height), max_bytes):
+        return blender.blend(img_left, img_right)
+
+    # แถบถูกเขียนลงไฟล์ทันที จึงใช้ buffer ของแถบซ้ำได้ (ไม่จองจาก pool ของ blender)
+    band_blender = GradientBlender(blender.blend_width)
+    return render_bands((height, width, 3),
+                        lambda y0, y1: band_blender.blend(img_left[y0:y1], img_right[y0:y1]),
+                        max_bytes)
@@ -7,35 +7,36 @@ if sys.stdout.encoding != 'utf-8':
 if sys.stderr.encoding != 'utf-8':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
-import numpy as np
 import cv2
 import os
-import glob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from gradient_blender import GradientBlender
+from output_manifest import OutputManifest, file_signature, params_digest
+from frame_catalog import FrameCatalog, DEFAULT_CATALOG
+from shard_writer import ShardWriter, encode_outputs
+from output_encoder import parse_encoder
+from buffer_pool import BufferPool
+from cli_args import get_arg_value
 
 # --- ตั้งค่า Path ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_INPUT_PATH = os.path.join(SCRIPT_DIR, 'result', 'cam5_bent_dual_24H')
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_panorama_24H')
-
-print(f"ค้นหาโฟลเดอร์ใน: {BASE_INPUT_PATH}")
-
-# --- ค้นหาโฟลเดอร์ย่อย ---
-try:
-    all_items = os.listdir(BASE_INPUT_PATH)
-    subfolders = [os.path.join(BASE_INPUT_PATH, item) for item in all_items 
-                  if os.path.isdir(os.path.join(BASE_INPUT_PATH, item))]
-    subfolders.sort()
-except FileNotFoundError:
-    print(f"ERROR: ไม่พบพาธ '{BASE_INPUT_PATH}'")
-    sys.exit()
-
-if not subfolders:
-    print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
-    sys.exit()
-
-print(f"พบ {len(subfolders)} โฟลเดอร์\n")
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, '.manifest.json')
+BLEND_WIDTH = 50
+JPEG_QUALITY = 95
+ENCODER_SPEC = get_arg_value('--encoder', f'jpeg:quality={JPEG_QUALITY}')  # ดู output_encoder.parse_encoder
+ENCODE_WORKERS = get_arg_value('--encode-workers', 4)  # thread สำหรับ encode/เขียนไฟล์
+FORCE = '--force' in sys.argv  # ประมวลผลใหม่ทุกไฟล์ ไม่สน manifest
+RESCAN = '--rescan' in sys.argv  # list ทุกโฟลเดอร์ใหม่ ไม่เชื่อ mtime ของโฟลเดอร์ใน catalog
+CATALOG_FILE = DEFAULT_CATALOG
+SHARD_DIR = get_arg_value('--shards', '')  # เขียน panorama เป็น tar shard ในโฟลเดอร์นี้แทนไฟล์ JPEG แยก
+SHARD_SIZE_MB = 1024
 
 # --- ฟังก์ชันสร้างการเบลนด์แบบ gradient ---
+_blenders = {}
+
 def blend_images_gradient(img_left, img_right, blend_width=50):
     """
     Parameters:
@@ -43,41 +44,13 @@ def blend_images_gradient(img_left, img_right, blend_width=50):
     - img_right: ภาพขวา (วางทางขวา)
     - blend_width: ความกว้างของโซนเบลนด์ (pixels)
 
+    คืนภาพใหม่ทุกครั้ง (ถ้าเบลนด์ทั้งโฟลเดอร์ให้ใช้ GradientBlender โดยตรง เพื่อใช้ buffer ซ้ำ)
     """
-    h_left, w_left = img_left.shape[:2]
-    h_right, w_right = img_right.shape[:2]
-    
-    if h_left != h_right:
-        target_height = min(h_left, h_right)
-        if h_left > target_height:
-            img_left = cv2.resize(img_left, (w_left, target_height), interpolation=cv2.INTER_AREA)
-        if h_right > target_height:
-            img_right = cv2.resize(img_right, (w_right, target_height), interpolation=cv2.INTER_AREA)
-        h_left, w_left = img_left.shape[:2]
-        h_right, w_right = img_right.shape[:2]
-    
-
-    result_width = w_left + w_right - blend_width
-    result = np.zeros((h_left, result_width, 3), dtype=np.uint8)
-    
-    result[:, :w_left] = img_left
-    
-    right_start = w_left - blend_width
-    
-    alpha = np.linspace(1, 0, blend_width).reshape(1, -1)
-    alpha = np.repeat(alpha, h_left, axis=0)
-    alpha = np.expand_dims(alpha, axis=2)
-    alpha = np.repeat(alpha, 3, axis=2)
-
-    blend_region_left = result[:, right_start:w_left].astype(float)
-    blend_region_right = img_right[:, :blend_width].astype(float)
-    
-    blended = (blend_region_left * alpha + blend_region_right * (1 - alpha)).astype(np.uint8)
-    result[:, right_start:w_left] = blended
-    
-    result[:, w_left:] = img_right[:, blend_width:]
-    
-    return result
+    blender = _blenders.get(blend_width)
+    if blender is None:
+        blender = GradientBlender(blend_width, reuse_output=False)
+        _blenders[blend_width] = blender
+    return blender.blend(img_left, img_right)
 
 # --- ฟังก์ชันต่อภาพแบบไม่มี blending (ต่อตรงๆ) ---
 def concat_images_simple(img_left, img_right):
@@ -96,74 +69,167 @@ def concat_images_simple(img_left, img_right):
     result = cv2.hconcat([img_left, img_right])
     return result
 
-# --- Loop ผ่านแต่ละโฟลเดอร์ ---
-for folder_path in subfolders:
-    folder_name = os.path.basename(os.path.normpath(folder_path))
-    print(f"{'='*70}")
-    print(f"กำลังประมวลผล: {folder_name}")
-    print(f"{'='*70}")
-    
-    # Path ของโฟลเดอร์ left_bend และ right_bend
-    left_folder = os.path.join(folder_path, 'left_bend')
-    right_folder = os.path.join(folder_path, 'right_bend')
-    
-    if not os.path.exists(left_folder) or not os.path.exists(right_folder):
-        print(f"ERROR: ไม่พบโฟลเดอร์ left_bend หรือ right_bend ใน {folder_name}")
-        print(f"ข้ามโฟลเดอร์นี้\n")
-        continue
-    
-    # ค้นหาไฟล์ภาพ
-    left_files = sorted(glob.glob(os.path.join(left_folder, '*_left_bend.jpg')))
-    right_files = sorted(glob.glob(os.path.join(right_folder, '*_right_bend.jpg')))
+
+def main():
+    print(f"ค้นหาโฟลเดอร์ใน: {BASE_INPUT_PATH}")
+
+    # --- ค้นหาโฟลเดอร์ย่อย (อัปเดต catalog เฉพาะโฟลเดอร์ที่เปลี่ยน แล้ว query แทนการ listdir/glob) ---
+    catalog = FrameCatalog(CATALOG_FILE)
+    try:
+        changes = catalog.scan(BASE_INPUT_PATH, full=RESCAN)
+    except FileNotFoundError:
+        print(f"ERROR: ไม่พบพาธ '{BASE_INPUT_PATH}'")
+        sys.exit()
+    print(f"catalog: อัปเดต {changes} ไฟล์")
+    subfolders = catalog.subfolders(BASE_INPUT_PATH)
+
+    if not subfolders:
+        print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
+        sys.exit()
+
+    print(f"พบ {len(subfolders)} โฟลเดอร์\n")
+
+    try:
+        encoder = parse_encoder(ENCODER_SPEC)
+    except ValueError as e:
+        print(f"ERROR: --encoder '{ENCODER_SPEC}': {e}")
+        sys.exit()
+
+    # weight ของ gradient ใช้ซ้ำทุกคู่ภาพ; ผลลัพธ์มาจาก buffer_pool เพราะ encode ทำใน thread อื่น
+    # (คืนเข้า pool เมื่อ encode เสร็จใน finish_oldest จึงจองใหม่แค่ไม่เกิน max_pending + 1 ชุด)
+    buffer_pool = BufferPool()
+    blender = GradientBlender(blend_width=BLEND_WIDTH, reuse_output=False, pool=buffer_pool)
+    encode_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS)
+    max_pending = ENCODE_WORKERS * 2  # จำนวนภาพที่รอ encode สูงสุด (จำกัดหน่วยความจำ)
+
+    # ข้ามคู่ภาพที่ผลลัพธ์เป็นปัจจุบันแล้ว (ไฟล์ซ้าย/ขวาและพารามิเตอร์ไม่เปลี่ยน)
+    manifest = OutputManifest(MANIFEST_FILE)
+    params = {
+        'stage': 'image_panorama',
+        'blend_width': BLEND_WIDTH,
+        'jpeg_quality': JPEG_QUALITY,
+    }
+    if not encoder.is_default_jpeg(JPEG_QUALITY):
+        params['encoder'] = encoder.describe()
+
+    # โหมด shard: sample key '<วันที่>/<ชื่อไฟล์>' นามสกุล panorama.<ext>, manifest บันทึก path ของ shard
+    shard_writer = None
+    if SHARD_DIR:
+        shard_writer = ShardWriter(SHARD_DIR, prefix='cam5_panorama', max_bytes=SHARD_SIZE_MB << 20)
+        params['shards'] = os.path.abspath(SHARD_DIR)
+        print(f"เขียนผลลัพธ์เป็น tar shard ที่: {SHARD_DIR}\n")
+    digest = params_digest(params)
+
+    # --- Loop ผ่านแต่ละโฟลเดอร์ ---
+    for folder_path in subfolders:
+        folder_name = os.path.basename(os.path.normpath(folder_path))
+        print(f"{'='*70}")
+        print(f"กำลังประมวลผล: {folder_name}")
+        print(f"{'='*70}")
+    
+        # โฟลเดอร์ left_bend และ right_bend
+        if (not catalog.has_folder(BASE_INPUT_PATH, f"{folder_name}/left_bend")
+                or not catalog.has_folder(BASE_INPUT_PATH, f"{folder_name}/right_bend")):
+            print(f"ERROR: ไม่พบโฟลเดอร์ left_bend หรือ right_bend ใน {folder_name}")
+            print(f"ข้ามโฟลเดอร์นี้\n")
+            continue
     
-    if len(left_files) == 0 or len(right_files) == 0:
-        print(f"ERROR: ไม่พบไฟล์ภาพใน {folder_name}")
-        print(f"ข้ามโฟลเดอร์นี้...\n")
-        continue
+        # จับคู่ภาพซ้าย/ขวาด้วย query เดียว (ไม่ต้องเช็ค os.path.exists ทีละไฟล์)
+        pairs = catalog.bend_pairs(BASE_INPUT_PATH, folder_name)
+        right_count = len(catalog.frames(BASE_INPUT_PATH, f"{folder_name}/right_bend", '_right_bend.jpg'))
     
-    print(f"พบภาพซ้าย: {len(left_files)} ไฟล์")
-    print(f"พบภาพขวา: {len(right_files)} ไฟล์")
+        if len(pairs) == 0 or right_count == 0:
+            print(f"ERROR: ไม่พบไฟล์ภาพใน {folder_name}")
+            print(f"ข้ามโฟลเดอร์นี้...\n")
+            continue
     
-    # สร้างโฟลเดอร์ผลลัพธ์
-    output_folder = os.path.join(OUTPUT_DIR, folder_name)
-    os.makedirs(output_folder, exist_ok=True)
+        print(f"พบภาพซ้าย: {len(pairs)} ไฟล์")
+        print(f"พบภาพขวา: {right_count} ไฟล์")
     
-    print(f"บันทึกผลลัพธ์ที่: {output_folder}\n")
+        # สร้างโฟลเดอร์ผลลัพธ์
+        output_folder = os.path.join(OUTPUT_DIR, folder_name)
+        if shard_writer is None:
+            os.makedirs(output_folder, exist_ok=True)
+            print(f"บันทึกผลลัพธ์ที่: {output_folder}\n")
     
-    # จับคู่และประมวลผล
-    processed_count = 0
+        # จับคู่และประมวลผล: blend ใน thread นี้, encode/เขียนไฟล์ใน encode_pool
+        processed_count = 0
+        skipped_count = 0
+        pending = deque()
+        pool_before = buffer_pool.counters()
+
+        def save_panorama(base_name, result):
+            output_path = os.path.join(output_folder, f"{base_name}_panorama{encoder.ext}")
+            if shard_writer is not None:
+                files = encode_outputs(base_name, [(output_path, result, encoder)])
+                if files is None:
+                    return None
+                return shard_writer.write_sample(f"{folder_name}/{base_name}", files)
+            return output_path if encoder.write(output_path, result) else None
+
+        def finish_oldest():
+            nonlocal processed_count
+            future, base_name, left_path, signature, result = pending.popleft()
+            output_path = future.result()
+            buffer_pool.release(result)
+            if output_path is None:
+                print(f"  ✗ บันทึกไม่สำเร็จ: {base_name}")
+                return
+            manifest.record(left_path, digest, [output_path], signature)
+            catalog.record_outputs(left_path, 'image_panorama', [output_path])
+
+            processed_count += 1
+
+            if processed_count % 10 == 0 or processed_count == len(pairs) - skipped_count:
+                print(f"  ✓ ประมวลผล {processed_count}/{len(pairs) - skipped_count} ไฟล์")
     
-    for left_path in left_files:
-        # ดึงชื่อไฟล์ฐาน (ไม่รวม _left_bend.jpg)
-        base_name = os.path.basename(left_path).replace('_left_bend.jpg', '')
+        for base_name, left_path, right_path in pairs:
+            if right_path is None:
+                print(f"  ⚠ ไม่พบคู่สำหรับ: {base_name}")
+                continue
         
-        # หาไฟล์ขวาที่ตรงกัน
-        right_path = os.path.join(right_folder, f"{base_name}_right_bend.jpg")
-        
-        if not os.path.exists(right_path):
-            print(f"  ⚠ ไม่พบคู่สำหรับ: {base_name}")
-            continue
-        
-        # โหลดภาพ
-        img_left = cv2.imread(left_path)
-        img_right = cv2.imread(right_path)
-        
-        if img_left is None or img_right is None:
-            print(f"  ✗ ไม่สามารถโหลด: {base_name}")
-            continue
+            signature = file_signature(left_path, right_path)
+            if not FORCE and manifest.is_up_to_date(left_path, digest, signature):
+                skipped_count += 1
+                continue
         
-        result = blend_images_gradient(img_right, img_left, blend_width=50)
-        output_path = os.path.join(output_folder, f"{base_name}_panorama.jpg")
-        cv2.imwrite(output_path, result, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            # โหลดภาพ
+            img_left = cv2.imread(left_path)
+            img_right = cv2.imread(right_path)
         
-        processed_count += 1
+            if img_left is None or img_right is None:
+                print(f"  ✗ ไม่สามารถโหลด: {base_name}")
+                continue
         
-        if processed_count % 10 == 0 or processed_count == len(left_files):
-            print(f"  ✓ ประมวลผล {processed_count}/{len(left_files)} ไฟล์")
-    
-    print(f"\nเสร็จสิ้นโฟลเดอร์ {folder_name}: ประมวลผล {processed_count} ไฟล์\n")
+            result = blender.blend(img_right, img_left)
+            if len(pending) >= max_pending:
+                finish_oldest()
+            pending.append((encode_pool.submit(save_panorama, base_name, result),
+                            base_name, left_path, signature, result))
+
+        while pending:
+            finish_oldest()
+    
+        manifest.save()
+        catalog.commit()
+        if skipped_count:
+            print(f"  ข้าม {skipped_count} ไฟล์ที่เป็นปัจจุบันแล้ว")
+        buffer_pool.report("  ", since=pool_before)
+        print(f"\nเสร็จสิ้นโฟลเดอร์ {folder_name}: ประมวลผล {processed_count} ไฟล์\n")
+
+    encode_pool.shutdown()
+    if shard_writer is not None:
+        shard_writer.close()
+        print(f"เขียน {shard_writer.samples} sample ({shard_writer.bytes_written / 1e6:.1f} MB) ลง shard ที่ {SHARD_DIR}")
+    catalog.close()
+
+    print(f"{'='*70}")
+    print("เสร็จสิ้นทุกโฟลเดอร์!")
+    print(f"ผลลัพธ์บันทึกที่: {OUTPUT_DIR}")
+    print("สรุปการ encode:")
+    encoder.stats.report("  ")
+    print(f"{'='*70}")
+
 
-print(f"{'='*70}")
-print("เสร็จสิ้นทุกโฟลเดอร์!")
-print(f"ผลลัพธ์บันทึกที่: {OUTPUT_DIR}")
-print(f"{'='*70}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
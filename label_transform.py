@@ -0,0 +1,130 @@
+import os
+import time
+
+import numpy as np
+import cv2
+
+
+MIN_BOX_PIXELS = 2.0   # box ที่เหลือกว้างหรือสูงไม่ถึงนี้หลัง clip (อยู่นอกภาพผลลัพธ์) ถูกตัดทิ้ง
+
+
+def read_yolo_labels(path):
+    """
+    อ่านไฟล์ label แบบ YOLO (class cx cy w h ต่อบรรทัด, พิกัด normalize ตามขนาดภาพ)
+    คืน (classes int (N,), boxes float64 (N, 4)) หรือ None ถ้าไม่มีไฟล์
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            values = f.read().split()
+    except FileNotFoundError:
+        return None
+    if len(values) % 5:
+        raise ValueError(f"'{path}' ไม่ใช่ label แบบ box (class cx cy w h)")
+    data = np.array(values, dtype=np.float64).reshape(-1, 5)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def write_yolo_labels(path, classes, boxes):
+    lines = [f"{c} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n"
+             for c, (cx, cy, w, h) in zip(classes.tolist(), boxes.tolist())]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def transform_boxes(boxes, image_size, matrix, output_size, min_pixels=MIN_BOX_PIXELS, content=None):
+    """
+    แปลง box (N, 4) แบบ YOLO ของภาพขนาด image_size (w, h) ด้วย homography matrix
+    มุมทั้ง 4 ของทุก box ผ่าน cv2.perspectiveTransform ครั้งเดียว แล้วใช้กรอบสี่เหลี่ยมที่ล้อมมุมที่แปลงแล้ว
+    clip กับ content (left, top, right, bottom; ค่าเริ่มต้นคือทั้ง output_size) แล้ว normalize ตาม output_size (w, h)
+    คืน (keep (N,) bool, boxes (M, 4) ของ box ที่เหลือ)
+    """
+    if not len(boxes):
+        return np.zeros(0, dtype=bool), np.zeros((0, 4))
+    width, height = image_size
+    out_w, out_h = output_size
+    cx, cy, bw, bh = (boxes * (width, height, width, height)).T
+    x1, y1 = cx - bw / 2, cy - bh / 2
+    x2, y2 = cx + bw / 2, cy + bh / 2
+
+    corners = np.stack([x1, y1, x2, y1, x2, y2, x1, y2], axis=1).reshape(-1, 1, 2)
+    warped = cv2.perspectiveTransform(corners, np.asarray(matrix, dtype=np.float64)).reshape(-1, 4, 2)
+
+    limit = np.array([out_w, out_h], dtype=np.float64)
+    if content is None:
+        content = (0, 0, out_w, out_h)
+    low = np.array(content[:2], dtype=np.float64)
+    high = np.array(content[2:], dtype=np.float64)
+    lo = np.clip(warped.min(axis=1), low, high)
+    hi = np.clip(warped.max(axis=1), low, high)
+    size = hi - lo
+    keep = (size >= min_pixels).all(axis=1)
+
+    center = (lo[keep] + hi[keep]) / 2
+    return keep, np.hstack([center / limit, size[keep] / limit])
+
+
+def image_size(path):
+    """ขนาด (w, h) ของภาพต้นฉบับ (ภาพในโฟลเดอร์เดียวกันมาจากกล้องเดียวกัน อ่านครั้งเดียวต่อโฟลเดอร์)"""
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    return img.shape[1], img.shape[0]
+
+
+def content_rect(transform_data):
+    """
+    กรอบที่มีภาพจริงในผลลัพธ์ (left, top, right, bottom)
+    transform แบบ letterbox มีแถบ pad ที่ถูกเติมสีขอบ box ต้องไม่ล้นเข้าไปในแถบนั้น
+    """
+    letterbox = transform_data.get('letterbox')
+    if letterbox is None:
+        out_w, out_h = transform_data['output_size']
+        return 0, 0, out_w, out_h
+    left, top = letterbox['pad']
+    new_w, new_h = letterbox['size']
+    return left, top, left + new_w, top + new_h
+
+
+def transform_label_folder(image_files, label_dir, transforms, output_folders, indent="   "):
+    """
+    แปลง label ของภาพดิบ (<label_dir>/<ชื่อภาพ>.txt) ด้วยทุก transform
+    แล้วเขียนไว้ข้างภาพผลลัพธ์: <output_folders[side]>/<ชื่อภาพ>_<side>.txt
+    ภาพที่ไม่มีไฟล์ label ถูกข้าม (ไม่สร้างไฟล์ว่าง เพราะไฟล์ว่างคือ "ไม่มีวัตถุ" สำหรับ YOLO)
+    คืน dict: files, boxes, dropped, missing
+    """
+    stats = {'files': 0, 'boxes': 0, 'dropped': 0, 'missing': 0}
+    if not image_files:
+        return stats
+    size = image_size(image_files[0])
+    if size is None:
+        print(f"{indent}✗ ไม่สามารถอ่านขนาดภาพ: {os.path.basename(image_files[0])}")
+        return stats
+
+    start = time.perf_counter()
+    for img_path in image_files:
+        base_filename = os.path.splitext(os.path.basename(img_path))[0]
+        try:
+            labels = read_yolo_labels(os.path.join(label_dir, f"{base_filename}.txt"))
+        except ValueError as e:
+            print(f"{indent}✗ {e}")
+            continue
+        if labels is None:
+            stats['missing'] += 1
+            continue
+
+        classes, boxes = labels
+        for transform_data in transforms:
+            side = transform_data['side']
+            keep, warped = transform_boxes(boxes, size, transform_data['matrix'],
+                                           transform_data['output_size'],
+                                           content=content_rect(transform_data))
+            write_yolo_labels(os.path.join(output_folders[side], f"{base_filename}_{side}.txt"),
+                              classes[keep], warped)
+            stats['boxes'] += len(warped)
+            stats['dropped'] += len(keep) - len(warped)
+        stats['files'] += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"{indent}label: {stats['files']} ไฟล์ ({stats['files'] / max(elapsed, 1e-9):.0f} ไฟล์/s) | "
+          f"box {stats['boxes']} | ตัดทิ้ง (นอกภาพ) {stats['dropped']} | ไม่มี label {stats['missing']}")
+    return stats
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+
+
+DEFAULT_LETTERBOX_SIZE = 640   # imgsz ของ YOLOv8
+LETTERBOX_PAD_VALUE = 114      # สีขอบเดียวกับ LetterBox ของ ultralytics
+
+
+def letterbox_geometry(source_size, target_size):
+    """
+    ตำแหน่งของภาพขนาด source_size (w, h) ใน frame ขนาด target_size (w, h)
+    แบบเดียวกับ LetterBox ของ ultralytics (auto=False, center=True): ย่อ/ขยายคงสัดส่วน แล้วเติมขอบให้อยู่กลาง
+    คืน dict: scale, size (w, h หลังย่อ), pad (left, top), source_size, target_size
+    """
+    width, height = source_size
+    target_w, target_h = target_size
+    scale = min(target_w / width, target_h / height)
+    new_w = int(round(width * scale))
+    new_h = int(round(height * scale))
+    left = int(round((target_w - new_w) / 2 - 0.1))
+    top = int(round((target_h - new_h) / 2 - 0.1))
+    return {
+        'scale': scale,
+        'size': (new_w, new_h),
+        'pad': (left, top),
+        'source_size': (int(width), int(height)),
+        'target_size': (int(target_w), int(target_h)),
+    }
+
+
+def letterbox_matrix(matrix, letterbox):
+    """
+    ต่อการย่อและการเลื่อนของ letterbox เข้ากับ homography
+    warp ด้วย matrix ที่ได้ครั้งเดียวจะได้ frame ขนาด target_size ตรงจากภาพดิบ (ไม่ต้อง resize อีกรอบ)
+    จุด (x, y) ในผลลัพธ์เดิมไปอยู่ที่ (x * scale + left, y * scale + top)
+    """
+    scale = letterbox['scale']
+    left, top = letterbox['pad']
+    fold = np.array([[scale, 0.0, left],
+                     [0.0, scale, top],
+                     [0.0, 0.0, 1.0]])
+    return fold @ np.asarray(matrix, dtype=np.float64)
+
+
+def letterbox_transforms(transforms, target_size):
+    """
+    คืน list ของ transform ใหม่ที่ warp ตรงไปยัง frame ขนาด target_size (w, h)
+    ไม่แก้ transform เดิม (ที่บันทึกใน calibration) และไม่คัดลอกตาราง remap เดิม
+    """
+    result = []
+    for transform_data in transforms:
+        letterbox = letterbox_geometry(transform_data['output_size'], target_size)
+        result.append({
+            'side': transform_data['side'],
+            'points': transform_data['points'],
+            'matrix': letterbox_matrix(transform_data['matrix'], letterbox),
+            'output_size': letterbox['target_size'],
+            'letterbox': letterbox,
+        })
+    return result
+
+
+def fill_padding(image, letterbox, value=LETTERBOX_PAD_VALUE):
+    """
+    เติมสีขอบในแถบ pad (homography ยัง map แถบนี้ไปยังภาพดิบรอบถาด จึงมีภาพติดมา) แก้ image โดยตรง
+    """
+    left, top = letterbox['pad']
+    new_w, new_h = letterbox['size']
+    image[:top] = value
+    image[top + new_h:] = value
+    image[top:top + new_h, :left] = value
+    image[top:top + new_h, left + new_w:] = value
+    return image
+
+
+def save_letterbox_metadata(path, transforms):
+    """
+    บันทึก scale/pad ของแต่ละ side เป็น JSON (ใช้แปลง box กลับเป็นพิกัดของภาพที่ warp แบบเดิม:
+    x_เดิม = (x - pad_left) / scale)
+    """
+    data = {}
+    for transform_data in transforms:
+        letterbox = transform_data.get('letterbox')
+        if letterbox is None:
+            continue
+        data[transform_data['side']] = {
+            'imgsz': list(letterbox['target_size']),
+            'scale': letterbox['scale'],
+            'pad': list(letterbox['pad']),
+            'size': list(letterbox['size']),
+            'source_size': list(letterbox['source_size']),
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
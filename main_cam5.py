@@ -11,7 +11,19 @@ if sys.stderr.encoding != 'utf-8':
 import numpy as np
 import cv2
 import os
-import glob
+import time
+from functools import lru_cache
+from frame_pipeline import run_frame_pipeline
+from remap_engine import build_remap_tables, apply_remap_tables, clear_remap_cache
+from output_manifest import OutputManifest, params_digest
+from preview_warp import prepare_preview
+from calibration_profile import load_calibration, save_calibration, get_folder_calibration
+from frame_catalog import FrameCatalog, DEFAULT_CATALOG
+from frame_cache import FrameCache
+from output_encoder import parse_encoder
+from buffer_pool import BufferPool
+from band_warp import DEFAULT_MAX_WARP_MB, BAND_HALO, exceeds_budget, render_bands, shift_matrix
+from cli_args import get_arg_value
 
 # --- ค่าคงที่และตัวแปร Global ---
 WINDOW_NAME = "Image - Click points (Top-Left, Top-Right, Bottom-Right, Bottom-Left)"
@@ -19,6 +31,25 @@ PREVIEW_WINDOW = "Preview Transform Result"
 points_src = []
 g_transforms = []  # เก็บข้อมูล transform ทั้งหมด
 
+# --- ตั้งค่าการประมวลผล ---
+PIPELINE_READERS = 2                                 # thread สำหรับ decode
+PIPELINE_WRITERS = get_arg_value('--encode-workers', 2)  # thread สำหรับ encode/เขียนไฟล์
+MAX_IN_FLIGHT = get_arg_value('--max-in-flight', 8)  # จำนวนเฟรมสูงสุดที่ค้างในหน่วยความจำ
+MARGIN_RATIO = 0.35                                  # ความกว้างแถบขอบซ้าย/ขวา (สัดส่วนของส่วนกลาง)
+JPEG_QUALITY = 95
+ENCODER_SPEC = get_arg_value('--encoder', f'jpeg:quality={JPEG_QUALITY}')  # ดู output_encoder.parse_encoder
+FORCE = '--force' in sys.argv                        # ประมวลผลใหม่ทุกไฟล์ ไม่สน manifest
+RESCAN = '--rescan' in sys.argv                      # list ทุกโฟลเดอร์ใหม่ ไม่เชื่อ mtime ของโฟลเดอร์ใน catalog
+HEADLESS = '--headless' in sys.argv                  # ไม่เปิดหน้าต่าง ใช้ไฟล์ calibration ที่บันทึกไว้
+EDGE_FILTERS = ('bilateral', 'bilateral_source', 'bilateral_half', 'none')
+EDGE_FILTER = get_arg_value('--edge-filter', 'bilateral')  # filter ของแถบขอบซ้าย/ขวา (ดู render_side_strip)
+RUN_BENCHMARK = '--bench' in sys.argv                # benchmark ขั้นตอนใน create_enhanced_focus_image ก่อนประมวลผล
+BENCHMARK_FRAMES = 3
+FRAME_CACHE_DIR = get_arg_value('--frame-cache', '')  # cache ภาพที่ decode แล้ว (memmap) ไว้ใช้ซ้ำในรอบถัดไป
+FRAME_CACHE_GB = get_arg_value('--frame-cache-gb', 8.0)  # ขนาดสูงสุดของ frame cache (GB)
+MAX_WARP_MB = get_arg_value('--max-warp-mb', DEFAULT_MAX_WARP_MB)  # ภาพผลลัพธ์ใหญ่กว่านี้สร้างทีละแถบ (0 = ไม่จำกัด)
+MAX_WARP_BYTES = MAX_WARP_MB << 20
+
 # --- ฟังก์ชันคำนวณขนาดผลลัพธ์จากจุด 4 จุด ---
 def calculate_output_size(pts):
     pt_TL = pts[0]
@@ -39,13 +70,30 @@ def calculate_output_size(pts):
     
     return maxWidth, maxHeight
 
-# --- ฟังก์ชันสร้างภาพแบบ Enhanced Focus (เวอร์ชันปรับปรุง - ไม่มีขอบ) ---
-def create_enhanced_focus_image(img_original, pts_src, matrix, output_size, margin_ratio=0.35):
+# --- ฟังก์ชันคำนวณตาราง remap สำหรับย่อ/ขยายแถบขอบ (เท่ากับ cv2.resize แบบ INTER_LINEAR) ---
+def build_strip_remap_tables(region_size, strip_size, rows=None):
+    """rows: (y0, y1) สร้างเฉพาะแถว y0..y1 ของแถบ (ใช้ตอนสร้างทีละแถบ)"""
+    region_w, region_h = region_size
+    strip_w, strip_h = strip_size
+    y0, y1 = rows if rows is not None else (0, strip_h)
+    
+    map_x = (np.arange(strip_w, dtype=np.float32) + 0.5) * (region_w / strip_w) - 0.5
+    map_y = (np.arange(y0, y1, dtype=np.float32) + 0.5) * (region_h / strip_h) - 0.5
+    map_x = np.broadcast_to(map_x.reshape(1, -1), (y1 - y0, strip_w))
+    map_y = np.broadcast_to(map_y.reshape(-1, 1), (y1 - y0, strip_w))
+    
+    return cv2.convertMaps(np.ascontiguousarray(map_x), np.ascontiguousarray(map_y),
+                           cv2.CV_16SC2)
+
+# --- ฟังก์ชันคำนวณ geometry ของภาพ Enhanced Focus (คงที่ตลอดโฟลเดอร์) ---
+def build_focus_geometry(pts_src, matrix, output_size, image_shape, margin_ratio=0.35,
+                         build_maps=True):
     """
-    สร้างภาพที่ส่วนกลาง (Transform) ชัดเจน และส่วนข้างบีบแบบสมูท
-    ใช้เทคนิค multi-band blending เพื่อไม่ให้เห็นขอบ
+    คำนวณครั้งเดียวต่อ transform: ตาราง remap ของส่วนกลาง, ตำแหน่งแถบขอบซ้าย/ขวา
+    และตาราง remap สำหรับย่อ/ขยายแถบขอบ
+    build_maps=False: ไม่สร้างตาราง (ภาพใหญ่เกินเพดาน สร้างทีละแถบใน create_enhanced_focus_image_banded)
     """
-    h_orig, w_orig = img_original.shape[:2]
+    h_orig, w_orig = image_shape[:2]
     
     # หาขอบเขตของจุดที่เลือก
     x_coords = [pt[0] for pt in pts_src]
@@ -56,92 +104,372 @@ def create_enhanced_focus_image(img_original, pts_src, matrix, output_size, marg
     y_min = int(min(y_coords))
     y_max = int(max(y_coords))
     
-    # ทำ Perspective Transform
-    transformed = cv2.warpPerspective(img_original, matrix, output_size, 
-                                     flags=cv2.INTER_LINEAR,
-                                     borderMode=cv2.BORDER_CONSTANT,
-                                     borderValue=(0, 0, 0))
     transform_h = output_size[1]
+    margin_width = int(output_size[0] * margin_ratio)
     
-    left_margin_width = int(output_size[0] * margin_ratio)
-    right_margin_width = int(output_size[0] * margin_ratio)
+    y_start = max(0, int(y_min))
+    y_end = min(h_orig, int(y_max))
     
-    left_part = None
+    strip_rects = [None, None]
     if x_min > 10:
-        y_start = max(0, int(y_min))
-        y_end = min(h_orig, int(y_max))
+        strip_rects[0] = (y_start, y_end, max(0, x_min-50), x_min)
+    if x_max < w_orig - 10:
+        strip_rects[1] = (y_start, y_end, x_max, min(w_orig, x_max+50))
+    
+    strips = []
+    for rect in strip_rects:
+        if rect is None:
+            strips.append(None)
+            continue
+        region_h = rect[1] - rect[0]
+        region_w = rect[3] - rect[2]
+        if region_h <= 0 or region_w <= 0 or margin_width <= 0 or transform_h <= 0:
+            strips.append(None)
+            continue
+        strips.append({
+            'rect': rect,
+            'size': (margin_width, transform_h),
+            'maps': (build_strip_remap_tables((region_w, region_h), (margin_width, transform_h))
+                     if build_maps else None),
+        })
+    
+    return {
+        'image_shape': (h_orig, w_orig),
+        'margin_ratio': margin_ratio,
+        'warp_maps': build_remap_tables(matrix, output_size) if build_maps else None,
+        'left': strips[0],
+        'right': strips[1],
+    }
+
+def focus_output_size(output_size, margin_ratio=0.35):
+    """ขนาดสูงสุดของภาพ Enhanced Focus (ส่วนกลาง + แถบขอบซ้าย/ขวา)"""
+    width, height = output_size
+    return width + 2 * int(width * margin_ratio), height
+
+def get_focus_geometry(transform_data, image_shape, margin_ratio=0.35, max_bytes=0):
+    """
+    ดึง geometry ที่ cache ไว้ใน transform_data (สร้างใหม่เมื่อขนาดภาพเปลี่ยน)
+    ภาพผลลัพธ์ที่ใหญ่กว่า max_bytes ไม่สร้างตาราง remap (สร้างทีละแถบแทน)
+    """
+    build_maps = not exceeds_budget(focus_output_size(transform_data['output_size'], margin_ratio),
+                                    max_bytes)
+    geometry = transform_data.get('focus_geometry')
+    if (geometry is None or geometry['image_shape'] != tuple(image_shape[:2])
+            or geometry['margin_ratio'] != margin_ratio
+            or (geometry['warp_maps'] is not None) != build_maps):
+        geometry = build_focus_geometry(transform_data['points'], transform_data['matrix'],
+                                        transform_data['output_size'], image_shape, margin_ratio,
+                                        build_maps)
+        transform_data['focus_geometry'] = geometry
+    return geometry
+
+# --- ฟังก์ชันสร้างแถบขอบซ้าย/ขวา พร้อม edge-preserving filter ---
+def render_side_strip(img_original, strip, edge_filter='bilateral', dst=None):
+    """
+    dst: array ปลายทางขนาดเท่าแถบ (เช่น slice ของภาพที่ต่อกัน)
+    edge_filter:
+      'bilateral'        - bilateralFilter บนแถบที่ขยายแล้ว (แบบเดิม)
+      'bilateral_source' - bilateralFilter บนแถบต้นฉบับกว้าง 50 px ก่อนขยาย (เล็กกว่ามาก)
+      'bilateral_half'   - ย่อครึ่ง -> bilateralFilter -> ขยายกลับ
+      'none'             - ไม่ filter
+    """
+    y_start, y_end, x_start, x_end = strip['rect']
+    region = img_original[y_start:y_end, x_start:x_end]
+    map1, map2 = strip['maps']
+    
+    if edge_filter == 'bilateral_source':
+        region = cv2.bilateralFilter(region, 5, 50, 50)
+    
+    # filter ที่ทำหลังขยายเขียนลง dst เอง ส่วนแบบอื่น remap ลง dst ได้เลย
+    direct = edge_filter in ('bilateral_source', 'none')
+    part = cv2.remap(region, map1, map2, cv2.INTER_LINEAR, dst=dst if direct else None,
+                     borderMode=cv2.BORDER_REPLICATE)
+    
+    if edge_filter == 'bilateral':
+        part = cv2.bilateralFilter(part, 5, 50, 50, dst=dst)
+    elif edge_filter == 'bilateral_half':
+        strip_w, strip_h = strip['size']
+        small = cv2.resize(part, (max(1, strip_w // 2), max(1, strip_h // 2)),
+                           interpolation=cv2.INTER_AREA)
+        small = cv2.bilateralFilter(small, 3, 50, 50)
+        part = cv2.resize(small, (strip_w, strip_h), dst=dst, interpolation=cv2.INTER_LINEAR)
+    elif edge_filter not in ('bilateral_source', 'none'):
+        raise ValueError(f"ไม่รู้จัก edge_filter '{edge_filter}' (เลือกได้: {', '.join(EDGE_FILTERS)})")
+    
+    return part
+
+# --- ฟังก์ชันสร้างส่วนประกอบของภาพ Enhanced Focus (ซ้าย / กลาง / ขวา) ---
+def create_focus_parts(img_original, pts_src, matrix, output_size, margin_ratio=0.35,
+                       edge_filter='bilateral', geometry=None, dst=None):
+    """
+    คืน list ของภาพย่อยที่จะนำมาต่อกัน: [ขอบซ้าย], ส่วนที่ Transform, [ขอบขวา]
+    geometry: ผลจาก build_focus_geometry (ถ้าไม่ส่งมาจะคำนวณใหม่)
+    dst: array ขนาด focus_parts_shape() ถ้าส่งมา ภาพย่อยจะถูกเขียนลง slice ของ dst ตรงๆ
+         (ส่วนที่คืนเป็น view ของ dst ไม่ต้อง hconcat)
+    """
+    if geometry is None:
+        geometry = build_focus_geometry(pts_src, matrix, output_size, img_original.shape,
+                                        margin_ratio)
+    
+    # ลำดับจากซ้ายไปขวา (None คือส่วนที่ Transform)
+    layout = []
+    if geometry['left'] is not None:
+        layout.append(geometry['left'])
+    layout.append(None)
+    if geometry['right'] is not None:
+        layout.append(geometry['right'])
+    
+    parts = []
+    x0 = 0
+    for strip in layout:
+        width = output_size[0] if strip is None else strip['size'][0]
+        view = dst[:, x0:x0 + width] if dst is not None else None
+        x0 += width
+        if strip is None:
+            # ทำ Perspective Transform ด้วยตาราง remap ที่คำนวณไว้
+            parts.append(apply_remap_tables(img_original, geometry['warp_maps'], dst=view))
+        else:
+            parts.append(render_side_strip(img_original, strip, edge_filter, dst=view))
+    
+    return parts
+
+def focus_parts_shape(geometry, output_size, image_shape):
+    """shape ของภาพที่ต่อจาก create_focus_parts แล้ว (ใช้จอง buffer ล่วงหน้า)"""
+    width = output_size[0] + sum(geometry[key]['size'][0] for key in ('left', 'right')
+                                 if geometry[key] is not None)
+    return (output_size[1], width) + tuple(image_shape[2:])
+
+# --- ฟังก์ชันหาตำแหน่งรอยต่อระหว่างภาพย่อย ---
+def get_seam_positions(parts):
+    seam_x_list = []
+    current_x = 0
+    for i in range(len(parts) - 1):
+        current_x += parts[i].shape[1]
+        seam_x_list.append(current_x)
+    return seam_x_list
+
+# --- ฟังก์ชัน feather รอยต่อแบบเดิม (ทีละคอลัมน์) ใช้เทียบผลและ benchmark ---
+def feather_seams_reference(result, seam_x_list, feather_width=25):
+    for seam_x in seam_x_list:
+        start_x = max(0, seam_x - feather_width)
+        end_x = min(result.shape[1], seam_x + feather_width)
         
-        left_region = img_original[y_start:y_end, max(0, x_min-50):x_min]
+        if end_x - start_x < 2:
+            continue
         
-        if left_region.shape[0] > 0 and left_region.shape[1] > 0:
-            left_part = cv2.resize(left_region, 
-                                  (left_margin_width, transform_h), 
-                                  interpolation=cv2.INTER_LINEAR)
-            left_part = cv2.bilateralFilter(left_part, 5, 50, 50)
+        for i in range(end_x - start_x):
+            x_pos = start_x + i
+            if x_pos <= 0 or x_pos >= result.shape[1] - 1:
+                continue
+            
+            relative_pos = (x_pos - start_x) / (end_x - start_x)
+            if relative_pos < 0.5:
+                alpha = relative_pos * 2  # 0 -> 1
+            else:
+                alpha = (1 - relative_pos) * 2  # 1 -> 0
+            
+            # Blur pixel นี้
+            if alpha < 0.99:
+                col = result[:, x_pos:x_pos+1].copy()
+                col_blurred = cv2.GaussianBlur(col, (1, 11), 0)
+                result[:, x_pos:x_pos+1] = cv2.addWeighted(
+                    col, alpha, col_blurred, 1-alpha, 0
+                )
     
-    right_part = None
-    if x_max < w_orig - 10:
-        y_start = max(0, int(y_min))
-        y_end = min(h_orig, int(y_max))
+    return result
+
+# --- alpha ramp ของโซน feather (คำนวณครั้งเดียวต่อ geometry) ---
+@lru_cache(maxsize=32)
+def _seam_alpha_ramp(start_x, end_x, total_width):
+    """
+    alpha ต่อคอลัมน์ 0 -> 1 -> 0 ในรูป (1, n, 1) float32
+    คอลัมน์ที่แบบเดิมไม่แตะ (ขอบภาพ หรือ alpha >= 0.99) ให้ alpha = 1 คือคงค่าเดิม
+    """
+    n = end_x - start_x
+    relative_pos = np.arange(n, dtype=np.float64) / n
+    alpha = np.where(relative_pos < 0.5, relative_pos * 2, (1 - relative_pos) * 2)
+    
+    x_pos = start_x + np.arange(n)
+    keep = (x_pos <= 0) | (x_pos >= total_width - 1) | (alpha >= 0.99)
+    alpha[keep] = 1.0
+    
+    ramp = alpha.astype(np.float32).reshape(1, n, 1)
+    ramp.setflags(write=False)
+    return ramp
+
+# --- ฟังก์ชัน feather รอยต่อแบบ vectorized: blur ทั้งแถบครั้งเดียว + blend ด้วย alpha ramp ---
+def feather_seams(result, seam_x_list, feather_width=25):
+    """
+    ให้ผลเท่ากับ feather_seams_reference (ต่างกันไม่เกิน 1 ระดับสีจากการปัดเศษ)
+    Gaussian kernel (1, 11) blur แนวตั้งอย่างเดียว จึง blur ทั้งแถบได้โดยไม่ปนข้ามคอลัมน์
+    """
+    for seam_x in seam_x_list:
+        start_x = max(0, seam_x - feather_width)
+        end_x = min(result.shape[1], seam_x + feather_width)
         
-        right_region = img_original[y_start:y_end, x_max:min(w_orig, x_max+50)]
+        if end_x - start_x < 2:
+            continue
+        
+        band = result[:, start_x:end_x]
+        band_blurred = cv2.GaussianBlur(band, (1, 11), 0)
+        alpha = _seam_alpha_ramp(start_x, end_x, result.shape[1])
         
-        if right_region.shape[0] > 0 and right_region.shape[1] > 0:
-            right_part = cv2.resize(right_region, 
-                                   (right_margin_width, transform_h), 
-                                   interpolation=cv2.INTER_LINEAR)
-            right_part = cv2.bilateralFilter(right_part, 5, 50, 50)
+        blended = band_blurred.astype(np.float32)
+        blended += alpha * (band.astype(np.float32) - blended)
+        np.rint(blended, out=blended)
+        band[:] = blended.astype(np.uint8)
     
-    # === รวมภาพด้วย Gradient Blending ===
-    parts = []
-    if left_part is not None and left_part.size > 0:
-        parts.append(left_part)
-    parts.append(transformed)
-    if right_part is not None and right_part.size > 0:
-        parts.append(right_part)
+    return result
+
+# --- ฟังก์ชันสร้างภาพแบบ Enhanced Focus (เวอร์ชันปรับปรุง - ไม่มีขอบ) ---
+def create_enhanced_focus_image(img_original, pts_src, matrix, output_size, margin_ratio=0.35,
+                                edge_filter='bilateral', geometry=None, max_bytes=0, pool=None):
+    """
+    สร้างภาพที่ส่วนกลาง (Transform) ชัดเจน และส่วนข้างบีบแบบสมูท
+    ใช้เทคนิค multi-band blending เพื่อไม่ให้เห็นขอบ
+    ถ้าผลลัพธ์ใหญ่กว่า max_bytes จะสร้างทีละแถบ (create_enhanced_focus_image_banded)
+    pool: BufferPool ถ้าส่งมา ภาพย่อยถูกเขียนลง buffer ของ pool ตรงๆ แทน hconcat
+          (ผู้เรียกต้อง release ภาพที่ได้คืนเมื่อใช้เสร็จ)
+    """
+    if exceeds_budget(focus_output_size(output_size, margin_ratio), max_bytes):
+        return create_enhanced_focus_image_banded(img_original, pts_src, matrix, output_size,
+                                                  margin_ratio, edge_filter, geometry, max_bytes)
+
+    result = None
+    if pool is not None:
+        if geometry is None:
+            geometry = build_focus_geometry(pts_src, matrix, output_size, img_original.shape,
+                                            margin_ratio)
+        result = pool.acquire(focus_parts_shape(geometry, output_size, img_original.shape))
+
+    parts = create_focus_parts(img_original, pts_src, matrix, output_size, margin_ratio,
+                               edge_filter, geometry, dst=result)
     
     if len(parts) == 1:
-        return parts[0]
-    
-    # รวมภาพพื้นฐาน
-    result = cv2.hconcat(parts)
+        return result if result is not None else parts[0]
     
-    feather_width = 25
+    # === รวมภาพด้วย Gradient Blending ===
+    if result is None:
+        result = cv2.hconcat(parts)
     
-    if len(parts) >= 2:
-        seam_x_list = []
-        current_x = 0
-        for i in range(len(parts) - 1):
-            current_x += parts[i].shape[1]
-            seam_x_list.append(current_x)
+    return feather_seams(result, get_seam_positions(parts), feather_width=25)
 
-        for seam_x in seam_x_list:
-            start_x = max(0, seam_x - feather_width)
-            end_x = min(result.shape[1], seam_x + feather_width)
-            
-            if end_x - start_x < 2:
-                continue
-            
-            for i in range(end_x - start_x):
-                x_pos = start_x + i
-                if x_pos <= 0 or x_pos >= result.shape[1] - 1:
-                    continue
-                
-                relative_pos = (x_pos - start_x) / (end_x - start_x)
-                if relative_pos < 0.5:
-                    alpha = relative_pos * 2  # 0 -> 1
-                else:
-                    alpha = (1 - relative_pos) * 2  # 1 -> 0
-                
-                # Blur pixel นี้
-                if alpha < 0.99:
-                    col = result[:, x_pos:x_pos+1].copy()
-                    col_blurred = cv2.GaussianBlur(col, (1, 11), 0)
-                    result[:, x_pos:x_pos+1] = cv2.addWeighted(
-                        col, alpha, col_blurred, 1-alpha, 0
-                    )
+# --- ฟังก์ชันสร้างภาพ Enhanced Focus ทีละแถบ (หน่วยความจำไม่เกิน max_bytes ไม่ว่าภาพจะใหญ่แค่ไหน) ---
+def create_enhanced_focus_image_banded(img_original, pts_src, matrix, output_size, margin_ratio,
+                                       edge_filter, geometry, max_bytes):
+    """
+    ผลใกล้เคียง create_enhanced_focus_image (ส่วนกลางใช้ warpPerspective แทนตาราง remap ต่างไม่กี่ระดับสี)
+    ทุกขั้นทำตามแถว ยกเว้น filter แนวตั้ง (bilateral, feather) ที่ได้แถวเผื่อ BAND_HALO แถวบน/ล่างของแถบ
+    ('bilateral_half' ย่อ/ขยายภายในแถบ จึงต่างจากแบบเต็มภาพมากกว่าเล็กน้อย)
+    คืน np.memmap บนไฟล์ชั่วคราว (ดู band_warp.render_bands)
+    """
+    if geometry is None:
+        geometry = build_focus_geometry(pts_src, matrix, output_size, img_original.shape,
+                                        margin_ratio, build_maps=False)
+    width, height = output_size
+    strips = [s for s in (geometry['left'], geometry['right']) if s is not None]
+    total_width = width + sum(s['size'][0] for s in strips)
+
+    def render_strip_band(strip, y0, y1):
+        y_start, y_end, x_start, x_end = strip['rect']
+        band_strip = {
+            'rect': strip['rect'],
+            'size': (strip['size'][0], y1 - y0),
+            'maps': build_strip_remap_tables((x_end - x_start, y_end - y_start), strip['size'],
+                                             rows=(y0, y1)),
+        }
+        return render_side_strip(img_original, band_strip, edge_filter)
+
+    def render_focus_band(y0, y1):
+        parts = [cv2.warpPerspective(img_original, shift_matrix(matrix, y0), (width, y1 - y0),
+                                     flags=cv2.INTER_LINEAR,
+                                     borderMode=cv2.BORDER_CONSTANT,
+                                     borderValue=(0, 0, 0))]
+        if geometry['left'] is not None:
+            parts.insert(0, render_strip_band(geometry['left'], y0, y1))
+        if geometry['right'] is not None:
+            parts.append(render_strip_band(geometry['right'], y0, y1))
+
+        if len(parts) == 1:
+            return parts[0]
+        band = cv2.hconcat(parts)
+        return feather_seams(band, get_seam_positions(parts), feather_width=25)
+
+    return render_bands((height, total_width, 3), render_focus_band, max_bytes, halo=BAND_HALO)
+
+# --- Benchmark การ feather รอยต่อ แบบเดิมเทียบกับแบบ vectorized ---
+def benchmark_feathering(images, transforms, repeat=3):
+    if not images or not transforms:
+        print("ไม่มีภาพหรือ transform สำหรับ benchmark")
+        return None
     
-    return result
+    cases = []
+    for img in images:
+        for transform_data in transforms:
+            parts = create_focus_parts(img, transform_data['points'], transform_data['matrix'],
+                                       transform_data['output_size'])
+            if len(parts) > 1:
+                cases.append((cv2.hconcat(parts), get_seam_positions(parts)))
+    
+    if not cases:
+        print("ไม่มีรอยต่อให้ feather (ไม่มีขอบซ้าย/ขวา)")
+        return None
+    
+    timings = {}
+    max_diff = 0
+    for name, fn in [('loop', feather_seams_reference), ('vectorized', feather_seams)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for base, seams in cases:
+                fn(base.copy(), seams)
+        timings[name] = (time.perf_counter() - start) * 1000 / (repeat * len(cases))
+    
+    for base, seams in cases:
+        ref = feather_seams_reference(base.copy(), seams)
+        out = feather_seams(base.copy(), seams)
+        max_diff = max(max_diff, int(np.abs(ref.astype(np.int16) - out).max()))
+    
+    speedup = timings['loop'] / timings['vectorized'] if timings['vectorized'] > 0 else float('inf')
+    print(f"\n--- Benchmark feather รอยต่อ ({len(cases)} ภาพ) ---")
+    print(f"  แบบเดิม (ทีละคอลัมน์) : {timings['loop']:8.3f} ms/ภาพ")
+    print(f"  แบบ vectorized       : {timings['vectorized']:8.3f} ms/ภาพ")
+    print(f"  speedup              : {speedup:8.2f}x  (ต่างสูงสุด {max_diff} ระดับสี)")
+    
+    return {'loop_ms': timings['loop'], 'vectorized_ms': timings['vectorized'],
+            'speedup': speedup, 'max_diff': max_diff}
+
+# --- Benchmark ต้นทุนต่อ section: geometry ต่อเฟรม vs cache และ edge filter แต่ละแบบ ---
+def benchmark_focus_filters(images, transforms, repeat=3):
+    if not images or not transforms:
+        print("ไม่มีภาพหรือ transform สำหรับ benchmark")
+        return None
+    
+    def run(edge_filter, cached):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for img in images:
+                for transform_data in transforms:
+                    if cached:
+                        geometry = get_focus_geometry(transform_data, img.shape)
+                    else:
+                        clear_remap_cache()
+                        geometry = None
+                    create_enhanced_focus_image(img, transform_data['points'],
+                                                transform_data['matrix'],
+                                                transform_data['output_size'],
+                                                edge_filter=edge_filter, geometry=geometry)
+        return (time.perf_counter() - start) * 1000 / (repeat * len(images) * len(transforms))
+    
+    results = {'uncached_bilateral': run('bilateral', cached=False)}
+    for edge_filter in EDGE_FILTERS:
+        results[edge_filter] = run(edge_filter, cached=True)
+    
+    print(f"\n--- Benchmark ต้นทุนต่อ section ({len(images)} เฟรม x {len(transforms)} section) ---")
+    print(f"  geometry ต่อเฟรม + bilateral : {results['uncached_bilateral']:8.2f} ms/section")
+    for edge_filter in EDGE_FILTERS:
+        print(f"  cache + {edge_filter:<20} : {results[edge_filter]:8.2f} ms/section")
+    
+    return results
 
 # --- ฟังก์ชันย่อ/ขยายภาพโดยรักษาสัดส่วน ---
 def resize_image(image, max_dim):
@@ -216,7 +544,11 @@ def show_preview(img_original, resize_ratio_display):
         
         matrix = cv2.getPerspectiveTransform(pts_src, pts_dst)
         
-        composite = create_enhanced_focus_image(img_original, pts_src, matrix, (width, height))
+        # รวมสเกลของ preview เข้าไปใน matrix แล้วสร้างภาพจากภาพต้นฉบับย่อ
+        # (แถบขอบซ้าย/ขวาใช้ 50 px ของภาพย่อ จึงกว้างกว่าผลจริงเล็กน้อย)
+        source, ratio, preview_matrix, size = prepare_preview(img_original, matrix, (width, height), 900)
+        composite = create_enhanced_focus_image(source, pts_src * ratio, preview_matrix, size,
+                                                MARGIN_RATIO, edge_filter=EDGE_FILTER)
 
         preview = resize_image(composite, 900)
 
@@ -266,55 +598,17 @@ def process_and_calculate_matrices():
     
     return True
 
-# --- 1. กำหนด Path ---
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-BASE_PATH = os.path.join(SCRIPT_DIR, 'data', 'cam5')
-OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_transformed')
-
-print(f"ค้นหาโฟลเดอร์ใน: {BASE_PATH}")
-
-# --- 2. ค้นหาโฟลเดอร์ย่อย ---
-try:
-    all_items = os.listdir(BASE_PATH)
-    subfolders = [os.path.join(BASE_PATH, item) for item in all_items 
-                  if os.path.isdir(os.path.join(BASE_PATH, item))]
-    subfolders.sort()
-except FileNotFoundError:
-    print(f"ERROR: ไม่พบพาธ '{BASE_PATH}'")
-    sys.exit()
-
-if not subfolders:
-    print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
-    sys.exit()
-
-print(f"พบ {len(subfolders)} โฟลเดอร์")
-
-# --- 3. Loop หลัก ---
-for folder_path in subfolders:
-    folder_name = os.path.basename(os.path.normpath(folder_path))
-    print(f"\n{'='*70}")
-    print(f"โฟลเดอร์: {folder_name}")
-    print(f"{'='*70}")
-    
-    # ค้นหาไฟล์
-    image_files = glob.glob(os.path.join(folder_path, '*.jpg'))
-    if not image_files:
-        print(f"ไม่พบไฟล์ .jpg ข้าม")
-        continue
-    
-    print(f"พบ {len(image_files)} ไฟล์")
+# --- ฟังก์ชันเลือกจุดแบบ interactive ---
+def run_interactive_setup(img_setup, sample_path):
+    """
+    เปิดหน้าต่างให้คลิก 4/8/12 จุดบนภาพตัวอย่าง
+    คืนค่า True ถ้ากด 'y' ยืนยัน (ผลอยู่ใน points_src / g_transforms)
+    """
+    global points_src, g_transforms
 
-    # รีเซ็ตตัวแปร
     points_src = []
     g_transforms = []
-    
-    # โหลดภาพตัวอย่าง
-    SAMPLE_IMAGE = image_files[0]
-    img_setup = cv2.imread(SAMPLE_IMAGE)
-    if img_setup is None:
-        print(f"ERROR: ไม่สามารถโหลดภาพ")
-        continue
-    
+
     # ย่อขนาดสำหรับแสดงผล
     max_display = 1000
     img_display = resize_image(img_setup.copy(), max_display)
@@ -327,7 +621,7 @@ for folder_path in subfolders:
     cv2.setMouseCallback(WINDOW_NAME, mouse_callback, 
                          {'image': img_display, 'resize_ratio': resize_ratio})
 
-    print(f"\nภาพตัวอย่าง: {os.path.basename(SAMPLE_IMAGE)}")
+    print(f"\nภาพตัวอย่าง: {os.path.basename(sample_path)}")
     print(f"ขนาดต้นฉบับ: {w_orig}x{h_orig}")
     print("\n" + "="*70)
     print("  - คลิกตามลำดับ: Top-Left → Top-Right → Bottom-Right → Bottom-Left")
@@ -380,53 +674,208 @@ for folder_path in subfolders:
 
     cv2.destroyAllWindows()
 
-    if not g_transforms:
-        print(f"ข้ามโฟลเดอร์ {folder_name}")
-        continue
+    return bool(g_transforms)
 
-    # สร้างโฟลเดอร์ผลลัพธ์
-    output_base = os.path.join(OUTPUT_DIR, folder_name)
-    output_folders = {}
-    
-    for transform_data in g_transforms:
-        side = transform_data['side']
-        folder_path = os.path.join(output_base, side)
-        os.makedirs(folder_path, exist_ok=True)
-        output_folders[side] = folder_path
+# --- 1. กำหนด Path ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.join(SCRIPT_DIR, 'data', 'cam5')
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'result', 'cam5_transformed')
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, '.manifest.json')
+CALIBRATION_FILE = get_arg_value('--calibration',
+                                 os.path.join(SCRIPT_DIR, 'calibration', 'main_cam5.json'))
+CATALOG_FILE = get_arg_value('--catalog', DEFAULT_CATALOG)
 
-    print(f"\nโฟลเดอร์ผลลัพธ์:")
-    for side, path in output_folders.items():
-        print(f"  - {side}: {path}")
 
-    # ประมวลผลภาพทั้งหมด
-    print(f"\nเริ่มแปลงภาพ {len(image_files)} ไฟล์\n")
+def main():
+    global points_src, g_transforms
+
+    print(f"ค้นหาโฟลเดอร์ใน: {BASE_PATH}")
+
+    # --- 2. ค้นหาโฟลเดอร์ย่อย (อัปเดต catalog เฉพาะโฟลเดอร์ที่เปลี่ยน แล้ว query แทนการ listdir/glob) ---
+    catalog = FrameCatalog(CATALOG_FILE)
+    try:
+        changes = catalog.scan(BASE_PATH, camera='cam5', full=RESCAN)
+    except FileNotFoundError:
+        print(f"ERROR: ไม่พบพาธ '{BASE_PATH}'")
+        sys.exit()
+    print(f"catalog: อัปเดต {changes} ไฟล์")
+    subfolders = catalog.subfolders(BASE_PATH)
+
+    if not subfolders:
+        print(f"ERROR: ไม่พบโฟลเดอร์ย่อย")
+        sys.exit()
+
+    print(f"พบ {len(subfolders)} โฟลเดอร์")
+
+    if EDGE_FILTER not in EDGE_FILTERS:
+        print(f"ERROR: ไม่รู้จัก --edge-filter '{EDGE_FILTER}' (เลือกได้: {', '.join(EDGE_FILTERS)})")
+        sys.exit()
+
+    try:
+        encoder = parse_encoder(ENCODER_SPEC)
+    except ValueError as e:
+        print(f"ERROR: --encoder '{ENCODER_SPEC}': {e}")
+        sys.exit()
+
+    manifest = OutputManifest(MANIFEST_FILE)
+    # buffer ของภาพผลลัพธ์ ใช้ซ้ำข้ามเฟรม/โฟลเดอร์ (writer คืนเข้า pool หลังเขียนไฟล์)
+    buffer_pool = BufferPool()
+
+    frame_cache = None
+    if FRAME_CACHE_DIR:
+        frame_cache = FrameCache(FRAME_CACHE_DIR, max_bytes=int(FRAME_CACHE_GB * (1 << 30)))
+        print(f"ใช้ frame cache: {FRAME_CACHE_DIR} (สูงสุด {FRAME_CACHE_GB:g} GB)")
+
+    calibration = None
+    if HEADLESS:
+        calibration = load_calibration(CALIBRATION_FILE, 'main_cam5')
+        if calibration is None:
+            print(f"ERROR: ไม่พบไฟล์ calibration '{CALIBRATION_FILE}' (รันแบบคลิกก่อน 1 ครั้ง)")
+            sys.exit()
+        print(f"โหมด headless: ใช้ calibration '{CALIBRATION_FILE}'")
+
+    # --- 3. Loop หลัก ---
+    for folder_path in subfolders:
+        folder_name = os.path.basename(os.path.normpath(folder_path))
+        print(f"\n{'='*70}")
+        print(f"โฟลเดอร์: {folder_name}")
+        print(f"{'='*70}")
     
-    for i, img_path in enumerate(image_files):
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"  ✗ ไม่สามารถอ่าน: {os.path.basename(img_path)}")
+        # ค้นหาไฟล์
+        image_files = catalog.frames(BASE_PATH, folder_name)
+        if not image_files:
+            print(f"ไม่พบไฟล์ .jpg ข้าม")
             continue
-        
-        base_filename = os.path.splitext(os.path.basename(img_path))[0]
-        
-        
+    
+        print(f"พบ {len(image_files)} ไฟล์")
+
+        # รีเซ็ตตัวแปร
+        points_src = []
+        g_transforms = []
+    
+        if HEADLESS:
+            # ใช้จุด/matrix ที่บันทึกไว้ ไม่เปิดหน้าต่าง
+            points_src, g_transforms = get_folder_calibration(calibration, folder_name)
+            if g_transforms:
+                print(f"ใช้ calibration จากไฟล์ ({len(g_transforms)} ส่วน)")
+        else:
+            # โหลดภาพตัวอย่าง
+            SAMPLE_IMAGE = image_files[0]
+            img_setup = cv2.imread(SAMPLE_IMAGE)
+            if img_setup is None:
+                print(f"ERROR: ไม่สามารถโหลดภาพ")
+                continue
+
+            if run_interactive_setup(img_setup, SAMPLE_IMAGE):
+                save_calibration(CALIBRATION_FILE, 'main_cam5', folder_name,
+                                 points_src, g_transforms)
+                print(f"บันทึก calibration: {CALIBRATION_FILE}")
+
+        if not g_transforms:
+            print(f"ข้ามโฟลเดอร์ {folder_name}")
+            continue
+
+        # สร้างโฟลเดอร์ผลลัพธ์
+        output_base = os.path.join(OUTPUT_DIR, folder_name)
+        output_folders = {}
+    
         for transform_data in g_transforms:
             side = transform_data['side']
-            pts = transform_data['points']
-            matrix = transform_data['matrix']
-            output_size = transform_data['output_size']
-            composite = create_enhanced_focus_image(img, pts, matrix, output_size)
-            
-            save_path = os.path.join(output_folders[side], f"{base_filename}_{side}.jpg")
-            cv2.imwrite(save_path, composite, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        
-        if (i + 1) % 10 == 0 or (i + 1) == len(image_files):
-            print(f"  ✓ ประมวลผล {i+1}/{len(image_files)} ไฟล์")
+            folder_path = os.path.join(output_base, side)
+            os.makedirs(folder_path, exist_ok=True)
+            output_folders[side] = folder_path
+
+        print(f"\nโฟลเดอร์ผลลัพธ์:")
+        for side, path in output_folders.items():
+            print(f"  - {side}: {path}")
+
+        # ข้ามไฟล์ที่ผลลัพธ์เป็นปัจจุบันแล้ว (อินพุตและพารามิเตอร์ไม่เปลี่ยน)
+        params = {
+            'stage': 'main_cam5',
+            'transforms': [{'side': t['side'], 'points': t['points'], 'matrix': t['matrix'],
+                            'output_size': t['output_size']} for t in g_transforms],
+            'margin_ratio': MARGIN_RATIO,
+            'edge_filter': EDGE_FILTER,
+            'jpeg_quality': JPEG_QUALITY,
+        }
+        if not encoder.is_default_jpeg(JPEG_QUALITY):
+            params['encoder'] = encoder.describe()
+        digest = params_digest(params)
+        all_files = image_files
+        all_count = len(image_files)
+        if not FORCE:
+            image_files = manifest.filter_pending(image_files, digest)
+            if len(image_files) < all_count:
+                print(f"\nข้าม {all_count - len(image_files)} ไฟล์ที่เป็นปัจจุบันแล้ว")
+        if not image_files:
+            print(f"ทุกไฟล์เป็นปัจจุบันแล้ว ข้ามโฟลเดอร์ {folder_name}")
+            continue
+
+        def on_written(img_path, saved):
+            manifest.record(img_path, digest, saved)
+            catalog.record_outputs(img_path, 'main_cam5', saved)
+
+        # ภาพของทั้งวันจาก frame cache (decode ครั้งเดียว รอบถัดไปอ่านจาก memmap)
+        cached_day = None
+        if frame_cache is not None:
+            cached_day = frame_cache.load_day(os.path.join(BASE_PATH, folder_name), all_files,
+                                              pending=len(image_files))
+        read_image = cached_day.read if cached_day is not None else None
+
+        if RUN_BENCHMARK:
+            bench_images = [cv2.imread(p) for p in image_files[:BENCHMARK_FRAMES]]
+            bench_images = [im for im in bench_images if im is not None]
+            benchmark_feathering(bench_images, g_transforms)
+            benchmark_focus_filters(bench_images, g_transforms)
+
+        # ประมวลผลภาพทั้งหมด
+        print(f"\nเริ่มแปลงภาพ {len(image_files)} ไฟล์\n")
+        pool_before = buffer_pool.counters()
+    
+        def process_frame(img, img_path):
+            base_filename = os.path.splitext(os.path.basename(img_path))[0]
+            outputs = []
+            for transform_data in g_transforms:
+                side = transform_data['side']
+                pts = transform_data['points']
+                matrix = transform_data['matrix']
+                output_size = transform_data['output_size']
+                geometry = get_focus_geometry(transform_data, img.shape, MARGIN_RATIO, MAX_WARP_BYTES)
+                composite = create_enhanced_focus_image(img, pts, matrix, output_size, MARGIN_RATIO,
+                                                        edge_filter=EDGE_FILTER, geometry=geometry,
+                                                        max_bytes=MAX_WARP_BYTES,
+                                                        pool=buffer_pool)
+                
+                save_path = os.path.join(output_folders[side], f"{base_filename}_{side}{encoder.ext}")
+                outputs.append((save_path, composite, encoder))
+            return outputs
+
+        # decode / แปลงภาพ / encode ทำงานซ้อนกันผ่าน queue ที่จำกัดจำนวนเฟรม
+        run_frame_pipeline(image_files, process_frame,
+                           num_readers=PIPELINE_READERS,
+                           num_writers=PIPELINE_WRITERS,
+                           max_in_flight=MAX_IN_FLIGHT,
+                           indent="  ",
+                           on_written=on_written,
+                           read_image=read_image,
+                           buffer_pool=buffer_pool)
+        buffer_pool.report("  ", since=pool_before)
+
+        manifest.save()
+        catalog.commit()
+
+        print(f"\n{'='*70}")
+        print(f"เสร็จสิ้นโฟลเดอร์ {folder_name}")
+        print(f"{'='*70}")
+
+    catalog.close()
 
     print(f"\n{'='*70}")
-    print(f"เสร็จสิ้นโฟลเดอร์ {folder_name}")
+    print("เสร็จสิ้นทุกโฟลเดอร์!")
+    print("สรุปการ encode:")
+    encoder.stats.report("  ")
     print(f"{'='*70}")
 
-print(f"\n{'='*70}")
-print("เสร็จสิ้นทุกโฟลเดอร์!")
-print(f"{'='*70}")
\ No newline at end of file
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import io
+import threading
+import time
+
+import numpy as np
+import cv2
+
+
+FORMAT_EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp', 'npy': '.npy'}
+DEFAULT_ENCODER_SPEC = 'jpeg:quality=95'
+
+
+class EncodeStats:
+    """สถิติการ encode ต่อ format: จำนวนไฟล์, เวลา encode รวม, จำนวน byte ที่ได้ (เรียกจากหลาย thread ได้)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.formats = {}
+
+    def add(self, fmt, seconds, num_bytes):
+        with self._lock:
+            entry = self.formats.setdefault(fmt, {'files': 0, 'seconds': 0.0, 'bytes': 0})
+            entry['files'] += 1
+            entry['seconds'] += seconds
+            entry['bytes'] += num_bytes
+
+    def merge(self, formats):
+        """รวมสถิติจาก take() ของ worker process"""
+        for fmt, v in formats.items():
+            with self._lock:
+                entry = self.formats.setdefault(fmt, {'files': 0, 'seconds': 0.0, 'bytes': 0})
+                for key in entry:
+                    entry[key] += v[key]
+
+    def take(self):
+        """คืนสถิติที่สะสมไว้ (dict) แล้วเริ่มนับใหม่ ใช้ใน worker process ส่งกลับไปรวมที่ process หลัก"""
+        with self._lock:
+            formats = self.formats
+            self.formats = {}
+        return formats
+
+    def report(self, indent=""):
+        with self._lock:
+            items = sorted(self.formats.items())
+        for fmt, v in items:
+            files = max(v['files'], 1)
+            print(f"{indent}{fmt}: {v['files']} ไฟล์ | encode {v['seconds']:.1f} s "
+                  f"({v['seconds'] / files * 1000:.1f} ms/ไฟล์) | {v['bytes'] / 1e6:.1f} MB "
+                  f"({v['bytes'] / files / 1e3:.0f} KB/ไฟล์)")
+
+
+class OutputEncoder:
+    """
+    encoder ของไฟล์ผลลัพธ์ แทน cv2.imwrite(..., [cv2.IMWRITE_JPEG_QUALITY, 95]) ที่เขียนตายตัวไว้
+      jpeg: quality, optimize, progressive
+      png : compression (0-9)
+      webp: quality (1-100, มากกว่า 100 = lossless)
+      npy : array ดิบ (np.save) ไม่ต้อง encode
+    สร้างจาก spec ด้วย parse_encoder('jpeg:quality=90,progressive')
+    """
+
+    def __init__(self, fmt='jpeg', quality=95, optimize=False, progressive=False, compression=3):
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"ไม่รู้จัก format '{fmt}' (เลือกได้: {', '.join(FORMAT_EXTENSIONS)})")
+        self.fmt = fmt
+        self.quality = quality
+        self.optimize = optimize
+        self.progressive = progressive
+        self.compression = compression
+        self.stats = EncodeStats()
+
+    def __getstate__(self):
+        # ส่งไปยัง worker process ได้ (Lock ใน stats pickle ไม่ได้) worker เริ่มนับสถิติของตัวเองใหม่
+        state = dict(self.__dict__)
+        del state['stats']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.stats = EncodeStats()
+
+    @property
+    def ext(self):
+        return FORMAT_EXTENSIONS[self.fmt]
+
+    @property
+    def params(self):
+        if self.fmt == 'jpeg':
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality,
+                    cv2.IMWRITE_JPEG_OPTIMIZE, int(self.optimize),
+                    cv2.IMWRITE_JPEG_PROGRESSIVE, int(self.progressive)]
+        if self.fmt == 'png':
+            return [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+        if self.fmt == 'webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        return []
+
+    def describe(self):
+        """พารามิเตอร์ที่มีผลต่อไฟล์ผลลัพธ์ (ใช้ใน digest ของ manifest)"""
+        if self.fmt == 'jpeg':
+            return {'format': 'jpeg', 'quality': self.quality, 'optimize': self.optimize,
+                    'progressive': self.progressive}
+        if self.fmt == 'png':
+            return {'format': 'png', 'compression': self.compression}
+        if self.fmt == 'webp':
+            return {'format': 'webp', 'quality': self.quality}
+        return {'format': 'npy'}
+
+    def is_default_jpeg(self, quality=95):
+        """เหมือน cv2.imwrite(..., [IMWRITE_JPEG_QUALITY, quality]) แบบเดิมทุกประการหรือไม่"""
+        return (self.fmt == 'jpeg' and self.quality == quality
+                and not self.optimize and not self.progressive)
+
+    def encode(self, image):
+        """คืน bytes ของไฟล์ หรือ None ถ้า encode ไม่สำเร็จ"""
+        start = time.perf_counter()
+        if self.fmt == 'npy':
+            buf = io.BytesIO()
+            np.save(buf, np.ascontiguousarray(image), allow_pickle=False)
+            data = buf.getvalue()
+        else:
+            ok, encoded = cv2.imencode(self.ext, image, self.params)
+            if not ok:
+                return None
+            data = encoded.tobytes()
+        self.stats.add(self.fmt, time.perf_counter() - start, len(data))
+        return data
+
+    def write(self, save_path, image):
+        """encode แล้วเขียนลงไฟล์ คืน True ถ้าสำเร็จ"""
+        if self.fmt == 'npy':
+            # เขียนตรงลงไฟล์ ไม่สร้าง bytes ทั้งภาพในหน่วยความจำ (ภาพจาก band_warp เป็น memmap ขนาดใหญ่ได้)
+            start = time.perf_counter()
+            try:
+                with open(save_path, 'wb') as f:
+                    np.save(f, image, allow_pickle=False)
+                    num_bytes = f.tell()
+            except OSError:
+                return False
+            self.stats.add(self.fmt, time.perf_counter() - start, num_bytes)
+            return True
+
+        data = self.encode(image)
+        if data is None:
+            return False
+        try:
+            with open(save_path, 'wb') as f:
+                f.write(data)
+        except OSError:
+            return False
+        return True
+
+
+def parse_encoder(spec):
+    """
+    'jpeg', 'jpeg:quality=90,optimize,progressive', 'png:compression=1', 'webp:quality=90', 'npy'
+    """
+    fmt, _, options = spec.partition(':')
+    kwargs = {}
+    for option in filter(None, (o.strip() for o in options.split(','))):
+        key, sep, value = option.partition('=')
+        if key in ('optimize', 'progressive'):
+            kwargs[key] = value.lower() not in ('0', 'false', 'no') if sep else True
+        elif key in ('quality', 'compression'):
+            kwargs[key] = int(value)
+        else:
+            raise ValueError(f"ไม่รู้จักตัวเลือก '{key}' ใน encoder spec '{spec}'")
+    return OutputEncoder(fmt.strip().lower(), **kwargs)
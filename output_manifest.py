@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+
+MANIFEST_VERSION = 1
+
+
+def file_signature(*paths):
+    """ตัวระบุไฟล์อินพุตแบบไม่ต้องอ่านเนื้อไฟล์: [size, mtime_ns] ต่อไฟล์"""
+    signature = []
+    for path in paths:
+        st = os.stat(path)
+        signature.extend([st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"ไม่สามารถแปลง {type(value)} เป็น JSON")
+
+
+def params_digest(params):
+    """hash ของพารามิเตอร์ที่มีผลต่อผลลัพธ์ (matrix, output_size, bend_factor, blend_width, JPEG quality ...)"""
+    text = json.dumps(params, sort_keys=True, default=_to_json)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class OutputManifest:
+    """
+    manifest ของแต่ละ stage: input path -> (signature ของอินพุต, digest ของพารามิเตอร์, ไฟล์ผลลัพธ์)
+    ไฟล์ที่ signature และ digest ตรงกัน และผลลัพธ์ยังอยู่ครบ ถือว่าเป็นปัจจุบัน ข้ามได้
+    บันทึกลงดิสก์ทุก save_every รายการ ถ้าโปรแกรมหยุดกลางทางจะทำซ้ำไม่เกินจำนวนนี้
+    """
+
+    def __init__(self, path, save_every=50):
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # save() จาก writer หลาย thread ใช้ไฟล์ .tmp เดียวกัน
+        self._pending = 0
+        self.entries = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data.get('entries', {})
+                else:
+                    print(f"manifest version ไม่ตรง เริ่มใหม่: {path}")
+            except (OSError, ValueError) as e:
+                print(f"อ่าน manifest ไม่ได้ เริ่มใหม่: {path} ({e})")
+
+    @staticmethod
+    def _key(input_path):
+        return os.path.normcase(os.path.abspath(input_path))
+
+    def is_up_to_date(self, input_path, digest, signature=None):
+        entry = self.entries.get(self._key(input_path))
+        if entry is None or entry['params'] != digest:
+            return False
+        try:
+            if signature is None:
+                signature = file_signature(input_path)
+        except OSError:
+            return False
+        if entry['input'] != signature:
+            return False
+        return all(os.path.exists(p) for p in entry['outputs'])
+
+    def filter_pending(self, input_paths, digest):
+        """คืนเฉพาะไฟล์ที่ต้องประมวลผลใหม่"""
+        return [p for p in input_paths if not self.is_up_to_date(p, digest)]
+
+    def record(self, input_path, digest, outputs, signature=None):
+        if signature is None:
+            signature = file_signature(input_path)
+        with self._lock:
+            self.entries[self._key(input_path)] = {
+                'input': signature,
+                'params': digest,
+                'outputs': list(outputs),
+            }
+            self._pending += 1
+            should_save = self._pending >= self.save_every
+        if should_save:
+            self.save()
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                self._pending = 0
+                data = {'version': MANIFEST_VERSION, 'entries': dict(self.entries)}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
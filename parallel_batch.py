@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from remap_engine import build_remap_tables, apply_remap_tables
+from gradient_blender import GradientBlender, blend_bend_pair
+from shard_writer import encode_outputs
+from frame_cache import load_cached_frame
+from band_warp import exceeds_budget, warp_perspective_banded
+from buffer_pool import BufferPool
+from letterbox import fill_padding
+
+
+# --- blender ต่อ process (worker เขียนไฟล์ทันที จึงใช้ buffer ผลลัพธ์ซ้ำได้) ---
+_blenders = {}
+# --- buffer ของภาพที่ warp แล้ว ต่อ process (คืนเข้า pool ทันทีหลังเขียน/encode) ---
+_buffer_pool = BufferPool()
+
+
+def _init_worker():
+    # ให้แต่ละ process ใช้ 1 thread ของ OpenCV ไม่แย่ง core กันเอง
+    cv2.setNumThreads(1)
+
+
+def _strip_transforms(transforms):
+    """ส่งเฉพาะ matrix/ขนาดไปยัง worker (ตาราง remap สร้างใหม่ใน worker และ cache ไว้ในแต่ละ process)"""
+    return [{'side': t['side'], 'matrix': t['matrix'], 'output_size': t['output_size'],
+             'letterbox': t.get('letterbox')}
+            for t in transforms]
+
+
+def _get_blender(blend_width):
+    blender = _blenders.get(blend_width)
+    if blender is None:
+        blender = GradientBlender(blend_width)
+        _blenders[blend_width] = blender
+    return blender
+
+
+def transform_image_file(img_path, transforms, output_folders, encoder,
+                         panorama_folder=None, blend_width=50, save_bends=True, encode_only=False,
+                         cache_entry=None, max_warp_bytes=0):
+    """
+    อ่านภาพ 1 ไฟล์ แปลงด้วยทุก transform แล้วบันทึกด้วย encoder (OutputEncoder)
+    panorama_folder: ถ้ากำหนด จะต่อ panorama จากภาพที่ warp แล้วในหน่วยความจำ (ไม่ต้องอ่าน JPEG กลับมา)
+    save_bends: บันทึกภาพ _left_bend/_right_bend ด้วยหรือไม่
+    encode_only: ไม่เขียนไฟล์ คืน {ext: bytes} ที่ encode แล้วแทน (ให้ process หลักเขียนลง shard)
+    cache_entry: (data_path, offset, shape) ใน frame cache ถ้ามี จะอ่าน pixel จาก memmap แทนการ decode JPEG
+    max_warp_bytes: ผลลัพธ์ที่ใหญ่กว่านี้ warp/เบลนด์ทีละแถบ ไม่สร้างตาราง remap (0 = ไม่จำกัด)
+    คืนค่า (img_path, สำเร็จหรือไม่, list ของไฟล์ที่บันทึก หรือ {ext: bytes} ถ้า encode_only,
+            สถิติการ encode ของไฟล์นี้)
+    """
+    img = load_cached_frame(cache_entry) if cache_entry is not None else cv2.imread(img_path)
+    if img is None:
+        return img_path, False, [], {}
+
+    base_filename = os.path.splitext(os.path.basename(img_path))[0]
+
+    outputs = []
+    warped = {}
+    for transform_data in transforms:
+        side = transform_data['side']
+        if exceeds_budget(transform_data['output_size'], max_warp_bytes):
+            warped[side] = warp_perspective_banded(img, transform_data['matrix'],
+                                                   transform_data['output_size'], max_warp_bytes)
+        else:
+            maps = build_remap_tables(transform_data['matrix'], transform_data['output_size'],
+                                      capacity=len(transforms))
+            width, height = transform_data['output_size']
+            warped[side] = apply_remap_tables(img, maps,
+                                              dst=_buffer_pool.acquire((height, width) + img.shape[2:]))
+            if transform_data.get('letterbox') is not None:
+                fill_padding(warped[side], transform_data['letterbox'])
+
+        if save_bends:
+            save_path = os.path.join(output_folders[side], f"{base_filename}_{side}{encoder.ext}")
+            outputs.append((save_path, warped[side], encoder))
+
+    if panorama_folder is not None:
+        panorama = blend_bend_pair(_get_blender(blend_width), warped, max_warp_bytes)
+        save_path = os.path.join(panorama_folder, f"{base_filename}_panorama{encoder.ext}")
+        outputs.append((save_path, panorama, encoder))
+
+    if encode_only:
+        files = encode_outputs(base_filename, outputs)
+        _buffer_pool.release(*warped.values())
+        return img_path, files is not None, files, encoder.stats.take()
+
+    saved = [save_path for save_path, image, _ in outputs if encoder.write(save_path, image)]
+    _buffer_pool.release(*warped.values())
+    return img_path, len(saved) == len(outputs), saved, encoder.stats.take()
+
+
+def create_worker_pool(num_workers):
+    """สร้าง process pool ครั้งเดียวแล้วใช้ซ้ำทุกโฟลเดอร์"""
+    return ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker)
+
+
+def run_parallel_batch(pool, image_files, transforms, output_folders, encoder,
+                       panorama_folder=None, blend_width=50, save_bends=True, indent="   ",
+                       on_written=None, write_encoded=None, cached_day=None, max_warp_bytes=0):
+    """
+    กระจายงานแปลงภาพทั้งโฟลเดอร์ไปยัง worker pool
+    ชื่อไฟล์ผลลัพธ์ขึ้นกับชื่อไฟล์ต้นฉบับเท่านั้น จึงได้ผลเหมือนการรันแบบทีละไฟล์
+    on_written(img_path, save_paths) ถูกเรียกเมื่อไฟล์หนึ่งบันทึกครบ
+    สถิติการ encode จาก worker ถูกรวมเข้า encoder.stats ของ process หลัก
+    write_encoded(img_path, files) -> list ของ path ที่บันทึก: ถ้ากำหนด worker จะ encode อย่างเดียว
+      แล้วส่ง {ext: bytes} กลับมาให้ process หลักเขียน (เช่น ลง tar shard)
+    cached_day: CachedDay จาก frame cache (ส่งแค่ตำแหน่งของภาพไปยัง worker ไม่ส่ง pixel)
+    max_warp_bytes: เพดานหน่วยความจำของภาพผลลัพธ์ต่อ worker (ดู band_warp.py)
+    """
+    worker_transforms = _strip_transforms(transforms)
+    encode_only = write_encoded is not None
+    futures = [pool.submit(transform_image_file, img_path, worker_transforms,
+                           output_folders, encoder, panorama_folder, blend_width, save_bends,
+                           encode_only, cached_day.entry(img_path) if cached_day is not None else None,
+                           max_warp_bytes)
+               for img_path in image_files]
+
+    total = len(image_files)
+    done = 0
+    failed = 0
+    for future in as_completed(futures):
+        img_path, ok, saved, stats = future.result()
+        encoder.stats.merge(stats)
+        if ok and encode_only:
+            saved = write_encoded(img_path, saved)
+        done += 1
+        if not ok:
+            failed += 1
+            print(f"{indent}✗ ไม่สามารถอ่าน/บันทึก: {os.path.basename(img_path)}")
+        elif on_written is not None:
+            on_written(img_path, saved)
+
+        if done % 10 == 0 or done == total:
+            print(f"{indent}✓ ประมวลผล {done}/{total} ไฟล์")
+
+    return done - failed
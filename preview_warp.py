@@ -0,0 +1,79 @@
+import numpy as np
+import cv2
+
+
+# --- cache ภาพต้นฉบับย่อขนาดสำหรับ preview (ภาพตัวอย่างของโฟลเดอร์ใช้ซ้ำทุกครั้งที่กด 'p') ---
+_source_cache = {'source': None, 'ratio': None, 'image': None}
+
+# ความละเอียดของภาพต้นฉบับที่ย่อแล้ว เทียบกับความละเอียดของ preview (มากกว่า 1 เพื่อลด aliasing)
+SOURCE_OVERSAMPLE = 2.0
+
+
+def preview_scale(output_size, max_dim):
+    """สเกลเดียวกับ resize_image(..., max_dim): ด้านที่ยาวที่สุดเท่ากับ max_dim"""
+    width, height = output_size
+    if width == 0 or height == 0:
+        return 1.0
+    return max_dim / max(width, height)
+
+
+def preview_size(output_size, max_dim):
+    width, height = output_size
+    if height > width:
+        return max(1, int(width * (max_dim / height))), max_dim
+    return max_dim, max(1, int(height * (max_dim / width)))
+
+
+def get_preview_source(img_original, ratio):
+    """
+    คืน (ภาพย่อ, ratio จริง) โดย ratio = ขนาดภาพย่อ / ขนาดต้นฉบับ (ไม่เกิน 1)
+    ใช้ภาพย่อที่ cache ไว้ถ้าละเอียดพอ
+    """
+    ratio = min(1.0, ratio)
+    cached = _source_cache
+    if cached['source'] is img_original and cached['ratio'] >= ratio:
+        return cached['image'], cached['ratio']
+
+    if ratio >= 1.0:
+        reduced = img_original
+    else:
+        h, w = img_original.shape[:2]
+        reduced = cv2.resize(img_original, (max(1, int(round(w * ratio))), max(1, int(round(h * ratio)))),
+                             interpolation=cv2.INTER_AREA)
+
+    cached['source'] = img_original
+    cached['ratio'] = ratio
+    cached['image'] = reduced
+    return reduced, ratio
+
+
+def compose_preview_matrix(matrix, source_ratio, output_scale):
+    """
+    matrix' = S_out @ matrix @ S_src^-1
+    แปลงจากพิกัดภาพย่อ -> พิกัด preview ได้ในการ warp ครั้งเดียว
+    """
+    scale_out = np.diag([output_scale, output_scale, 1.0])
+    scale_src_inv = np.diag([1.0 / source_ratio, 1.0 / source_ratio, 1.0])
+    return scale_out @ np.asarray(matrix, dtype=np.float64) @ scale_src_inv
+
+
+def prepare_preview(img_original, matrix, output_size, max_dim=900):
+    """
+    คืน (ภาพย่อ, ratio ของภาพย่อ, matrix ที่รวมสเกลแล้ว, ขนาด preview)
+    สำหรับฟังก์ชันที่ต้อง warp เองบนภาพย่อ (เช่น create_enhanced_focus_image)
+    """
+    scale = preview_scale(output_size, max_dim)
+    size = preview_size(output_size, max_dim)
+    source, ratio = get_preview_source(img_original, scale * SOURCE_OVERSAMPLE)
+    return source, ratio, compose_preview_matrix(matrix, ratio, scale), size
+
+
+def warp_for_preview(img_original, matrix, output_size, max_dim=900):
+    """
+    warp ตรงไปที่ขนาด preview (เท่ากับ warp เต็มขนาดแล้ว resize_image(..., max_dim))
+    """
+    source, _, preview_matrix, size = prepare_preview(img_original, matrix, output_size, max_dim)
+    return cv2.warpPerspective(source, preview_matrix, size,
+                               flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_CONSTANT,
+                               borderValue=(0, 0, 0))
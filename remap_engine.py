@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from band_warp import exceeds_budget
+
+
+# --- cache ตาราง remap: key = (matrix, output_size) ---
+_REMAP_CACHE = {}
+_REMAP_CACHE_LOCK = threading.Lock()   # frame_server เรียกจากหลาย thread พร้อมกัน
+MAX_CACHE_ENTRIES = 8   # ตารางหนึ่งชุดใช้ ~6 bytes/pixel จำกัดจำนวนไว้ไม่ให้หน่วยความจำโตตามจำนวนโฟลเดอร์
+
+
+def build_remap_tables(matrix, output_size, capacity=0):
+    """
+    สร้างตาราง remap แบบ fixed-point (CV_16SC2 + CV_16UC1) จาก perspective matrix
+    คำนวณ inverse homography ต่อ pixel ครั้งเดียว แล้วใช้ซ้ำกับทุกเฟรม
+    capacity: จำนวนตารางที่ผู้เรียกใช้พร้อมกัน (เช่น ทุก variant ของ augmentation) ถ้ามากกว่า
+              MAX_CACHE_ENTRIES การเพิ่มครั้งนี้จะไม่ลบ cache ลงต่ำกว่านั้น (มีผลเฉพาะการเรียกครั้งนี้)
+    cache ลบตารางที่ไม่ได้ใช้นานที่สุดก่อน (LRU)
+    """
+    key = (np.asarray(matrix, dtype=np.float64).tobytes(), tuple(output_size))
+    # สร้างภายใต้ lock: thread อื่นที่ขอตารางเดียวกันรอใช้ผลนี้แทนการสร้างซ้ำ
+    with _REMAP_CACHE_LOCK:
+        maps = _REMAP_CACHE.pop(key, None)
+        if maps is None:
+            maps = _build_remap_tables(matrix, output_size)
+            while len(_REMAP_CACHE) >= max(MAX_CACHE_ENTRIES, capacity):
+                _REMAP_CACHE.pop(next(iter(_REMAP_CACHE)))
+        _REMAP_CACHE[key] = maps   # ย้ายไปท้ายสุด (ใช้ล่าสุด)
+    return maps
+
+
+def _build_remap_tables(matrix, output_size):
+    width, height = output_size
+    inv = np.linalg.inv(np.asarray(matrix, dtype=np.float64))
+
+    xs = np.arange(width, dtype=np.float64).reshape(1, -1)
+    ys = np.arange(height, dtype=np.float64).reshape(-1, 1)
+
+    z = inv[2, 0] * xs + inv[2, 1] * ys + inv[2, 2]
+    z = np.where(np.abs(z) > 1e-12, 1.0 / z, 0.0)
+    map_x = ((inv[0, 0] * xs + inv[0, 1] * ys + inv[0, 2]) * z).astype(np.float32)
+    map_y = ((inv[1, 0] * xs + inv[1, 1] * ys + inv[1, 2]) * z).astype(np.float32)
+
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+def attach_remap_tables(transforms, max_bytes=0):
+    """
+    เพิ่ม key 'maps' ให้ทุก transform ใน g_transforms
+    transform ที่ผลลัพธ์ใหญ่กว่า max_bytes ได้ maps = None (ตารางใหญ่กว่าภาพ 2 เท่า ให้ warp ทีละแถบแทน)
+    """
+    for transform_data in transforms:
+        if exceeds_budget(transform_data['output_size'], max_bytes):
+            transform_data['maps'] = None
+            continue
+        transform_data['maps'] = build_remap_tables(transform_data['matrix'],
+                                                    transform_data['output_size'],
+                                                    capacity=len(transforms))
+    return transforms
+
+
+def apply_remap_tables(img_original, maps, dst=None):
+    """
+    แปลงภาพด้วยตาราง remap ที่คำนวณไว้แล้ว (ผลเท่ากับ warpPerspective แบบ INTER_LINEAR)
+    dst: array ปลายทาง (เช่น จาก BufferPool หรือ slice ของภาพที่ต่อกัน) ไม่ต้องจอง array ใหม่
+    """
+    map1, map2 = maps
+    return cv2.remap(img_original, map1, map2, cv2.INTER_LINEAR, dst=dst,
+                     borderMode=cv2.BORDER_CONSTANT,
+                     borderValue=(0, 0, 0))
+
+
+def clear_remap_cache():
+    with _REMAP_CACHE_LOCK:
+        _REMAP_CACHE.clear()
+
+
+def benchmark_transforms(images, transforms, frames_per_day=24, num_days=27):
+    """
+    เปรียบเทียบเวลา warpPerspective กับ remap table ต่อเฟรม
+    images: list ของภาพที่ decode แล้ว (ไม่นับเวลา decode/encode)
+    """
+    if not images or not transforms:
+        print("ไม่มีภาพหรือ transform สำหรับ benchmark")
+        return None
+
+    start = time.perf_counter()
+    for img in images:
+        for transform_data in transforms:
+            cv2.warpPerspective(img, transform_data['matrix'], transform_data['output_size'],
+                                flags=cv2.INTER_LINEAR,
+                                borderMode=cv2.BORDER_CONSTANT,
+                                borderValue=(0, 0, 0))
+    warp_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+    clear_remap_cache()
+    start = time.perf_counter()
+    attach_remap_tables(transforms)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for img in images:
+        for transform_data in transforms:
+            apply_remap_tables(img, transform_data['maps'])
+    remap_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+    total_frames = frames_per_day * num_days
+    speedup = warp_ms / remap_ms if remap_ms > 0 else float('inf')
+
+    print(f"\n--- Benchmark ({len(images)} เฟรม, {len(transforms)} transform/เฟรม) ---")
+    print(f"   warpPerspective : {warp_ms:8.2f} ms/เฟรม")
+    print(f"   remap table     : {remap_ms:8.2f} ms/เฟรม  (สร้างตาราง {build_ms:.1f} ms ครั้งเดียว)")
+    print(f"   speedup         : {speedup:8.2f}x")
+    print(f"   ประมาณ {num_days} วัน x {frames_per_day} เฟรม: "
+          f"{warp_ms * total_frames / 1000:.1f} s -> "
+          f"{(remap_ms * total_frames + build_ms * num_days) / 1000:.1f} s")
+
+    return {'warp_ms': warp_ms, 'remap_ms': remap_ms, 'build_ms': build_ms, 'speedup': speedup}
@@ -0,0 +1,148 @@
+import glob
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+
+
+DEFAULT_SHARD_BYTES = 1 << 30   # ขนาดสูงสุดต่อ shard (ก่อนขึ้น shard ใหม่)
+INDEX_VERSION = 1
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+
+def sample_key(name):
+    """key แบบ WebDataset: ห้ามมี '.' ในชื่อ (ส่วนหลัง '.' แรกคือนามสกุลของไฟล์ใน sample)"""
+    return name.replace('\\', '/').replace('.', '_')
+
+
+def encode_outputs(key_base, outputs):
+    """
+    encode ผลลัพธ์ของหนึ่งเฟรม [(save_path, image, encoder), ...] เป็น {ext: bytes}
+    ext มาจากชื่อไฟล์หลัง key_base เช่น '20250517_010000_left_bend.jpg' -> 'left_bend.jpg'
+    คืน None ถ้า encode ไม่สำเร็จ
+    """
+    files = {}
+    for save_path, image, encoder in outputs:
+        name = os.path.basename(save_path)
+        ext = name[len(key_base):].lstrip('_.') if name.startswith(key_base) else name
+        data = encoder.encode(image)
+        if data is None:
+            return None
+        files[ext] = data
+    return files
+
+
+class ShardWriter:
+    """
+    เขียนผลลัพธ์เป็น tar shard แบบ WebDataset: <prefix>-000000.tar, <prefix>-000001.tar, ...
+    ไฟล์ของ sample เดียวกัน (<key>.<ext>) อยู่ติดกันใน shard เดียว อ่านต่อเนื่องได้ทั้งไฟล์
+    แต่ละ shard มี sidecar <prefix>-000000.idx.json: ชื่อไฟล์ -> [offset ของข้อมูล, ขนาด] ใช้เปิดอ่านทีละ key ได้
+    shard ที่กำลังเขียนใช้นามสกุล .tmp และเปลี่ยนชื่อเมื่อปิด จึงไม่มี shard ครึ่งๆ กลางๆ ถ้าโปรแกรมหยุด
+    ถ้าโฟลเดอร์มี shard อยู่แล้ว จะเริ่มเลขถัดไป (ต่อท้ายชุดเดิม)
+    write_sample เรียกจากหลาย thread ได้
+    """
+
+    def __init__(self, out_dir, prefix='shard', max_bytes=DEFAULT_SHARD_BYTES):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tar = None
+        self._members = {}
+        self._shard_bytes = 0
+        self.samples = 0
+        self.bytes_written = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+        # นับ .tar.tmp ที่ค้างจากรอบที่หยุดกลางทางด้วย เลขนั้นจะไม่ถูกใช้ซ้ำ
+        # (manifest อาจอ้างถึง path นั้นอยู่ ถ้าใช้ซ้ำจะทำให้เฟรมที่หายไปดูเหมือนเป็นปัจจุบัน)
+        pattern = re.compile(re.escape(prefix) + r'-(\d{6})\.tar(\.tmp)?$')
+        existing = [int(m.group(1)) for m in
+                    (pattern.match(name) for name in os.listdir(out_dir)) if m]
+        self._next_index = max(existing) + 1 if existing else 0
+
+    def shard_path(self, index):
+        return os.path.join(self.out_dir, f"{self.prefix}-{index:06d}.tar")
+
+    def _open_shard(self):
+        self._index = self._next_index
+        self._next_index += 1
+        self._path = self.shard_path(self._index)
+        self._tar = tarfile.open(self._path + '.tmp', 'w', format=tarfile.USTAR_FORMAT)
+        self._members = {}
+        self._shard_bytes = 0
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._tar = None
+        os.replace(self._path + '.tmp', self._path)
+
+        index_path = os.path.splitext(self._path)[0] + '.idx.json'
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'shard': os.path.basename(self._path),
+                       'members': self._members}, f)
+        os.replace(index_path + '.tmp', index_path)
+
+    def write_sample(self, key, files):
+        """
+        เพิ่ม sample หนึ่งชุด: files = {ext: bytes} เช่น {'left_bend.jpg': ..., 'right_bend.jpg': ...}
+        คืน path ของ shard (ชื่อสุดท้ายหลังปิด) ที่ sample นี้ถูกเขียนลงไป
+        """
+        key = sample_key(key)
+        size = sum(TAR_BLOCK + -(-len(data) // TAR_BLOCK) * TAR_BLOCK for data in files.values())
+        now = time.time()
+        with self._lock:
+            if self._tar is not None and self._shard_bytes and self._shard_bytes + size > self.max_bytes:
+                self._close_shard()
+            if self._tar is None:
+                self._open_shard()
+
+            for ext, data in files.items():
+                info = tarfile.TarInfo(f"{key}.{ext}")
+                info.size = len(data)
+                info.mtime = now
+                info.mode = 0o644
+                self._tar.addfile(info, io.BytesIO(data))
+                # tar เติมข้อมูลให้เต็ม block ของ 512 byte ตำแหน่งข้อมูลจึงอยู่ก่อน offset ปัจจุบันพอดี
+                padded = -(-len(data) // TAR_BLOCK) * TAR_BLOCK
+                self._members[info.name] = [self._tar.offset - padded, len(data)]
+
+            self._shard_bytes += size
+            self.samples += 1
+            self.bytes_written += size
+            return self._path
+
+    def close(self):
+        with self._lock:
+            self._close_shard()
+
+
+class ShardReader:
+    """อ่านชุด shard ผ่าน sidecar index: get(key, ext) คืน bytes โดย seek ไปที่ข้อมูลโดยตรง"""
+
+    def __init__(self, out_dir, prefix='shard'):
+        self.out_dir = out_dir
+        self.members = {}
+        for index_path in sorted(glob.glob(os.path.join(out_dir, f"{prefix}-*.idx.json"))):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                continue
+            shard = os.path.join(out_dir, data['shard'])
+            for name, (offset, size) in data['members'].items():
+                self.members[name] = (shard, offset, size)
+
+    def keys(self):
+        """key ของทุก sample (เรียงตามชื่อ)"""
+        return sorted({name.split('.', 1)[0] for name in self.members})
+
+    def get(self, key, ext):
+        shard, offset, size = self.members[f"{sample_key(key)}.{ext}"]
+        with open(shard, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
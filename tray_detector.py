@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+import cv2
+
+from drift_tracker import load_small_gray
+
+
+DEFAULT_MAX_DIM = 800        # ขนาดด้านยาวของภาพที่ใช้หาขอบถาด (pixel)
+MIN_AREA_RATIO = 0.10        # ถาดต้องกินพื้นที่อย่างน้อยเท่านี้ของภาพ
+MIN_FILL_RATIO = 0.80        # พื้นที่ contour / พื้นที่สี่เหลี่ยมที่ fit ได้ ต่ำกว่านี้ถือว่าไม่ใช่ถาด
+
+
+def order_corners(quad):
+    """เรียงมุมเป็น Top-Left, Top-Right, Bottom-Right, Bottom-Left (ลำดับเดียวกับการคลิก)"""
+    quad = np.asarray(quad, dtype=np.float64).reshape(4, 2)
+    s = quad.sum(axis=1)
+    d = quad[:, 1] - quad[:, 0]
+    return np.array([quad[np.argmin(s)], quad[np.argmin(d)],
+                     quad[np.argmax(s)], quad[np.argmax(d)]])
+
+
+def _fit_quad(contour):
+    """ลด contour ให้เหลือ 4 จุดด้วย approxPolyDP (เพิ่ม epsilon ทีละขั้น) ไม่ได้ก็ใช้ minAreaRect"""
+    hull = cv2.convexHull(contour)
+    perimeter = cv2.arcLength(hull, True)
+    for eps in (0.01, 0.02, 0.03, 0.05, 0.08):
+        approx = cv2.approxPolyDP(hull, eps * perimeter, True)
+        if len(approx) == 4:
+            return approx.reshape(4, 2).astype(np.float64)
+        if len(approx) < 4:
+            break
+    return cv2.boxPoints(cv2.minAreaRect(hull)).astype(np.float64)
+
+
+def _candidates(gray):
+    """contour ที่อาจเป็นถาด: จากขอบ (Canny) และจากการแบ่งสว่าง/มืด (Otsu) ของภาพย่อ"""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    edges = cv2.Canny(blurred, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    yield from contours
+
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    for m in (mask, cv2.bitwise_not(mask)):
+        m = cv2.morphologyEx(m, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+        contours, _ = cv2.findContours(m, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        yield from contours
+
+
+def detect_tray_quad(image, max_dim=DEFAULT_MAX_DIM):
+    """
+    หาสี่เหลี่ยมของถาดปลูกบนภาพย่อ (image เป็น path หรือภาพ BGR ที่โหลดแล้ว)
+    คืน dict: 'points' (4 มุม TL, TR, BR, BL ในพิกัดภาพเต็ม หรือ None ถ้าหาไม่เจอ),
+              'area_ratio', 'fill_ratio', 'ms'
+    """
+    start = time.perf_counter()
+    result = {'points': None, 'area_ratio': 0.0, 'fill_ratio': 0.0, 'ms': 0.0}
+
+    if isinstance(image, str):
+        gray, scale = load_small_gray(image, max_dim)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        scale = min(1.0, max_dim / max(gray.shape[:2]))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    if gray is not None:
+        h, w = gray.shape[:2]
+        frame_area = float(h * w)
+        best = None
+        for contour in _candidates(gray):
+            area = cv2.contourArea(contour)
+            if area < MIN_AREA_RATIO * frame_area:
+                continue
+            quad = _fit_quad(contour)
+            quad_area = cv2.contourArea(quad.astype(np.float32))
+            # contour ที่ชิดขอบภาพทั้งภาพไม่ใช่ถาด
+            if quad_area <= 0 or quad_area > 0.98 * frame_area:
+                continue
+            fill = min(area, quad_area) / max(area, quad_area)
+            if fill < MIN_FILL_RATIO:
+                continue
+            # เลือกสี่เหลี่ยมใหญ่สุดที่ fit ได้ดี
+            if best is None or quad_area * fill > best[0]:
+                best = (quad_area * fill, quad, quad_area / frame_area, fill)
+
+        if best is not None:
+            _, quad, area_ratio, fill = best
+            # ขอบจาก Canny ถูกขยาย (dilate) มุมจึงเลื่อนออกนอกถาดเล็กน้อย ดึงกลับเข้ามุมจริงด้วย cornerSubPix
+            corners = order_corners(quad).astype(np.float32).reshape(-1, 1, 2)
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.05)
+            cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+            result['points'] = corners.reshape(4, 2).astype(np.float64) / scale
+            result['area_ratio'] = area_ratio
+            result['fill_ratio'] = fill
+
+    result['ms'] = (time.perf_counter() - start) * 1000
+    return result